@@ -0,0 +1,21 @@
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, Index
+from sqlmodel import SQLModel,Field
+
+class Flashcard(SQLModel,table=True):
+    """A saved flashcard with its SM-2 review state.
+    The (user_id, due_at) index serves the due-card query as a range scan."""
+    __tablename__ = "flashcards"
+    __table_args__ = (Index("ix_flashcards_user_due","user_id","due_at"),)
+    id:int|None = Field(default=None,primary_key=True)
+    user_id:int = Field(foreign_key="users.id")
+    document_id:str|None = Field(default=None,max_length=64)
+    front:str = Field(max_length=500)
+    back:str = Field(max_length=1000)
+    ease_factor:float = Field(default=2.5)
+    interval_days:float = Field(default=0.0)
+    repetitions:int = Field(default=0)
+    lapses:int = Field(default=0)
+    due_at:datetime = Field(default_factory=lambda: datetime.now(timezone.utc),sa_type=DateTime(timezone=True))
+    last_reviewed_at:datetime|None = Field(default=None,sa_type=DateTime(timezone=True))
+    created_at:datetime = Field(default_factory=lambda: datetime.now(timezone.utc),sa_type=DateTime(timezone=True))
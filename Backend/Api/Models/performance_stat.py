@@ -0,0 +1,17 @@
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, UniqueConstraint
+from sqlmodel import SQLModel,Field
+
+class PerformanceStat(SQLModel,table=True):
+    """Running grading aggregate for one user and one scope key.
+    scope is "overall", "document" or "topic"; key is the document id / topic name."""
+    __tablename__ = "performance_stats"
+    __table_args__ = (UniqueConstraint("user_id","scope","key"),)
+    id:int|None = Field(default=None,primary_key=True)
+    user_id:int = Field(foreign_key="users.id",index=True)
+    scope:str = Field(max_length=20)
+    key:str = Field(max_length=200)
+    attempted:int = Field(default=0)
+    correct:int = Field(default=0)
+    rolling_accuracy:float = Field(default=0.0)
+    updated_at:datetime = Field(default_factory=lambda: datetime.now(timezone.utc),sa_type=DateTime(timezone=True))
@@ -0,0 +1,9 @@
+from sqlmodel import SQLModel,Field
+
+class StateEntry(SQLModel,table=True):
+    """Shared key/value state (see Services/state_service.py); value is JSON text."""
+    __tablename__ = "state_entries"
+    namespace:str = Field(primary_key=True,max_length=50)
+    key:str = Field(primary_key=True,max_length=200)
+    value:str
+    expires_at:float|None = Field(default=None)
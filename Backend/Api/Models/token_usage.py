@@ -0,0 +1,19 @@
+from datetime import date, datetime, timezone
+from sqlalchemy import DateTime, UniqueConstraint
+from sqlmodel import SQLModel,Field
+
+class TokenUsage(SQLModel,table=True):
+    """LLM tokens used per UTC day, user, endpoint and document.
+    user_id 0 is anonymous and document_id "" is no document, so the unique
+    key never contains NULLs and upserts always hit the existing row."""
+    __tablename__ = "token_usage"
+    __table_args__ = (UniqueConstraint("user_id","day","endpoint","document_id"),)
+    id:int|None = Field(default=None,primary_key=True)
+    user_id:int = Field(default=0)
+    day:date
+    endpoint:str = Field(max_length=200)
+    document_id:str = Field(default="",max_length=200)
+    prompt_tokens:int = Field(default=0)
+    completion_tokens:int = Field(default=0)
+    calls:int = Field(default=0)
+    updated_at:datetime = Field(default_factory=lambda: datetime.now(timezone.utc),sa_type=DateTime(timezone=True))
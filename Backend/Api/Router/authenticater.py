@@ -25,9 +25,19 @@ async def create_and_verify(
     result = await session.execute(query)
     user = result.scalar_one_or_none()
 
-    if not user or not AuthService.verify_password(form_data.password, user.hashed_password):
+    if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
+    is_valid, new_hash = await AuthService.verify_and_update(form_data.password, user.hashed_password)
+    if not is_valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+    # Transparently upgrade hashes created with outdated argon2 parameters
+    if new_hash:
+        user.hashed_password = new_hash
+        session.add(user)
+        await session.commit()
+
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     data = {"sub": user.email, "exp": expire}
     token = jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
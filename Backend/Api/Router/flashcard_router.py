@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_session
+from Api.Security.Oath2 import get_current_user
+from Api.Models.reg_user import user as User
+from Api.Schemas.flashcard_schemas import SaveFlashcards, ReviewRequest
+from Services import flashcard_service as FlashcardService
+
+router = APIRouter(prefix="/flashcards", tags=["flashcards"])
+
+
+@router.post("")
+async def save_flashcards(
+    request: SaveFlashcards,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+):
+    """Save flashcards to the user's deck; they are due for review immediately."""
+    cards = [card.model_dump() for card in request.flashcards]
+    saved = await FlashcardService.save_flashcards(session, current_user.id, cards, request.document_id)
+    return {"flashcards": saved, "saved": len(saved)}
+
+
+@router.get("/due")
+async def due_flashcards(
+    limit: int = Query(20, ge=1, le=FlashcardService.MAX_DUE_CARDS, description="Maximum cards to return"),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+):
+    """Cards due for review now, most overdue first."""
+    cards = await FlashcardService.get_due_cards(session, current_user.id, limit)
+    next_due_at = None
+    if not cards:
+        next_due_at = await FlashcardService.get_next_due_at(session, current_user.id)
+    return {
+        "flashcards": cards,
+        "total": len(cards),
+        "next_due_at": next_due_at.isoformat() if next_due_at else None,
+    }
+
+
+@router.post("/{card_id}/review")
+async def review_flashcard(
+    card_id: int,
+    request: ReviewRequest,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+):
+    """Grade a review (0-5) and reschedule the card with SM-2."""
+    card = await FlashcardService.review_card(session, current_user.id, card_id, request.quality)
+    if card is None:
+        raise HTTPException(status_code=404, detail="Flashcard not found")
+    return card
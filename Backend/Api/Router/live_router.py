@@ -0,0 +1,98 @@
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, WebSocketException, status
+from Api.Security.Oath2 import get_current_user
+from Api.Models.reg_user import user as User
+from Api.Router.quiz_router import llm_budget, fair_slot
+from config import settings
+from Services.rag_service import get_active_document_id, get_document_chunks, generate_single_question
+from Services import live_service as LiveService
+
+router = APIRouter(prefix="/live", tags=["live"])
+
+
+@router.post("/sessions")
+async def create_live_session(
+    document_id: Optional[str] = Query(None, description="Document to quiz on; defaults to the most recent upload"),
+    current_user: User = Depends(get_current_user)
+):
+    """Start a live session; students join with the returned code over WebSocket."""
+    document_id = document_id or await get_active_document_id()
+    if not document_id or not await get_document_chunks(document_id):
+        raise HTTPException(status_code=400, detail="No content found. Upload a PDF first.")
+    session = await LiveService.create_session(current_user.id, document_id)
+    return {
+        "session_id": session.code,
+        "document_id": document_id,
+        "join_url": router.url_path_for("join_live_session", code=session.code),
+    }
+
+
+@router.get("/sessions/{code}")
+async def get_live_session(code: str, current_user: User = Depends(get_current_user)):
+    """Connected students, the open question, answers so far and the leaderboard."""
+    return LiveService.host_session(code, current_user.id).summary()
+
+
+@router.post("/sessions/{code}/questions", dependencies=[Depends(llm_budget), Depends(fair_slot)])
+async def push_live_question(
+    code: str,
+    topic: str = Query("general", description="Topic for the question"),
+    difficulty: str = Query("medium", description="Difficulty level: easy, medium, hard"),
+    question_type: str = Query("mcq", pattern="^(mcq|truefalse)$", description="Question type: mcq, truefalse"),
+    time_limit: Optional[float] = Query(None, ge=5, le=600, description="Seconds to answer; defaults to LIVE_QUESTION_SECONDS"),
+    mode: Optional[str] = Query(None, pattern="^(llm|rules)$", description="llm or rules (no LLM); defaults to GENERATION_MODE"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Generate a question and push it to every student. An open question is
+    graded first. The response (with the answer) is for the host only.
+    """
+    session = LiveService.host_session(code, current_user.id)
+    previous = [q.item["question"] for q in session.questions]
+    item = await generate_single_question(topic, difficulty, question_type, previous, session.document_id, mode)
+    if "error" in item:
+        raise HTTPException(status_code=400, detail=item["error"])
+    return await session.push_question(item, time_limit or settings.LIVE_QUESTION_SECONDS)
+
+
+@router.post("/sessions/{code}/close")
+async def close_live_question(code: str, current_user: User = Depends(get_current_user)):
+    """Stop taking answers, grade them in one pass and push the results."""
+    results = await LiveService.host_session(code, current_user.id).close_question()
+    if results is None:
+        raise HTTPException(status_code=409, detail="No question is open")
+    return results
+
+
+@router.delete("/sessions/{code}")
+async def end_live_session(code: str, current_user: User = Depends(get_current_user)):
+    """End the session: final leaderboard to everyone, then the sockets are closed."""
+    session = LiveService.host_session(code, current_user.id)
+    return await LiveService.end_session(session.code)
+
+
+@router.websocket("/sessions/{code}/ws")
+async def join_live_session(
+    websocket: WebSocket,
+    code: str,
+    name: str = Query("", description="Name shown on the leaderboard"),
+    student_id: Optional[str] = Query(None, description="From the joined message; reconnects keep the score")
+):
+    session = LiveService.find_session(code)
+    if session is None:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="No live session with this code")
+    await websocket.accept()
+    participant = session.join(websocket, name, student_id)
+    try:
+        while True:
+            try:
+                data = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if isinstance(data, dict) and data.get("type") == "answer":
+                session.submit(participant, data)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.leave(participant, websocket)
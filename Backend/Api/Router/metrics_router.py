@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from Services.metrics_service import render_prometheus
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of stage timings, token usage and pool waits."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
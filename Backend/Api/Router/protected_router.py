@@ -1,6 +1,6 @@
 # Api/Routes/protected_routes.py
 from fastapi import APIRouter, Depends
-from Api.Security.Oath2 import get_current_user
+from Api.Security.Oath2 import get_current_user, get_cache_stats
 from Api.Models.reg_user import user as User
 
 router = APIRouter(
@@ -15,3 +15,7 @@ async def dashboard(current_user: User = Depends(get_current_user)):
     }
 
 
+@router.get("/auth/cache-stats")
+async def auth_cache_stats(current_user: User = Depends(get_current_user)):
+    """Size and hit rate of the token and user lookup caches."""
+    return get_cache_stats()
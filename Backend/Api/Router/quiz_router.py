@@ -1,18 +1,63 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Depends, Request
 from pydantic import BaseModel
 from typing import List, Optional
-from Services.rag_service import process_pdf, generate_quiz_from_rag, generate_single_question, check_quiz_answers, get_random_chunks, retrieve_documents
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_session
+from Api.Security.Oath2 import get_current_user, get_optional_user
+from Api.Models.reg_user import user as User
+from config import settings
+from Services.rag_service import get_active_document_id, process_pdf, process_pdfs, generate_quiz_from_rag, generate_single_question, check_quiz_answers, get_random_chunks, retrieve_documents
 from Services.agent_service import generate_quiz_with_agent, generate_single_question_with_agent, generate_flashcards_with_agent, generate_single_flashcard_with_agent, chat_with_rag_agent
-import json
-import re
+from Services import insights_service as InsightsService
+from Services import flashcard_service as FlashcardService
+from Services import usage_service as UsageService
+from Services import question_bank_service as QuestionBankService
+from Services.metrics_service import current_user_id
+from Services.rulebased_service import use_rules
+from Services.fact_sheet_service import use_fact_sheets
+from Services.scheduler_service import scheduler, ANONYMOUS_WEIGHT
 
 router = APIRouter(prefix="/quiz", tags=["quiz"])
 
 
+async def llm_budget(request: Request, current_user: Optional[User] = Depends(get_optional_user)):
+    """
+    Attribute the request's LLM token usage to the signed-in user and refuse
+    it with 429 once their daily budget is spent (401 for anonymous callers
+    while budgets are on). Rule-based requests use no tokens and are always allowed.
+    """
+    if current_user is not None:
+        current_user_id.set(current_user.id)
+    if not use_rules(request.query_params.get("mode")):
+        await UsageService.check_budget(current_user.id if current_user else None)
+
+
+async def fair_slot(request: Request, current_user: Optional[User] = Depends(get_optional_user)):
+    """
+    Run the request through the per-user fair queue. Larger requests cost
+    more of the user's share; anonymous callers are keyed by client address.
+    """
+    if current_user is not None:
+        user, weight = current_user.id, 1.0
+    else:
+        user, weight = f"anon:{request.client.host if request.client else ''}", ANONYMOUS_WEIGHT
+    params = request.query_params
+    cost = params.get("num_questions") or params.get("num_flashcards") or "1"
+    cost = max(1, int(cost)) if cost.isdigit() else 1
+    async with scheduler.slot(user, cost, weight):
+        yield
+
+
 class AnswerCheck(BaseModel):
     question_id: int
-    user_answer: str
-    correct_answer: str
+    user_answer: str = ""
+    correct_answer: str = ""
+    # Option indices for MCQ / True-False; when both are set grading skips embeddings
+    user_answer_index: Optional[int] = None
+    correct_answer_index: Optional[int] = None
+    # Optional labels used to build per-document / per-topic insights
+    topic: Optional[str] = None
+    document_id: Optional[str] = None
 
 
 class CheckAnswersRequest(BaseModel):
@@ -21,49 +66,120 @@ class CheckAnswersRequest(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
+    document_id: Optional[str] = None
 
 
-@router.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    return await process_pdf(file)
+@router.post("/upload-pdf", dependencies=[Depends(fair_slot)])
+async def upload_pdf(file: UploadFile = File(...), current_user: Optional[User] = Depends(get_optional_user)):
+    # Signed-in re-uploads of the same file replace the previous collection
+    return await process_pdf(file, current_user.id if current_user else None)
 
 
-@router.post("/generate-one")
+@router.post("/upload-pdfs", dependencies=[Depends(fair_slot)])
+async def upload_pdfs(files: List[UploadFile] = File(...), current_user: Optional[User] = Depends(get_optional_user)):
+    """
+    Upload several PDFs at once. Files are ingested concurrently and reported
+    one by one: a file that fails does not affect the others.
+    """
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.MAX_BATCH_FILES} files per upload")
+    return await process_pdfs(files, current_user.id if current_user else None)
+
+
+@router.post("/generate-one", dependencies=[Depends(llm_budget), Depends(fair_slot)])
 async def generate_one_question(
     topic: str = Query("general", description="Topic for the question"),
     difficulty: str = Query("medium", description="Difficulty level: easy, medium, hard"),
     question_type: str = Query("mcq", description="Question type: mcq, truefalse"),
-    previous_questions: Optional[str] = Query(None, description="Comma-separated previous questions to avoid")
+    previous_questions: Optional[str] = Query(None, description="Comma-separated previous questions to avoid"),
+    document_id: Optional[str] = Query(None, description="Document to use; defaults to the most recent upload"),
+    mode: Optional[str] = Query(None, pattern="^(llm|rules)$", description="llm or rules (no LLM); defaults to GENERATION_MODE")
 ):
     """Generate a single question at a time."""
     prev_list = previous_questions.split(",") if previous_questions else []
-    result = await generate_single_question(topic, difficulty, question_type, prev_list)
+    result = await generate_single_question(topic, difficulty, question_type, prev_list, document_id, mode)
     return result
 
 
 @router.post("/check-answers")
-async def check_answers(request: CheckAnswersRequest):
-    """Check all quiz answers using cosine similarity."""
+async def check_answers(
+    request: CheckAnswersRequest,
+    current_user: Optional[User] = Depends(get_optional_user),
+    session: AsyncSession = Depends(get_session)
+):
+    """Check all quiz answers by option index, or cosine similarity for free text."""
     answers_list = [
         {
             "question_id": a.question_id,
             "user_answer": a.user_answer,
-            "correct_answer": a.correct_answer
+            "correct_answer": a.correct_answer,
+            "user_answer_index": a.user_answer_index,
+            "correct_answer_index": a.correct_answer_index,
+            "topic": a.topic,
+            "document_id": a.document_id
         }
         for a in request.answers
     ]
     result = await check_quiz_answers(answers_list)
+    
+    # Signed-in users get their running insights updated at grading time
+    if current_user is not None:
+        await InsightsService.record_results(session, current_user.id, answers_list, result["results"])
+    return result
+
+
+@router.get("/insights")
+async def get_insights(
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+):
+    """Questions attempted, correct answers and weak topics for the current user."""
+    return await InsightsService.get_insights(session, current_user.id)
+
+
+@router.post("/question-bank")
+async def import_question_bank(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """Import a JSONL question bank built offline with `python -m question_bank build`."""
+    return await QuestionBankService.import_bank((await file.read()).splitlines())
+
+
+@router.get("/question-bank")
+async def list_question_banks():
+    """Documents with an imported question bank."""
+    return {"banks": await QuestionBankService.list_banks()}
+
+
+@router.get("/question-bank/{document_id}")
+async def quiz_from_question_bank(
+    document_id: str,
+    num_questions: int = Query(5, ge=0, description="Number of questions"),
+    num_flashcards: int = Query(0, ge=0, description="Number of flashcards"),
+    previous_questions: Optional[str] = Query(None, description="Comma-separated previous questions to avoid")
+):
+    """Serve a quiz from an imported question bank (no LLM call)."""
+    prev_list = previous_questions.split(",") if previous_questions else []
+    result = await QuestionBankService.draw_from_bank(document_id, num_questions, num_flashcards, prev_list)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No question bank for this document")
     return result
 
 
+@router.get("/usage")
+async def get_usage(current_user: User = Depends(get_current_user)):
+    """LLM tokens the current user has used today, per endpoint, and the remaining budget."""
+    return await UsageService.get_usage(current_user.id)
+
+
 # Agent-based quiz generation endpoints
-@router.post("/agent/generate")
+@router.post("/agent/generate", dependencies=[Depends(llm_budget), Depends(fair_slot)])
 async def generate_quiz_agent(
-    num_questions: int = Query(5, description="Number of questions to generate")
+    num_questions: int = Query(5, ge=1, description="Number of questions to generate"),
+    document_id: Optional[str] = Query(None, description="Document to use; defaults to the most recent upload"),
+    mode: Optional[str] = Query(None, pattern="^(llm|rules)$", description="llm or rules (no LLM); defaults to GENERATION_MODE")
 ):
     """Generate quiz using the AutoGen agent with parsed format."""
     # Get random chunks from uploaded document (small chunks ~200-250 words)
-    context = get_random_chunks(min(3, num_questions))
+    context = await get_random_chunks(min(3, num_questions), document_id, facts=use_fact_sheets(mode))
     
     if not context or len(context) < 50:
         raise HTTPException(status_code=400, detail="No content found. Upload a PDF first.")
@@ -72,17 +188,19 @@ async def generate_quiz_agent(
     if len(context) > 1500:
         context = context[:1500]
     
-    result = await generate_quiz_with_agent(context, num_questions)
+    result = await generate_quiz_with_agent(context, num_questions, mode, document_id)
     return result
 
 
-@router.post("/agent/generate-one")
+@router.post("/agent/generate-one", dependencies=[Depends(llm_budget), Depends(fair_slot)])
 async def generate_one_question_agent(
-    previous_questions: Optional[str] = Query(None, description="Comma-separated previous questions to avoid")
+    previous_questions: Optional[str] = Query(None, description="Comma-separated previous questions to avoid"),
+    document_id: Optional[str] = Query(None, description="Document to use; defaults to the most recent upload"),
+    mode: Optional[str] = Query(None, pattern="^(llm|rules)$", description="llm or rules (no LLM); defaults to GENERATION_MODE")
 ):
     """Generate a single question using the AutoGen agent."""
     # Get a single random chunk
-    context = get_random_chunks(1)
+    context = await get_random_chunks(1, document_id, facts=use_fact_sheets(mode))
     
     if not context or len(context) < 50:
         raise HTTPException(status_code=400, detail="No content found. Upload a PDF first.")
@@ -92,17 +210,22 @@ async def generate_one_question_agent(
         context = context[:800]
     
     prev_list = previous_questions.split(",") if previous_questions else []
-    result = await generate_single_question_with_agent(context, prev_list)
+    result = await generate_single_question_with_agent(context, prev_list, mode, document_id)
     return result
 
 
-@router.post("/agent/generate-flashcards")
+@router.post("/agent/generate-flashcards", dependencies=[Depends(llm_budget), Depends(fair_slot)])
 async def generate_flashcards_agent(
-    num_flashcards: int = Query(5, description="Number of flashcards to generate")
+    num_flashcards: int = Query(5, ge=1, description="Number of flashcards to generate"),
+    document_id: Optional[str] = Query(None, description="Document to use; defaults to the most recent upload"),
+    mode: Optional[str] = Query(None, pattern="^(llm|rules)$", description="llm or rules (no LLM); defaults to GENERATION_MODE"),
+    save: bool = Query(True, description="Add the cards to the signed-in user's review deck"),
+    current_user: Optional[User] = Depends(get_optional_user),
+    session: AsyncSession = Depends(get_session)
 ):
     """Generate flashcards using the AutoGen flashcard agent."""
     # Get random chunks from uploaded document
-    context = get_random_chunks(min(3, num_flashcards))
+    context = await get_random_chunks(min(3, num_flashcards), document_id, facts=use_fact_sheets(mode))
     
     if not context or len(context) < 50:
         raise HTTPException(status_code=400, detail="No content found. Upload a PDF first.")
@@ -111,17 +234,25 @@ async def generate_flashcards_agent(
     if len(context) > 1500:
         context = context[:1500]
     
-    result = await generate_flashcards_with_agent(context, num_flashcards)
+    result = await generate_flashcards_with_agent(context, num_flashcards, mode)
+    
+    # Keep the cards for spaced repetition instead of regenerating the deck later
+    if save and current_user is not None and result.get("flashcards"):
+        document_id = document_id or await get_active_document_id()
+        saved = await FlashcardService.save_flashcards(session, current_user.id, result["flashcards"], document_id)
+        result["saved"] = len(saved)
     return result
 
 
-@router.post("/agent/generate-one-flashcard")
+@router.post("/agent/generate-one-flashcard", dependencies=[Depends(llm_budget), Depends(fair_slot)])
 async def generate_one_flashcard_agent(
-    previous_flashcards: Optional[str] = Query(None, description="Comma-separated previous flashcard fronts to avoid")
+    previous_flashcards: Optional[str] = Query(None, description="Comma-separated previous flashcard fronts to avoid"),
+    document_id: Optional[str] = Query(None, description="Document to use; defaults to the most recent upload"),
+    mode: Optional[str] = Query(None, pattern="^(llm|rules)$", description="llm or rules (no LLM); defaults to GENERATION_MODE")
 ):
     """Generate a single flashcard using the AutoGen flashcard agent."""
     # Get a single random chunk
-    context = get_random_chunks(1)
+    context = await get_random_chunks(1, document_id, facts=use_fact_sheets(mode))
     
     if not context or len(context) < 50:
         raise HTTPException(status_code=400, detail="No content found. Upload a PDF first.")
@@ -131,37 +262,24 @@ async def generate_one_flashcard_agent(
         context = context[:800]
     
     prev_list = previous_flashcards.split(",") if previous_flashcards else []
-    result = await generate_single_flashcard_with_agent(context, prev_list)
+    result = await generate_single_flashcard_with_agent(context, prev_list, mode)
     return result
 
 
-@router.post("/generate")
+@router.post("/generate", dependencies=[Depends(llm_budget), Depends(fair_slot)])
 async def generate_quiz(
     topic: str = Query(..., description="Topic for the quiz"), 
-    num_questions: int = Query(5, description="Number of questions"),
+    num_questions: int = Query(5, ge=1, description="Number of questions"),
     include_flashcards: bool = Query(False, description="Whether to generate flashcards"),
     difficulty: str = Query("medium", description="Difficulty level: easy, medium, hard"),
-    question_type: str = Query("mixed", description="Question type: mixed, mcq, truefalse")
+    question_type: str = Query("mixed", description="Question type: mixed, mcq, truefalse"),
+    document_id: Optional[str] = Query(None, description="Document to use; defaults to the most recent upload"),
+    mode: Optional[str] = Query(None, pattern="^(llm|rules)$", description="llm or rules (no LLM); defaults to GENERATION_MODE")
 ):
-    response_content = await generate_quiz_from_rag(topic, num_questions, include_flashcards, difficulty, question_type)
-    
-    # Attempt to parse JSON from the response
-    try:
-        # Sometimes LLMs wrap JSON in markdown code blocks
-        json_match = re.search(r"```json\s*(.*?)\s*```", response_content, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-        else:
-            json_str = response_content
-            
-        data = json.loads(json_str)
-        return data
-    except json.JSONDecodeError:
-        # If parsing fails, return the raw content but warn
-        return {"raw_response": response_content, "message": "Failed to parse JSON from LLM response"}
-
-
-@router.post("/chat")
+    return await generate_quiz_from_rag(topic, num_questions, include_flashcards, difficulty, question_type, document_id, mode)
+
+
+@router.post("/chat", dependencies=[Depends(llm_budget), Depends(fair_slot)])
 async def chat_with_document(request: ChatRequest):
     """
     Chat with the RAG assistant about the uploaded document.
@@ -171,7 +289,7 @@ async def chat_with_document(request: ChatRequest):
         raise HTTPException(status_code=400, detail="Please enter a valid question.")
     
     # Retrieve relevant context from vector database using cosine similarity
-    context = retrieve_documents(request.message)
+    context = await retrieve_documents(request.message, request.document_id)
     
     if not context or len(context) < 20:
         return {
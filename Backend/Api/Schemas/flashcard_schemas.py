@@ -0,0 +1,17 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class FlashcardIn(BaseModel):
+    front: str = Field(max_length=500)
+    back: str = Field(max_length=1000)
+
+
+class SaveFlashcards(BaseModel):
+    flashcards: List[FlashcardIn]
+    document_id: Optional[str] = Field(None, max_length=64)
+
+
+class ReviewRequest(BaseModel):
+    # SM-2 grade: 0-2 forgotten, 3 hard, 4 good, 5 easy
+    quality: int = Field(ge=0, le=5)
@@ -1,19 +1,98 @@
+import time
+import uuid
+import asyncio
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi import Depends, HTTPException, status
 from jose import JWTError, jwt
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
 from sqlalchemy.future import select
 from Api.Models.reg_user import user as User
+from config import settings
 from database import get_session
 from Api.Router.authenticater import SECRET_KEY, ALGORITHM
+from Services.cache_service import TTLCache
+from Services.metrics_service import register_collector
+from Services.state_service import state_store
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    session: AsyncSession = Depends(get_session)
-):
-    token = credentials.credentials
+# token -> email for tokens whose signature and expiry were already verified
+token_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAXSIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+# email -> (user record, shared version it was loaded at, when that was last checked),
+# so a cache hit needs no database round trip
+user_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAXSIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+# Pending shared-version writes, referenced until done
+_publishing = set()
+
+
+def invalidate_user(email: str) -> None:
+    """Drop a cached user record so the next request reloads it from the database."""
+    user_cache.pop(email)
+
+
+async def _user_version(email: str) -> str:
+    return await state_store.get("user_versions", email) or ""
+
+
+async def _publish_user_change(emails: set) -> None:
+    """New shared versions, so other workers drop their cached records of these users."""
+    for email in emails:
+        await state_store.set("user_versions", email, uuid.uuid4().hex)
+
+
+def get_cache_stats() -> dict:
+    return {"token_cache": token_cache.stats(), "user_cache": user_cache.stats()}
+
+
+def _cache_metrics() -> list:
+    lines = ["# TYPE flashquiz_auth_cache_hit_rate gauge"]
+    for name, stats in get_cache_stats().items():
+        lines.append(f'flashquiz_auth_cache_hit_rate{{cache="{name}"}} {stats["hit_rate"]}')
+    return lines
+
+
+register_collector(_cache_metrics)
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    # Mapper events fire only in this process; other workers learn of the
+    # change from the shared version, published once the change is committed
+    invalidate_user(target.email)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_users", set()).add(target.email)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    emails = session.info.pop("changed_users", None)
+    if not emails:
+        return
+    try:
+        task = asyncio.get_running_loop().create_task(_publish_user_change(emails))
+    except RuntimeError:
+        # No event loop (a sync script): nothing in this process caches users
+        return
+    _publishing.add(task)
+    task.add_done_callback(_publishing.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("changed_users", None)
+
+
+def verify_token(token: str) -> str:
+    """Return the token subject (email), using the cache for already verified tokens."""
+    email = token_cache.get(token)
+    if email is not None:
+        return email
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -22,10 +101,47 @@ async def get_current_user(
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
+    # Never keep a token cached past its own expiry
+    exp = payload.get("exp")
+    ttl = exp - time.time() if exp is not None else None
+    token_cache.set(token, email, ttl)
+    return email
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: AsyncSession = Depends(get_session)
+):
+    token = credentials.credentials
+    email = verify_token(token)
+
+    # A cached record is trusted for AUTH_REVALIDATE_SECONDS, then only while
+    # the user's shared version is unchanged (no update or delete on any worker)
+    cached = user_cache.get(email)
+    if cached is not None:
+        user, version, checked = cached
+        if time.monotonic() - checked < settings.AUTH_REVALIDATE_SECONDS:
+            return user
+        if await _user_version(email) == version:
+            user_cache.set(email, (user, version, time.monotonic()))
+            return user
+
+    version = await _user_version(email)
     query = select(User).where(User.email == email)
     result = await session.execute(query)
     user = result.scalar_one_or_none()
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
 
+    user_cache.set(email, (user, version, time.monotonic()))
     return user
+
+
+async def get_optional_user(
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_security),
+    session: AsyncSession = Depends(get_session)
+):
+    """Like get_current_user, but returns None for anonymous requests."""
+    if credentials is None:
+        return None
+    return await get_current_user(credentials, session)
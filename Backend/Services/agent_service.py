@@ -4,11 +4,33 @@ Uses the AutoGen Assistant agent from agent.py to generate quiz questions and fl
 """
 import sys
 import os
+import asyncio
+import logging
 # Add parent directory to path to import from agent.py
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from agent import Assistant, flashcard_Agent, Rag_assistant, parse_quiz_line as agent_parse_quiz_line
+from agent import build_quiz_agent, build_qa_agent, build_flashcard_agent, build_rag_agent
 from autogen_agentchat.messages import TextMessage
+from Services.metrics_service import time_stage, record_parse_failure, record_task_usage, record_rule_generation
+from Services.parser_service import parse_llm_output, parse_pipe_line
+from Services import rulebased_service as RuleBased
+from Services.distractor_service import has_term_index, complete_questions
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def run_agent(build_agent, prompt: str):
+    """
+    Run a fresh AutoGen agent on a single prompt, recording latency and token usage.
+    A new agent per call keeps no conversation state in the worker process.
+    Raises asyncio.TimeoutError after LLM_TIMEOUT_SECONDS.
+    """
+    with time_stage("llm"):
+        response = await asyncio.wait_for(
+            build_agent().run(task=[TextMessage(content=prompt, source='user')]), settings.LLM_TIMEOUT_SECONDS)
+    record_task_usage(response)
+    return response
 
 
 def parse_quiz_line(line: str) -> dict:
@@ -16,75 +38,30 @@ def parse_quiz_line(line: str) -> dict:
     Parse a single quiz line into structured data.
     Format: ANSWER|QUESTION|OPTION_A|OPTION_B|OPTION_C|OPTION_D
     """
-    try:
-        parts = line.split('|')
-        if len(parts) < 6:
-            print(f"Invalid quiz line format, expected 6 parts: {line}")
-            return None
-        
-        correct_answer_letter = parts[0].strip().upper()
-        question = parts[1].strip()
-        option_a = parts[2].strip()
-        option_b = parts[3].strip()
-        option_c = parts[4].strip()
-        option_d = parts[5].strip()
-        
-        # Validate we have content
-        if not question or not option_a or not option_b or not option_c or not option_d:
-            print(f"Empty fields in quiz line: {line}")
-            return None
-        
-        # Map letter to index
-        answer_map = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
-        correct_index = answer_map.get(correct_answer_letter, 0)
-        
-        options = [option_a, option_b, option_c, option_d]
-        
-        return {
-            "question": question,
-            "options": options,
-            "correctAnswer": correct_index,
-            "correctAnswerText": options[correct_index] if correct_index < len(options) else options[0],
-            "type": "mcq"
-        }
-    except Exception as e:
-        print(f"Error parsing quiz line: {e}")
+    parsed = parse_pipe_line(line, expect="quiz")
+    if parsed is None:
+        logger.debug("Invalid quiz line: %s", line)
         return None
+    return parsed[1]
 
 
-def parse_quiz_response(response_text: str) -> list:
+def parse_quiz_response(response_text: str, expect: str = "quiz") -> list:
     """
     Parse the full response from the agent into a list of quiz questions.
+    Every valid line is kept; malformed lines are counted as parse failures.
+    expect="qa" parses ANSWER|QUESTION lines that still need their options.
     """
-    questions = []
-    lines = response_text.strip().split('\n')
-    
-    for idx, line in enumerate(lines):
-        if line.strip():  # Skip empty lines
-            parsed = parse_quiz_line(line)
-            if parsed:
-                parsed["id"] = idx + 1
-                parsed["explanation"] = f"The correct answer is {parsed['correctAnswerText']}"
-                questions.append(parsed)
-    
-    return questions
+    parser = parse_llm_output(response_text, expect=expect)
+    record_parse_failure(parser.failed)
+    for parsed in parser.questions:
+        if "correctAnswerText" in parsed:
+            parsed["explanation"] = f"The correct answer is {parsed['correctAnswerText']}"
+    return parser.questions
 
 
-async def generate_quiz_with_agent(context: str, num_questions: int = 5) -> dict:
-    """
-    Generate quiz questions using the AutoGen agent.
-    
-    Args:
-        context: The text content to generate questions from
-        num_questions: Number of questions to generate
-    
-    Returns:
-        dict with 'quiz' list containing formatted questions
-    """
-    try:
-        # Build the prompt with the context
-        prompt = f"""Based on the following text, generate exactly {num_questions} quiz questions.
-Each question should test understanding of key concepts from the text.
+def _quiz_prompt(context: str, num_questions: int, avoid_text: str = "") -> str:
+    return f"""Based on the following text, generate exactly {num_questions} quiz questions.
+Each question should test understanding of key concepts from the text.{avoid_text}
 
 TEXT:
 {context}
@@ -102,15 +79,85 @@ Rules:
 
 Example: A|What is the capital of France?|Paris|London|Berlin|Madrid"""
 
-        # Run the Assistant agent (from agent.py)
-        response = await Assistant.run(task=[TextMessage(content=prompt, source='user')])
+
+def _qa_prompt(context: str, num_questions: int, avoid_text: str = "") -> str:
+    return f"""Based on the following text, generate exactly {num_questions} quiz questions.
+Each question should test understanding of key concepts from the text.{avoid_text}
+
+TEXT:
+{context}
+
+Generate {num_questions} lines in this EXACT format using | as delimiter:
+ANSWER|QUESTION
+
+Rules:
+- ANSWER is a short term or phrase from the text (max 5 words)
+- QUESTION is the quiz question (max 80 chars)
+- Do NOT write answer options
+- One question per line
+- Output ONLY data lines, no headers or explanations
+
+Example: Paris|What is the capital of France?"""
+
+
+async def _ask_questions(context: str, num_questions: int, short_answer: bool, document_id: str, avoid_text: str = "") -> list:
+    """One agent call; with short_answer the distractor engine completes the options."""
+    if not short_answer:
+        response = await run_agent(build_quiz_agent, _quiz_prompt(context, num_questions, avoid_text))
+        return parse_quiz_response(response.messages[-1].content)
+    response = await run_agent(build_qa_agent, _qa_prompt(context, num_questions, avoid_text))
+    return await complete_questions(parse_quiz_response(response.messages[-1].content, expect="qa"), document_id)
+
+
+def _rules_quiz(context: str, num_questions: int, reason: str) -> dict:
+    record_rule_generation(reason)
+    questions = RuleBased.generate_questions(context, num_questions, "mcq")
+    if not questions:
+        return {"quiz": [], "error": "Could not build questions from this document"}
+    return {"quiz": questions, "total": len(questions), "generator": "rules"}
+
+
+async def generate_quiz_with_agent(context: str, num_questions: int = 5, mode: str = None, document_id: str = None) -> dict:
+    """
+    Generate quiz questions using the AutoGen agent.
+    
+    Args:
+        context: The text content to generate questions from
+        num_questions: Number of questions to generate
+        mode: "llm" or "rules" (default: GENERATION_MODE); the agent falls
+              back to rules when it times out
+        document_id: document the context came from (default: the most recent
+              upload); its term index supplies distractors when available
+    
+    Returns:
+        dict with 'quiz' list containing formatted questions
+    """
+    if RuleBased.use_rules(mode):
+        return _rules_quiz(context, num_questions, "mode")
+    try:
+        # Run a quiz agent (from agent.py) and parse the response into structured quiz data
+        short_answer = settings.DISTRACTOR_ENGINE and await has_term_index(document_id)
+        try:
+            questions = await _ask_questions(context, num_questions, short_answer, document_id)
+        except asyncio.TimeoutError:
+            logger.warning("Quiz agent timed out, using rule-based questions")
+            return _rules_quiz(context, num_questions, "timeout")
         
-        # Get the response content
-        response_content = response.messages[-1].content
-        print(f"Agent response: {response_content[:200]}...")
+        # Ask only for the questions that were missing or malformed
+        for _ in range(settings.LLM_PARSE_RETRIES):
+            missing = num_questions - len(questions)
+            if missing <= 0:
+                break
+            avoid_text = f"\nDo not repeat: {'; '.join(q['question'] for q in questions[:10])}" if questions else ""
+            try:
+                questions.extend((await _ask_questions(context, missing, short_answer, document_id, avoid_text))[:missing])
+            except asyncio.TimeoutError:
+                record_rule_generation("timeout")
+                questions.extend(RuleBased.generate_questions(context, missing, "mcq", [q["question"] for q in questions]))
+                break
         
-        # Parse the response into structured quiz data
-        questions = parse_quiz_response(response_content)
+        for idx, parsed in enumerate(questions):
+            parsed["id"] = idx + 1
         
         if not questions:
             return {"quiz": [], "error": "Failed to parse quiz questions from agent response"}
@@ -121,23 +168,34 @@ Example: A|What is the capital of France?|Paris|London|Berlin|Madrid"""
         }
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Error in agent quiz generation: {e}")
+        logger.exception("Error in agent quiz generation")
         return {"quiz": [], "error": str(e)}
 
 
-async def generate_single_question_with_agent(context: str, previous_questions: list = None) -> dict:
+def _rules_single_question(context: str, previous_questions: list, reason: str) -> dict:
+    record_rule_generation(reason)
+    questions = RuleBased.generate_questions(context, 1, "mcq", previous_questions)
+    if not questions:
+        return {"error": "Failed to generate question"}
+    questions[0]["generator"] = "rules"
+    return questions[0]
+
+
+async def generate_single_question_with_agent(context: str, previous_questions: list = None, mode: str = None, document_id: str = None) -> dict:
     """
     Generate a single quiz question using the AutoGen agent.
     
     Args:
         context: The text content to generate question from
         previous_questions: List of previous question texts to avoid duplicates
+        mode: "llm" or "rules" (default: GENERATION_MODE)
+        document_id: document the context came from (default: the most recent upload)
     
     Returns:
         dict with single question data
     """
+    if RuleBased.use_rules(mode):
+        return _rules_single_question(context, previous_questions, "mode")
     try:
         avoid_text = ""
         if previous_questions:
@@ -160,24 +218,27 @@ Rules:
 
 Example: A|What is the capital of France?|Paris|London|Berlin|Madrid"""
 
-        # Run the Assistant agent (from agent.py)
-        response = await Assistant.run(task=[TextMessage(content=prompt, source='user')])
-        response_content = response.messages[-1].content
-        
-        # Parse single question
-        lines = response_content.strip().split('\n')
-        for line in lines:
-            if line.strip():
-                parsed = parse_quiz_line(line)
-                if parsed:
-                    parsed["id"] = 1
-                    parsed["explanation"] = f"The correct answer is {parsed['correctAnswerText']}"
-                    return parsed
+        # Run a quiz agent (from agent.py); re-ask only if no line was usable
+        short_answer = settings.DISTRACTOR_ENGINE and await has_term_index(document_id)
+        for _ in range(settings.LLM_PARSE_RETRIES + 1):
+            try:
+                if short_answer:
+                    questions = await _ask_questions(context, 1, True, document_id, avoid_text)
+                else:
+                    response = await run_agent(build_quiz_agent, prompt)
+                    questions = parse_quiz_response(response.messages[-1].content)
+            except asyncio.TimeoutError:
+                logger.warning("Quiz agent timed out, using a rule-based question")
+                return _rules_single_question(context, previous_questions, "timeout")
+            if questions:
+                parsed = questions[0]
+                parsed["id"] = 1
+                return parsed
         
         return {"error": "Failed to generate question"}
         
     except Exception as e:
-        print(f"Error generating single question: {e}")
+        logger.exception("Error generating single question")
         return {"error": str(e)}
 
 
@@ -188,60 +249,26 @@ def parse_flashcard_line(line: str) -> dict:
     Parse a single flashcard line into structured data.
     Format: FRONT|BACK
     """
-    try:
-        parts = line.split('|')
-        if len(parts) < 2:
-            print(f"Invalid flashcard format, expected 2 parts: {line}")
-            return None
-        
-        front = parts[0].strip()
-        back = parts[1].strip()
-        
-        # Validate we have content
-        if not front or not back:
-            print(f"Empty fields in flashcard line: {line}")
-            return None
-            
-        return {
-            "front": front,
-            "back": back
-        }
-    except Exception as e:
-        print(f"Error parsing flashcard line: {e}")
+    parsed = parse_pipe_line(line, expect="flashcard")
+    if parsed is None:
+        logger.debug("Invalid flashcard line: %s", line)
         return None
+    return parsed[1]
 
 
 def parse_flashcard_response(response_text: str) -> list:
     """
     Parse the full response from the flashcard agent into a list of flashcards.
+    Every valid line is kept; malformed lines are counted as parse failures.
     """
-    flashcards = []
-    lines = response_text.strip().split('\n')
-    
-    for idx, line in enumerate(lines):
-        if line.strip():
-            parsed = parse_flashcard_line(line)
-            if parsed:
-                parsed["id"] = idx + 1
-                flashcards.append(parsed)
-    
-    return flashcards
+    parser = parse_llm_output(response_text, expect="flashcard")
+    record_parse_failure(parser.failed)
+    return parser.flashcards
 
 
-async def generate_flashcards_with_agent(context: str, num_flashcards: int = 5) -> dict:
-    """
-    Generate flashcards using the flashcard agent.
-    
-    Args:
-        context: The text content to generate flashcards from
-        num_flashcards: Number of flashcards to generate
-    
-    Returns:
-        dict with 'flashcards' list containing formatted flashcards
-    """
-    try:
-        prompt = f"""Based on the following text, generate exactly {num_flashcards} flashcards.
-Each flashcard should capture a key concept, term, or fact from the text.
+def _flashcard_prompt(context: str, num_flashcards: int, avoid_text: str = "") -> str:
+    return f"""Based on the following text, generate exactly {num_flashcards} flashcards.
+Each flashcard should capture a key concept, term, or fact from the text.{avoid_text}
 
 TEXT:
 {context}
@@ -258,14 +285,56 @@ Rules:
 
 Example: What is photosynthesis?|The process by which plants convert sunlight into energy"""
 
-        # Run the flashcard_Agent (from agent.py)
-        response = await flashcard_Agent.run(task=[TextMessage(content=prompt, source='user')])
-        
-        response_content = response.messages[-1].content
-        print(f"Flashcard agent response: {response_content[:200]}...")
+
+def _rules_flashcards(context: str, num_flashcards: int, reason: str) -> dict:
+    record_rule_generation(reason)
+    flashcards = RuleBased.generate_flashcards(context, num_flashcards)
+    if not flashcards:
+        return {"flashcards": [], "error": "Could not build flashcards from this document"}
+    return {"flashcards": flashcards, "total": len(flashcards), "generator": "rules"}
+
+
+async def generate_flashcards_with_agent(context: str, num_flashcards: int = 5, mode: str = None) -> dict:
+    """
+    Generate flashcards using the flashcard agent.
+    
+    Args:
+        context: The text content to generate flashcards from
+        num_flashcards: Number of flashcards to generate
+        mode: "llm" or "rules" (default: GENERATION_MODE)
+    
+    Returns:
+        dict with 'flashcards' list containing formatted flashcards
+    """
+    if RuleBased.use_rules(mode):
+        return _rules_flashcards(context, num_flashcards, "mode")
+    try:
+        # Run a flashcard agent (from agent.py)
+        try:
+            response = await run_agent(build_flashcard_agent, _flashcard_prompt(context, num_flashcards))
+        except asyncio.TimeoutError:
+            logger.warning("Flashcard agent timed out, using rule-based flashcards")
+            return _rules_flashcards(context, num_flashcards, "timeout")
         
         # Parse the response into structured flashcard data
-        flashcards = parse_flashcard_response(response_content)
+        flashcards = parse_flashcard_response(response.messages[-1].content)
+        
+        # Ask only for the flashcards that were missing or malformed
+        for _ in range(settings.LLM_PARSE_RETRIES):
+            missing = num_flashcards - len(flashcards)
+            if missing <= 0:
+                break
+            avoid_text = f"\nDo not repeat: {'; '.join(f['front'] for f in flashcards[:10])}" if flashcards else ""
+            try:
+                response = await run_agent(build_flashcard_agent, _flashcard_prompt(context, missing, avoid_text))
+            except asyncio.TimeoutError:
+                record_rule_generation("timeout")
+                flashcards.extend(RuleBased.generate_flashcards(context, missing, [f["front"] for f in flashcards]))
+                break
+            flashcards.extend(parse_flashcard_response(response.messages[-1].content)[:missing])
+        
+        for idx, parsed in enumerate(flashcards):
+            parsed["id"] = idx + 1
         
         if not flashcards:
             return {"flashcards": [], "error": "Failed to parse flashcards from agent response"}
@@ -276,23 +345,33 @@ Example: What is photosynthesis?|The process by which plants convert sunlight in
         }
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Error in flashcard generation: {e}")
+        logger.exception("Error in flashcard generation")
         return {"flashcards": [], "error": str(e)}
 
 
-async def generate_single_flashcard_with_agent(context: str, previous_flashcards: list = None) -> dict:
+def _rules_single_flashcard(context: str, previous_flashcards: list, reason: str) -> dict:
+    record_rule_generation(reason)
+    flashcards = RuleBased.generate_flashcards(context, 1, previous_flashcards)
+    if not flashcards:
+        return {"error": "Failed to generate flashcard"}
+    flashcards[0]["generator"] = "rules"
+    return flashcards[0]
+
+
+async def generate_single_flashcard_with_agent(context: str, previous_flashcards: list = None, mode: str = None) -> dict:
     """
     Generate a single flashcard using the flashcard agent.
     
     Args:
         context: The text content to generate flashcard from
         previous_flashcards: List of previous flashcard fronts to avoid duplicates
+        mode: "llm" or "rules" (default: GENERATION_MODE)
     
     Returns:
         dict with single flashcard data (front, back)
     """
+    if RuleBased.use_rules(mode):
+        return _rules_single_flashcard(context, previous_flashcards, "mode")
     try:
         avoid_text = ""
         if previous_flashcards:
@@ -315,25 +394,23 @@ Rules:
 
 Example: What is photosynthesis?|The process by which plants convert sunlight into energy"""
 
-        # Run the flashcard_Agent (from agent.py)
-        response = await flashcard_Agent.run(task=[TextMessage(content=prompt, source='user')])
-        response_content = response.messages[-1].content
-        
-        print(f"Single flashcard response: {response_content}")
-        
-        # Parse single flashcard
-        lines = response_content.strip().split('\n')
-        for line in lines:
-            if line.strip():
-                parsed = parse_flashcard_line(line)
-                if parsed:
-                    parsed["id"] = 1
-                    return parsed
+        # Run a flashcard agent (from agent.py); re-ask only if no line was usable
+        for _ in range(settings.LLM_PARSE_RETRIES + 1):
+            try:
+                response = await run_agent(build_flashcard_agent, prompt)
+            except asyncio.TimeoutError:
+                logger.warning("Flashcard agent timed out, using a rule-based flashcard")
+                return _rules_single_flashcard(context, previous_flashcards, "timeout")
+            flashcards = parse_flashcard_response(response.messages[-1].content)
+            if flashcards:
+                parsed = flashcards[0]
+                parsed["id"] = 1
+                return parsed
         
         return {"error": "Failed to generate flashcard"}
         
     except Exception as e:
-        print(f"Error generating single flashcard: {e}")
+        logger.exception("Error generating single flashcard")
         return {"error": str(e)}
 
 
@@ -362,8 +439,8 @@ USER QUESTION:
 
 Provide a helpful, accurate, and concise answer based only on the context provided."""
 
-        # Run the Rag_assistant (from agent.py)
-        response = await Rag_assistant.run(task=[TextMessage(content=prompt, source='user')])
+        # Run a RAG agent (from agent.py)
+        response = await run_agent(build_rag_agent, prompt)
         response_content = response.messages[-1].content
         
         return {
@@ -372,5 +449,5 @@ Provide a helpful, accurate, and concise answer based only on the context provid
         }
         
     except Exception as e:
-        print(f"Error in RAG chat: {e}")
+        logger.exception("Error in RAG chat")
         return {"error": str(e), "query": query}
@@ -1,7 +1,45 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from config import settings
 
 pwd_context = CryptContext(schemes=["argon2"],deprecated = "auto")
 
+# Dedicated pool so argon2 never runs on the event loop (argon2-cffi releases the GIL)
+hash_executor = ThreadPoolExecutor(
+    max_workers=settings.HASH_WORKERS or min(4, os.cpu_count() or 1),
+    thread_name_prefix="argon2",
+)
+# Hash jobs running or waiting in the pool; beyond HASH_QUEUE_LIMIT new logins are shed
+_pending_hash_jobs = 0
+_pending_lock = threading.Lock()
+
+
+def _hash_job_done(future) -> None:
+    # Runs when the job itself ends, not when its caller gives up waiting
+    global _pending_hash_jobs
+    with _pending_lock:
+        _pending_hash_jobs -= 1
+
+
+async def _run_hash_job(func, *args):
+    global _pending_hash_jobs
+    with _pending_lock:
+        if _pending_hash_jobs >= settings.HASH_QUEUE_LIMIT:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        _pending_hash_jobs += 1
+    future = hash_executor.submit(func, *args)
+    future.add_done_callback(_hash_job_done)
+    return await asyncio.wrap_future(future)
+
+
 class AuthService:
     @staticmethod
     def hash_password(password:str)->str:
@@ -9,4 +47,16 @@ class AuthService:
     @staticmethod
     def verify_password(plain_password:str,hashed_password:str)->bool:
         return pwd_context.verify(plain_password,hashed_password)
-        
\ No newline at end of file
+
+    @staticmethod
+    async def hash_password_async(password:str)->str:
+        """hash_password run in the bounded hashing pool."""
+        return await _run_hash_job(pwd_context.hash,password)
+    @staticmethod
+    async def verify_and_update(plain_password:str,hashed_password:str)->tuple[bool,str|None]:
+        """
+        Verify in the bounded hashing pool.
+        Returns (is_valid, new_hash); new_hash is set when the stored hash uses
+        outdated parameters and should be replaced.
+        """
+        return await _run_hash_job(pwd_context.verify_and_update,plain_password,hashed_password)
@@ -0,0 +1,166 @@
+"""
+Chunk Service
+Compact per-host storage of a document's chunk texts: one file per document
+holding a UTF-8 blob and an offsets array, memory-mapped read-only. A chunk
+is decoded only when it is indexed, so sampling five chunks of a large
+document touches five slices of the file rather than a list of every text,
+and every worker on the host shares the same page cache.
+
+File layout (native byte order; the files never leave the host):
+    header   magic, version (content hash), chunk count
+    offsets  count + 1 uint64 byte offsets into the blob
+    blob     the chunk texts, UTF-8, back to back
+
+The same layout stores each kind of per-chunk text: "chunks" and
+"fact_sheets" (see fact_sheet_service), one file per document and kind.
+With a shared STATE_BACKEND the texts are also kept in the state namespace
+of the same name, and a host that has no file (or an outdated one) writes
+its own from there on first use. With STATE_BACKEND=memory the file is the
+only copy.
+"""
+import os
+import mmap
+import time
+import uuid
+import struct
+import asyncio
+import hashlib
+import logging
+from array import array
+from collections.abc import Sequence
+from config import settings
+from Services.state_service import state_store
+
+logger = logging.getLogger(__name__)
+
+STORE_DIRECTORY = "./chunk_store"
+KINDS = ("chunks", "fact_sheets")
+MAGIC = b"FQC1"
+HEADER = struct.Struct("=4s16sQ")
+# Files younger than this are never pruned: their registry entry may not be written yet
+PRUNE_MIN_AGE_SECONDS = 3600
+
+
+class ChunkStore(Sequence):
+    """Read-only sequence of a document's chunk texts, sliced from a memory-mapped file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a chunk store")
+        self.version = version.decode("ascii")
+        self._offsets = array("Q")
+        self._offsets.frombytes(self._map[HEADER.size:HEADER.size + self._offsets.itemsize * (count + 1)])
+        self._base = HEADER.size + self._offsets.itemsize * (count + 1)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._map)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._map[self._base + start:self._base + end].decode("utf-8")
+
+
+def chunk_path(document_id: str, kind: str = "chunks") -> str:
+    return os.path.join(STORE_DIRECTORY, f"{document_id}.{kind}")
+
+
+def write_chunks(document_id: str, texts: list, kind: str = "chunks") -> str:
+    """Write (or replace) a document's chunk file; returns its version."""
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = array("Q", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    digest = hashlib.sha1(offsets.tobytes())
+    for data in encoded:
+        digest.update(data)
+    version = digest.hexdigest()[:16]
+
+    os.makedirs(STORE_DIRECTORY, exist_ok=True)
+    path = chunk_path(document_id, kind)
+    # Written aside and renamed, so a reader never maps a half-written file
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, version.encode("ascii"), len(encoded)))
+        offsets.tofile(f)
+        f.writelines(encoded)
+    os.replace(temp_path, path)
+    return version
+
+
+def open_chunks(document_id: str, kind: str = "chunks") -> ChunkStore | None:
+    try:
+        return ChunkStore(chunk_path(document_id, kind))
+    except (FileNotFoundError, ValueError, struct.error):
+        return None
+
+
+def delete_chunks(document_id: str) -> None:
+    """Remove every kind of chunk file of the document."""
+    for kind in KINDS:
+        try:
+            os.remove(chunk_path(document_id, kind))
+        except OSError as e:
+            # Already gone, or still mapped on Windows (removed by a later prune)
+            logger.debug("delete_chunks %s.%s: %s", document_id, kind, e)
+
+
+async def save_chunks(document_id: str, texts: list, kind: str = "chunks") -> str:
+    """Store a document's chunks on this host (and in the shared state if there is one)."""
+    version = await asyncio.to_thread(write_chunks, document_id, texts, kind)
+    if settings.STATE_BACKEND != "memory":
+        await state_store.set(kind, document_id, texts)
+    return version
+
+
+async def registered_version(document_id: str, kind: str = "chunks") -> str | None:
+    """Version of the document's chunks (or other kind) in the shared registry."""
+    entry = await state_store.get("documents", document_id) or {}
+    return entry.get(f"{kind}_version")
+
+
+async def load_chunks(document_id: str, version: str = None, kind: str = "chunks") -> ChunkStore | None:
+    """
+    The document's chunk store on this host. A missing file, or one whose
+    version differs from the registry's, is rewritten from the shared state.
+    """
+    store = await asyncio.to_thread(open_chunks, document_id, kind)
+    if store is not None and version in (None, store.version):
+        return store
+    texts = await state_store.get(kind, document_id)
+    if not texts:
+        return store
+    await asyncio.to_thread(write_chunks, document_id, texts, kind)
+    return await asyncio.to_thread(open_chunks, document_id, kind)
+
+
+def prune(keep: set) -> int:
+    """Remove chunk files (and stale temp files) of documents not in keep. Returns the count."""
+    if not os.path.isdir(STORE_DIRECTORY):
+        return 0
+    removed = 0
+    cutoff = time.time() - PRUNE_MIN_AGE_SECONDS
+    for name in os.listdir(STORE_DIRECTORY):
+        path = os.path.join(STORE_DIRECTORY, name)
+        document_id, _, kind = name.partition(".")
+        if document_id in keep and kind in KINDS:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,183 @@
+"""
+Collection Service
+One Chroma collection per document, so search cost and disk use depend on the
+active document rather than on every upload ever made. Documents that have not
+been accessed for DOCUMENT_TTL_SECONDS and hold no references are evicted by a
+background job. Compacting the Chroma directory to reclaim disk is an offline
+command (python -m compact_chroma), since it must not run under live clients.
+"""
+import os
+import re
+import time
+import uuid
+import shutil
+import sqlite3
+import asyncio
+import logging
+import chromadb
+from config import settings
+from Services.state_service import state_store, chroma_write_lock
+from Services import chunk_service
+
+logger = logging.getLogger(__name__)
+
+PERSIST_DIRECTORY = "./chroma_db"
+COLLECTION_PREFIX = "doc_"
+# The single collection every upload went into before per-document collections
+LEGACY_COLLECTION = "langchain"
+UUID_DIR = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+# Only write a document's last access to shared state this often
+TOUCH_INTERVAL_SECONDS = 60
+
+if settings.CHROMA_HOST:
+    chroma_client = chromadb.HttpClient(host=settings.CHROMA_HOST, port=settings.CHROMA_PORT)
+else:
+    chroma_client = chromadb.PersistentClient(path=PERSIST_DIRECTORY)
+
+_last_touch = {}
+
+
+def collection_name(document_id: str) -> str:
+    return f"{COLLECTION_PREFIX}{document_id}"
+
+
+def get_collection(document_id: str):
+    return chroma_client.get_or_create_collection(
+        collection_name(document_id), metadata={"hnsw:space": "cosine"})
+
+
+def delete_collection(document_id: str) -> None:
+    with chroma_write_lock(PERSIST_DIRECTORY):
+        try:
+            chroma_client.delete_collection(collection_name(document_id))
+        except Exception as e:
+            # Already gone (e.g. evicted by another worker)
+            logger.debug("delete_collection %s: %s", document_id, e)
+
+
+async def touch(document_id: str) -> None:
+    """Record an access so the document is not evicted while in use."""
+    now = time.time()
+    if now - _last_touch.get(document_id, 0) < TOUCH_INTERVAL_SECONDS:
+        return
+    _last_touch[document_id] = now
+    # Its own key, so an access never overwrites a concurrent registry update
+    await state_store.set("document_access", document_id, now)
+
+
+async def add_reference(document_id: str, holder: str = None, ttl: float = None) -> str:
+    """
+    Pin a document against eviction (e.g. a live session or a saved deck).
+    References are separate keys, so concurrent workers never overwrite each
+    other's counts; a ttl makes a reference expire if its holder crashes.
+    """
+    holder = holder or uuid.uuid4().hex
+    await state_store.set("document_refs", f"{document_id}:{holder}", 1, ttl=ttl)
+    return holder
+
+
+async def remove_reference(document_id: str, holder: str) -> None:
+    await state_store.delete("document_refs", f"{document_id}:{holder}")
+
+
+async def reference_count(document_id: str) -> int:
+    return sum(1 for key in await state_store.keys("document_refs") if key.startswith(f"{document_id}:"))
+
+
+async def evict_document(document_id: str) -> None:
+    """Drop a document's collection, chunks, indexes and registry entry."""
+    await asyncio.to_thread(delete_collection, document_id)
+    await asyncio.to_thread(chunk_service.delete_chunks, document_id)
+    await state_store.delete("chunks", document_id)
+    await state_store.delete("fact_sheets", document_id)
+    await state_store.delete("term_index", document_id)
+    await state_store.delete("topic_index", document_id)
+    await state_store.delete("documents", document_id)
+    await state_store.delete("document_access", document_id)
+    _last_touch.pop(document_id, None)
+    logger.info("Evicted document %s", document_id)
+
+
+async def collect_garbage(now: float = None) -> list:
+    """Evict expired, unreferenced documents. Returns the evicted ids."""
+    now = now or time.time()
+    active = await state_store.get("documents", "active")
+    referenced = {key.split(":", 1)[0] for key in await state_store.keys("document_refs")}
+    evicted = []
+    for document_id in await state_store.keys("documents"):
+        if document_id in ("active", active) or document_id in referenced:
+            continue
+        last_access = await state_store.get("document_access", document_id)
+        if last_access is None:
+            entry = await state_store.get("documents", document_id) or {}
+            last_access = entry.get("last_access", entry.get("created_at", 0))
+        if now - last_access > settings.DOCUMENT_TTL_SECONDS:
+            await evict_document(document_id)
+            evicted.append(document_id)
+    return evicted
+
+
+def drop_legacy_collection() -> bool:
+    """Delete the pre-per-document "langchain" collection, if still there. True if it was."""
+    with chroma_write_lock(PERSIST_DIRECTORY):
+        try:
+            chroma_client.delete_collection(LEGACY_COLLECTION)
+        except Exception:
+            # Never existed, or already dropped by another worker
+            return False
+    logger.info("Deleted the legacy %r collection; run python -m compact_chroma to reclaim its disk",
+                LEGACY_COLLECTION)
+    return True
+
+
+def compact() -> dict:
+    """
+    Reclaim disk in a local persistent Chroma directory: remove segment
+    directories no longer referenced by Chroma's catalog, then VACUUM it.
+    Other processes' Chroma clients do not expect either, so this runs only
+    from the offline compact_chroma command, with the app stopped.
+    """
+    if settings.CHROMA_HOST:
+        return {"skipped": "remote chroma"}
+    catalog = os.path.join(PERSIST_DIRECTORY, "chroma.sqlite3")
+    if not os.path.exists(catalog):
+        return {"removed_dirs": 0}
+    with chroma_write_lock(PERSIST_DIRECTORY):
+        conn = sqlite3.connect(catalog)
+        try:
+            live = {row[0] for row in conn.execute("SELECT id FROM segments")}
+            removed = 0
+            for name in os.listdir(PERSIST_DIRECTORY):
+                path = os.path.join(PERSIST_DIRECTORY, name)
+                if UUID_DIR.match(name) and name not in live and os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+    return {"removed_dirs": removed}
+
+
+async def run_maintenance(interval: float = None) -> None:
+    """
+    Background loop started from the app lifespan: drop the legacy
+    collection once, then evict, and drop this host's chunk files of
+    documents evicted elsewhere.
+    """
+    interval = interval or settings.DOCUMENT_GC_INTERVAL_SECONDS
+    try:
+        await asyncio.to_thread(drop_legacy_collection)
+    except Exception:
+        logger.exception("Dropping the legacy collection failed")
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            evicted = await collect_garbage()
+            if evicted:
+                logger.info("Evicted %d documents", len(evicted))
+            known = set(await state_store.keys("documents"))
+            pruned = await asyncio.to_thread(chunk_service.prune, known)
+            if pruned:
+                logger.info("Removed %d chunk files of evicted documents", pruned)
+        except Exception:
+            logger.exception("Document maintenance failed")
@@ -0,0 +1,201 @@
+"""
+Distractor Service
+Per-document index of key terms and phrases, built at ingestion, used to
+pick MCQ distractors so the LLM only has to write the question and the
+correct answer. Term embeddings are kept in one contiguous, L2-normalised
+float32 matrix; distractors for a whole batch of answers come from a
+single matrix product.
+"""
+import base64
+import random
+import asyncio
+import logging
+import numpy as np
+from Services.cache_service import TTLCache
+from Services.state_service import state_store
+from Services.chunk_service import registered_version
+from Services import rulebased_service as RuleBased
+
+logger = logging.getLogger(__name__)
+
+MAX_TERMS = 1000
+# Below this many terms the index cannot offer three useful distractors
+MIN_TERMS = 8
+# Candidates at least this close to the answer are paraphrases of it, not distractors
+PARAPHRASE_SIMILARITY = 0.9
+# Candidates examined per answer before falling back to a full sort
+CANDIDATES_PER_DISTRACTOR = 4
+
+# (document_id, chunks version) -> TermIndex; a re-upload on any worker changes the version
+index_cache = TTLCache(maxsize=32, ttl=300)
+
+
+def _embed(texts: list) -> list:
+    # Imported lazily: rag_service imports this module to build indexes at ingestion
+    from Services.rag_service import embeddings
+    return embeddings.embed_documents(texts)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+class TermIndex:
+    """Terms of one document and their embeddings (row i belongs to terms[i])."""
+
+    def __init__(self, terms: list, matrix: np.ndarray):
+        self.terms = terms
+        self.matrix = _normalize(np.asarray(matrix, dtype=np.float32))
+        self._rows = {term.lower(): i for i, term in enumerate(terms)}
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def unknown(self, answers: list) -> list:
+        """The answers that are not indexed terms, i.e. those vectors_for embeds."""
+        return [answer for answer in answers if answer.lower() not in self._rows]
+
+    def vectors_for(self, answers: list, embed=_embed) -> np.ndarray:
+        """Answer vectors: reuse the row of an indexed term, embed the rest in one batch."""
+        vectors = np.empty((len(answers), self.matrix.shape[1]), dtype=np.float32)
+        missing = []
+        for i, answer in enumerate(answers):
+            row = self._rows.get(answer.lower())
+            if row is None:
+                missing.append(i)
+            else:
+                vectors[i] = self.matrix[row]
+        if missing:
+            vectors[missing] = _normalize(np.asarray(embed([answers[i] for i in missing]), dtype=np.float32))
+        return vectors
+
+    def nearest(self, answers: list, count: int = 3, embed=_embed) -> list:
+        """
+        For each answer, the `count` most similar terms that are not the answer
+        itself, do not contain it (or vice versa) and are not near-paraphrases.
+        """
+        if not answers:
+            return []
+        scores = self.vectors_for(answers, embed) @ self.matrix.T
+        k = min(len(self.terms), count * CANDIDATES_PER_DISTRACTOR + 1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        results = []
+        for i, answer in enumerate(answers):
+            row = scores[i]
+            candidates = top[i][np.argsort(-row[top[i]])]
+            picked = self._pick(answer, row, candidates, count)
+            if len(picked) < count:
+                # Rare: most near neighbours were paraphrases; widen to the whole index
+                picked = self._pick(answer, row, np.argsort(-row), count)
+            results.append(picked)
+        return results
+
+    def _pick(self, answer: str, row: np.ndarray, candidates, count: int) -> list:
+        answer_lower = answer.lower()
+        picked, seen = [], {answer_lower}
+        for j in candidates:
+            term = self.terms[j]
+            term_lower = term.lower()
+            if (row[j] >= PARAPHRASE_SIMILARITY or term_lower in seen
+                    or term_lower in answer_lower or answer_lower in term_lower):
+                continue
+            seen.add(term_lower)
+            picked.append(term)
+            if len(picked) == count:
+                break
+        return picked
+
+    def to_payload(self) -> dict:
+        # float16 halves the shared-state entry; precision loss is irrelevant for ranking
+        return {
+            "terms": self.terms,
+            "dim": int(self.matrix.shape[1]),
+            "vectors": base64.b64encode(self.matrix.astype(np.float16).tobytes()).decode("ascii"),
+        }
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "TermIndex":
+        raw = np.frombuffer(base64.b64decode(payload["vectors"]), dtype=np.float16)
+        return cls(payload["terms"], raw.reshape(-1, payload["dim"]).astype(np.float32))
+
+
+def extract_terms(chunks: list) -> list:
+    """Key terms and phrases of a document, best first."""
+    sentences = [s for chunk in chunks for s in RuleBased.split_sentences(chunk)]
+    return RuleBased.extract_keyphrases(sentences, top_k=MAX_TERMS)
+
+
+def build_term_index(chunks: list, embed=_embed) -> TermIndex | None:
+    """Extract key terms from a document's chunks and embed them in one batch."""
+    terms = extract_terms(chunks)
+    if len(terms) < MIN_TERMS:
+        return None
+    return TermIndex(terms, np.asarray(embed(terms), dtype=np.float32))
+
+
+async def save_term_index(document_id: str, index: TermIndex | None) -> None:
+    if index is None:
+        await state_store.delete("term_index", document_id)
+        return
+    await state_store.set("term_index", document_id, index.to_payload())
+
+
+async def load_term_index(document_id: str = None, version: str = None) -> TermIndex | None:
+    """Term index of a document (default: the most recent upload), or None."""
+    document_id = document_id or await state_store.get("documents", "active")
+    if document_id is None:
+        return None
+    key = (document_id, version or await registered_version(document_id))
+    index = index_cache.get(key)
+    if index is None:
+        payload = await state_store.get("term_index", document_id)
+        if payload is None:
+            return None
+        index = TermIndex.from_payload(payload)
+        index_cache.set(key, index)
+    return index
+
+
+async def has_term_index(document_id: str = None) -> bool:
+    index = await load_term_index(document_id)
+    return index is not None and len(index) >= MIN_TERMS
+
+
+def assemble_mcq(item: dict, distractors: list) -> dict:
+    """Turn a question + answer item into the standard four-option MCQ."""
+    answer = item.pop("answer")
+    options = [answer] + distractors[:3]
+    random.shuffle(options)
+    item["options"] = options
+    item["correctAnswer"] = options.index(answer)
+    item["correctAnswerText"] = answer
+    item["type"] = "mcq"
+    item.setdefault("explanation", f"The correct answer is {answer}")
+    return item
+
+
+async def complete_questions(questions: list, document_id: str = None) -> list:
+    """
+    Give every question + answer item its options from the document's term
+    index. Items that already have options pass through; items that cannot
+    get three distractors are dropped (callers re-request missing items).
+    """
+    pending = [q for q in questions if "options" not in q]
+    if not pending:
+        return questions
+    index = await load_term_index(document_id)
+    if index is None:
+        return [q for q in questions if "options" in q]
+
+    distractors = await asyncio.to_thread(index.nearest, [q["answer"] for q in pending])
+    by_id = {id(q): d for q, d in zip(pending, distractors)}
+    completed = []
+    for q in questions:
+        if "options" in q:
+            completed.append(q)
+        elif len(by_id[id(q)]) >= 3:
+            completed.append(assemble_mcq(q, by_id[id(q)]))
+    return completed
@@ -0,0 +1,251 @@
+"""
+Embedding Service
+Sentence embeddings with dynamic micro-batching. Calls from any thread or
+request are queued; one model thread takes whatever arrived within
+EMBED_BATCH_WAIT_MS (up to EMBED_BATCH_SIZE texts) and runs a single
+forward pass for all of them, so concurrent grading, chat and ingestion
+calls share batches instead of running one batch-of-one pass each.
+
+With EMBEDDING_SERVER set (a unix socket path, or host:port), workers hold
+no model at all: they send texts to one `python -m embedding_server`
+process, which batches requests from every worker on the host.
+
+Both expose embed_documents / embed_query like the LangChain embeddings
+they replace, and aembed_documents for the event loop. Wire format (one request per frame, frames are a 4-byte
+big-endian length followed by the payload):
+    request   JSON list of texts
+    response  b"\\x00" + count, dim (uint32) + count * dim float32   or
+              b"\\x01" + UTF-8 error message
+"""
+import json
+import time
+import queue
+import socket
+import struct
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+import numpy as np
+from config import settings
+from Services.metrics_service import Histogram
+
+logger = logging.getLogger(__name__)
+
+FRAME = struct.Struct(">I")
+SHAPE = struct.Struct("<II")
+OK, ERROR = b"\x00", b"\x01"
+# Each side refuses frames larger than this (a few thousand chunk texts)
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+embed_batch_texts = Histogram(
+    "flashquiz_embed_batch_texts", "Texts per embedding model call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+
+
+class MicroBatcher:
+    """embed_documents for any number of threads, merged into few model calls by one model thread."""
+
+    def __init__(self, model, max_batch: int = None, wait_ms: float = None):
+        self.model = model
+        self.max_batch = max_batch or settings.EMBED_BATCH_SIZE
+        self.wait = (settings.EMBED_BATCH_WAIT_MS if wait_ms is None else wait_ms) / 1000
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list) -> Future:
+        """Queue texts; the future resolves to their vectors. Await it with asyncio.wrap_future."""
+        future = Future()
+        if not texts:
+            future.set_result([])
+        else:
+            self._queue.put((list(texts), future))
+        return future
+
+    def embed_documents(self, texts: list) -> list:
+        return self.submit(texts).result()
+
+    async def aembed_documents(self, texts: list) -> list:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.wait
+        while size < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self) -> None:
+        # The only model thread: nothing a caller does may end it
+        while True:
+            try:
+                self._embed(self._collect())
+            except Exception:
+                logger.exception("Embedding batch failed")
+
+    def _embed(self, batch: list) -> None:
+        # Skip requests whose waiter gave up (a cancelled asyncio.wrap_future
+        # cancels the future); the rest can no longer be cancelled
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for item, _ in batch for text in item]
+        try:
+            vectors = []
+            # One request may be larger than a batch (document ingestion)
+            for start in range(0, len(texts), self.max_batch):
+                part = texts[start:start + self.max_batch]
+                embed_batch_texts.observe(len(part))
+                vectors.extend(self.model.embed_documents(part))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        position = 0
+        for item, future in batch:
+            future.set_result(vectors[position:position + len(item)])
+            position += len(item)
+
+
+# ============== SHARED EMBEDDING SERVER ==============
+
+def parse_address(address: str):
+    """'host:port' -> (host, port) for TCP; anything else is a unix socket path."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def encode_vectors(vectors: list) -> bytes:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    count, dim = matrix.shape if matrix.ndim == 2 else (0, 0)
+    return OK + SHAPE.pack(count, dim) + matrix.tobytes()
+
+
+def decode_vectors(payload: bytes) -> list:
+    if payload[:1] != OK:
+        raise RuntimeError(f"Embedding server error: {payload[1:].decode('utf-8', 'replace')}")
+    count, dim = SHAPE.unpack_from(payload, 1)
+    matrix = np.frombuffer(payload, dtype=np.float32, offset=1 + SHAPE.size, count=count * dim)
+    return matrix.reshape(count, dim).tolist()
+
+
+def _read_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        block = sock.recv(size - len(data))
+        if not block:
+            raise ConnectionError("Embedding server closed the connection")
+        data += block
+    return bytes(data)
+
+
+class RemoteEmbeddings:
+    """Embeddings computed by the shared embedding server; thread-safe, one connection per concurrent call."""
+
+    def __init__(self, address: str, timeout: float = 60):
+        self.address = parse_address(address)
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        family = socket.AF_INET if isinstance(self.address, tuple) else socket.AF_UNIX
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.address)
+        return sock
+
+    def _request(self, sock: socket.socket, data: bytes) -> bytes:
+        sock.sendall(FRAME.pack(len(data)) + data)
+        (size,) = FRAME.unpack(_read_exact(sock, FRAME.size))
+        if size > MAX_FRAME_BYTES:
+            raise ConnectionError("Embedding server response too large")
+        return _read_exact(sock, size)
+
+    def embed_documents(self, texts: list) -> list:
+        if not texts:
+            return []
+        data = json.dumps(list(texts)).encode("utf-8")
+        with self._lock:
+            sock = self._idle.pop() if self._idle else None
+        # A pooled connection may have gone stale (server restart): retry once on a new one
+        for attempt in range(2):
+            if sock is None:
+                sock = self._connect()
+            try:
+                payload = self._request(sock, data)
+                break
+            except OSError:
+                sock.close()
+                sock = None
+                if attempt:
+                    raise
+        with self._lock:
+            self._idle.append(sock)
+        return decode_vectors(payload)
+
+    async def aembed_documents(self, texts: list) -> list:
+        # Blocking socket round trip: keep it off the event loop
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+
+async def serve(address: str, batcher: MicroBatcher) -> None:
+    """Answer embedding requests from any number of connections through one batcher."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                (size,) = FRAME.unpack(await reader.readexactly(FRAME.size))
+                if size > MAX_FRAME_BYTES:
+                    break
+                payload = await reader.readexactly(size)
+                try:
+                    vectors = await asyncio.wrap_future(batcher.submit(json.loads(payload)))
+                    response = encode_vectors(vectors)
+                except Exception as e:
+                    logger.exception("Embedding request failed")
+                    response = ERROR + str(e).encode("utf-8")
+                writer.write(FRAME.pack(len(response)) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    target = parse_address(address)
+    if isinstance(target, tuple):
+        server = await asyncio.start_server(handle, *target)
+    else:
+        server = await asyncio.start_unix_server(handle, target)
+    logger.info("Embedding server listening on %s", address)
+    async with server:
+        await server.serve_forever()
+
+
+def load_model(model_name: str = None):
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name or settings.EMBEDDING_MODEL)
+
+
+def create_embeddings():
+    """The embeddings used by the app: the shared server if configured, else a local batched model."""
+    if settings.EMBEDDING_SERVER:
+        logger.info("Using the embedding server at %s", settings.EMBEDDING_SERVER)
+        return RemoteEmbeddings(settings.EMBEDDING_SERVER)
+    return MicroBatcher(load_model())
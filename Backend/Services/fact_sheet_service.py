@@ -0,0 +1,138 @@
+"""
+Fact Sheet Service
+Compact per-chunk fact sheets for generation prompts. Each chunk is
+distilled once at ingestion into a few key facts and terms, stored next to
+the chunk texts (chunk_service kind "fact_sheets", same numbering), and
+question / flashcard prompts are built from the sheets instead of re-sending
+raw chunk text on every request.
+
+    FACT_SHEETS=off    raw chunks in prompts (default)
+    FACT_SHEETS=rules  extractive: the sentences covering the chunk's key
+                       phrases, plus the phrases; no LLM, built during upload
+    FACT_SHEETS=llm    the model writes the sheets, FACT_SHEET_BATCH chunks
+                       per call, in the background after upload; chunks it
+                       could not summarise get the extractive sheet
+
+A sheet looks like:
+    Terms: light reactions; Calvin cycle; stomata
+    - The Calvin cycle fixes carbon dioxide into sugars.
+    - ...
+"""
+import re
+import asyncio
+import logging
+from config import settings
+from Services import rulebased_service as RuleBased
+
+logger = logging.getLogger(__name__)
+
+MAX_FACTS = 3
+MAX_TERMS = 6
+# Parenthetical asides and leading connectives carry no quizzable fact
+PARENTHETICAL = re.compile(r"\s*\([^()]{0,80}\)")
+CONNECTIVE = re.compile(r"^(?:however|moreover|furthermore|in addition|additionally|also|thus|therefore|"
+                        r"for example|for instance|in fact|as a result|in other words),\s+", re.IGNORECASE)
+SHEET_LINE = re.compile(r"^\s*\[?(\d+)\]?\s*\|(.*)$")
+
+
+def use_fact_sheets(mode: str = None) -> bool:
+    """Fact sheets feed LLM prompts; rule-based generation keeps the full text."""
+    return settings.FACT_SHEETS != "off" and not RuleBased.use_rules(mode)
+
+
+def format_sheet(facts: list, terms: list) -> str:
+    lines = ["Terms: " + "; ".join(terms)] if terms else []
+    lines.extend(f"- {fact}" for fact in facts)
+    return "\n".join(lines)
+
+
+def _compress(sentence: str) -> str:
+    sentence = CONNECTIVE.sub("", PARENTHETICAL.sub("", sentence)).strip()
+    return sentence[:1].upper() + sentence[1:]
+
+
+def rules_sheet(chunk: str) -> str:
+    """
+    Extractive sheet: greedily pick the sentences that cover the most key
+    phrases not yet covered (shorter first on ties), kept in text order.
+    Empty when the chunk has no usable sentences.
+    """
+    sentences = RuleBased.split_sentences(chunk)
+    if not sentences:
+        return ""
+    terms = RuleBased.extract_keyphrases(sentences, MAX_TERMS)
+    lowered = [sentence.lower() for sentence in sentences]
+    uncovered = {term.lower() for term in terms}
+    chosen = []
+    while uncovered and len(chosen) < MAX_FACTS:
+        best = max(
+            (i for i in range(len(sentences)) if i not in chosen),
+            key=lambda i: (sum(term in lowered[i] for term in uncovered), -len(sentences[i])),
+            default=None,
+        )
+        if best is None or not any(term in lowered[best] for term in uncovered):
+            break
+        chosen.append(best)
+        uncovered = {term for term in uncovered if term not in lowered[best]}
+    if not chosen:
+        chosen = [0]
+    return format_sheet([_compress(sentences[i]) for i in sorted(chosen)], terms)
+
+
+def build_rules_sheets(chunks: list) -> list:
+    return [rules_sheet(chunk) for chunk in chunks]
+
+
+def _sheets_prompt(chunks: list) -> str:
+    passages = "\n\n".join(f"[{n}] {chunk}" for n, chunk in enumerate(chunks, 1))
+    return f"""Summarise each numbered passage as its key facts and terms, for writing quiz questions later.
+
+{passages}
+
+Write one line per passage in this EXACT format using | as delimiter:
+N|FACT; FACT; FACT|TERM, TERM, TERM
+
+Rules:
+- N is the passage number
+- At most {MAX_FACTS} facts per passage, each a short self-contained statement from the passage
+- At most {MAX_TERMS} key terms, copied exactly from the passage
+- Output ONLY data lines, no headers or explanations"""
+
+
+def parse_sheets(text: str, count: int) -> dict:
+    """Passage number (0-based) -> sheet, for the well-formed lines of a response."""
+    sheets = {}
+    for line in text.splitlines():
+        match = SHEET_LINE.match(line)
+        if not match:
+            continue
+        n = int(match.group(1)) - 1
+        fields = match.group(2).split("|")
+        facts = [f.strip() for f in fields[0].split(";") if f.strip()][:MAX_FACTS]
+        terms = [t.strip() for t in fields[1].split(",") if t.strip()][:MAX_TERMS] if len(fields) > 1 else []
+        if 0 <= n < count and facts:
+            sheets[n] = format_sheet(facts, terms)
+    return sheets
+
+
+async def build_llm_sheets(chunks: list, complete) -> list:
+    """
+    Sheets written by the model; complete(prompt) -> text is the caller's LLM
+    call. Batches run FACT_SHEET_CONCURRENCY at a time; any chunk without a
+    usable line in the response falls back to its extractive sheet.
+    """
+    batch = settings.FACT_SHEET_BATCH
+    slots = asyncio.Semaphore(settings.FACT_SHEET_CONCURRENCY)
+
+    async def summarise(start: int) -> list:
+        part = chunks[start:start + batch]
+        async with slots:
+            try:
+                sheets = parse_sheets(await complete(_sheets_prompt(part)), len(part))
+            except Exception as e:
+                logger.warning("Fact sheet call failed for chunks %d-%d: %s", start, start + len(part) - 1, e)
+                sheets = {}
+        return [sheets.get(n) or rules_sheet(chunk) for n, chunk in enumerate(part)]
+
+    results = await asyncio.gather(*(summarise(start) for start in range(0, len(chunks), batch)))
+    return [sheet for part in results for sheet in part]
@@ -0,0 +1,121 @@
+"""
+Flashcard Service
+Persists generated flashcards per user and schedules reviews with SM-2.
+Every card carries its own due time, and the due queue is read through the
+(user_id, due_at) index, so fetching the next cards is a short range scan no
+matter how large the deck is.
+"""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from Api.Models.flashcard import Flashcard
+
+MIN_EASE_FACTOR = 1.3
+# Grades below this count as a lapse and restart the card's schedule
+PASSING_QUALITY = 3
+MAX_DUE_CARDS = 100
+
+
+def sm2(card: Flashcard, quality: int, now: datetime = None) -> Flashcard:
+    """Apply one SM-2 review (quality 0-5) to the card's schedule."""
+    now = now or datetime.now(timezone.utc)
+    if quality < PASSING_QUALITY:
+        card.repetitions = 0
+        card.interval_days = 1.0
+        card.lapses += 1
+    else:
+        card.repetitions += 1
+        if card.repetitions == 1:
+            card.interval_days = 1.0
+        elif card.repetitions == 2:
+            card.interval_days = 6.0
+        else:
+            card.interval_days = round(card.interval_days * card.ease_factor, 2)
+    # Ease moves on every review, failed ones included
+    card.ease_factor = max(
+        MIN_EASE_FACTOR,
+        card.ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02),
+    )
+    card.last_reviewed_at = now
+    card.due_at = now + timedelta(days=card.interval_days)
+    return card
+
+
+CARD_COLUMNS = (
+    Flashcard.id, Flashcard.front, Flashcard.back, Flashcard.document_id, Flashcard.due_at,
+    Flashcard.interval_days, Flashcard.repetitions, Flashcard.ease_factor,
+)
+
+
+def _card(card) -> dict:
+    """Serialise a Flashcard (or a row of CARD_COLUMNS)."""
+    return {
+        "id": card.id,
+        "front": card.front,
+        "back": card.back,
+        "document_id": card.document_id,
+        "due_at": card.due_at.isoformat(),
+        "interval_days": card.interval_days,
+        "repetitions": card.repetitions,
+        "ease_factor": round(card.ease_factor, 2),
+    }
+
+
+async def save_flashcards(session: AsyncSession, user_id: int, cards: list, document_id: str = None) -> list:
+    """
+    Store cards (dicts with front/back) for a user; new cards are due now.
+    Cards whose front already exists for the same user and document are skipped.
+    """
+    # Compare as stored: fronts are truncated to the column length
+    fronts = {str(c["front"]).strip()[:500] for c in cards if c.get("front") and c.get("back")}
+    if not fronts:
+        return []
+    query = select(Flashcard.front).where(
+        Flashcard.user_id == user_id,
+        Flashcard.document_id == document_id if document_id else Flashcard.document_id.is_(None),
+        Flashcard.front.in_(fronts),
+    )
+    existing = set((await session.execute(query)).scalars())
+
+    saved = []
+    for card in cards:
+        front = str(card.get("front") or "").strip()[:500]
+        back = str(card.get("back") or "").strip()[:1000]
+        if not front or not back or front in existing:
+            continue
+        existing.add(front)
+        flashcard = Flashcard(user_id=user_id, document_id=document_id, front=front, back=back)
+        session.add(flashcard)
+        saved.append(flashcard)
+    await session.commit()
+    return [_card(card) for card in saved]
+
+
+async def get_due_cards(session: AsyncSession, user_id: int, limit: int = 20, now: datetime = None) -> list:
+    """The user's cards due at `now`, most overdue first (index range scan)."""
+    now = now or datetime.now(timezone.utc)
+    # Plain column rows: no ORM identity-map work on the hot path
+    query = (
+        select(*CARD_COLUMNS)
+        .where(Flashcard.user_id == user_id, Flashcard.due_at <= now)
+        .order_by(Flashcard.due_at)
+        .limit(min(limit, MAX_DUE_CARDS))
+    )
+    return [_card(row) for row in (await session.execute(query)).all()]
+
+
+async def get_next_due_at(session: AsyncSession, user_id: int) -> datetime | None:
+    """When the user's next card becomes due (first entry of the index range)."""
+    query = select(func.min(Flashcard.due_at)).where(Flashcard.user_id == user_id)
+    return (await session.execute(query)).scalar()
+
+
+async def review_card(session: AsyncSession, user_id: int, card_id: int, quality: int) -> dict | None:
+    """Record a review; returns the updated card, or None if it is not the user's."""
+    card = await session.get(Flashcard, card_id)
+    if card is None or card.user_id != user_id:
+        return None
+    sm2(card, quality)
+    await session.commit()
+    return _card(card)
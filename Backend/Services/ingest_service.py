@@ -0,0 +1,193 @@
+"""
+Ingest Service
+PDF parsing and chunking are CPU-bound pure Python, so they run in a pool of
+worker processes instead of on the event loop. The pool size is the
+CPU-aware limit on how many files are parsed at once; embedding happens
+afterwards in the parent, batched across every file of an upload.
+
+Chunking strategies (CHUNK_STRATEGY), sized by CHUNK_SIZE / CHUNK_OVERLAP
+(characters; tokens for "token"):
+    fixed     recursive character splitter, the original behaviour
+    page      one chunk per page; pages over PAGE_SIZE_FACTOR x CHUNK_SIZE are split
+    sentence  whole sentences packed up to CHUNK_SIZE (no overlap, never cut mid-sentence)
+    token     tiktoken-counted windows, matching how the LLM bills context
+Fewer, larger chunks mean fewer embeddings and vectors; see
+benchmarks/chunking_benchmark.py for the retrieval side of the trade-off.
+
+Every page is hashed. A re-upload passes the hashes of the version it
+replaces (`known`), and only pages with new content are split; merge_pages
+then lays out the new version page by page, taking the chunks of unchanged
+pages from the previous one. No strategy lets a chunk span two pages.
+
+Kept free of app imports (models, database, embeddings) so that spawned
+workers only load the PDF loader and text splitter.
+"""
+import os
+import re
+import time
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+# "page" keeps pages up to this many times CHUNK_SIZE whole
+PAGE_SIZE_FACTOR = 4
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_executor = None
+
+
+def _chunk(text: str, metadata: dict) -> dict:
+    return {"text": text, "metadata": dict(metadata)}
+
+
+def split_fixed(documents: list, chunk_size: int, chunk_overlap: int) -> list:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [_chunk(c.page_content, c.metadata) for c in splitter.split_documents(documents)]
+
+
+def split_pages(documents: list, chunk_size: int, chunk_overlap: int) -> list:
+    limit = chunk_size * PAGE_SIZE_FACTOR
+    chunks, oversized = [], []
+    for document in documents:
+        if len(document.page_content) > limit:
+            oversized.append(document)
+        elif document.page_content.strip():
+            chunks.append(_chunk(document.page_content, document.metadata))
+    if oversized:
+        chunks.extend(split_fixed(oversized, limit, chunk_overlap))
+    return chunks
+
+
+def split_sentences(documents: list, chunk_size: int, chunk_overlap: int) -> list:
+    """Pack consecutive sentences of a page; a sentence longer than chunk_size is its own chunk."""
+    chunks = []
+    for document in documents:
+        current = ""
+        for sentence in SENTENCE_END.split(" ".join(document.page_content.split())):
+            if current and len(current) + 1 + len(sentence) > chunk_size:
+                chunks.append(_chunk(current, document.metadata))
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        if current:
+            chunks.append(_chunk(current, document.metadata))
+    return chunks
+
+
+def split_tokens(documents: list, chunk_size: int, chunk_overlap: int) -> list:
+    from langchain_text_splitters import TokenTextSplitter
+    splitter = TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [_chunk(c.page_content, c.metadata) for c in splitter.split_documents(documents)]
+
+
+STRATEGIES = {
+    "fixed": split_fixed,
+    "page": split_pages,
+    "sentence": split_sentences,
+    "token": split_tokens,
+}
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def load_and_split(path: str, strategy: str = "fixed", chunk_size: int = CHUNK_SIZE,
+                   chunk_overlap: int = CHUNK_OVERLAP, known: frozenset = frozenset()) -> dict:
+    """
+    Parse one PDF and split it with the given strategy (runs in a worker
+    process). Pages whose hash is in known are hashed but not split.
+    """
+    from langchain_community.document_loaders import PyPDFLoader
+
+    start = time.perf_counter()
+    documents = PyPDFLoader(path).load()
+    parsed = time.perf_counter()
+    hashes = [page_hash(document.page_content) for document in documents]
+    for number, document in enumerate(documents):
+        # Chunks are attributed to their page by this number (see merge_pages)
+        document.metadata["page"] = number
+    changed = [document for document, digest in zip(documents, hashes) if digest not in known]
+    chunks = STRATEGIES[strategy](changed, chunk_size, chunk_overlap)
+    return {
+        "pages": len(documents),
+        "page_hashes": hashes,
+        "page_metadatas": [document.metadata for document in documents],
+        "texts": [chunk["text"] for chunk in chunks],
+        "metadatas": [chunk["metadata"] for chunk in chunks],
+        "parse_seconds": parsed - start,
+        "split_seconds": time.perf_counter() - parsed,
+    }
+
+
+def page_layout(page_hashes: list, page_chunks: list) -> dict:
+    """Page hash -> (first chunk number, chunk count) of a page-ordered version."""
+    layout, start = {}, 0
+    for digest, count in zip(page_hashes, page_chunks):
+        layout.setdefault(digest, (start, count))
+        start += count
+    return layout
+
+
+def merge_pages(parts: dict, layout: dict) -> dict:
+    """
+    Lay out a new version page by page. Each chunk is (page, previous chunk
+    number, None) for a page found in the previous version's layout, or
+    (page, None, index into parts) for a page split just now.
+    """
+    split = {}
+    for index, metadata in enumerate(parts["metadatas"]):
+        split.setdefault(metadata["page"], []).append(index)
+    chunks, page_chunks, changed = [], [], 0
+    for page, digest in enumerate(parts["page_hashes"]):
+        if digest in layout:
+            start, count = layout[digest]
+            chunks.extend((page, number, None) for number in range(start, start + count))
+        else:
+            changed += 1
+            count = len(split.get(page, ()))
+            chunks.extend((page, None, index) for index in split.get(page, ()))
+        page_chunks.append(count)
+    return {"chunks": chunks, "page_chunks": page_chunks, "pages_changed": changed}
+
+
+def ingest_workers() -> int:
+    # Imported here so spawned workers do not load the app settings
+    from config import settings
+    return settings.INGEST_WORKERS or min(4, os.cpu_count() or 1)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: never fork a parent that already holds the embedding model and threads
+        _executor = ProcessPoolExecutor(
+            max_workers=ingest_workers(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def chunking() -> tuple:
+    """(strategy, chunk_size, chunk_overlap) configured for this deployment."""
+    from config import settings
+    if settings.CHUNK_STRATEGY not in STRATEGIES:
+        raise RuntimeError(f"Unknown CHUNK_STRATEGY {settings.CHUNK_STRATEGY!r}; use one of {', '.join(STRATEGIES)}")
+    return settings.CHUNK_STRATEGY, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP
+
+
+async def split_pdf(path: str, known=()) -> dict:
+    """load_and_split in the worker pool; waits for a free worker when all are busy."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), load_and_split, path, *chunking(), frozenset(known))
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
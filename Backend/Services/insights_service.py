@@ -0,0 +1,121 @@
+"""
+Insights Service
+Keeps per-user performance aggregates (overall, per document, per topic) that are
+updated incrementally every time answers are graded, so reading them never scans
+attempt history.
+"""
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from Api.Models.performance_stat import PerformanceStat
+from config import settings
+
+# Weight of the newest answer in the rolling (exponential moving average) accuracy
+ROLLING_ALPHA = 0.2
+# Topics need this many attempts, and a rolling accuracy below
+# WEAK_TOPIC_ACCURACY, before they can be reported as weak
+MIN_TOPIC_ATTEMPTS = 3
+MAX_WEAK_TOPICS = 5
+
+
+def _scope_keys(answer: dict) -> list:
+    """Return the (scope, key) aggregates a single graded answer contributes to."""
+    keys = [("overall", "all")]
+    if answer.get("document_id"):
+        keys.append(("document", str(answer["document_id"])[:200]))
+    if answer.get("topic"):
+        keys.append(("topic", str(answer["topic"]).strip().lower()[:200]))
+    return keys
+
+
+def _fold(outcomes: list) -> tuple:
+    """
+    (weight, delta) such that folding the 0/1 outcomes into the rolling
+    accuracy r gives r * weight + delta (the moving average is linear in r).
+    """
+    weight, delta = 1.0, 0.0
+    for outcome in outcomes:
+        weight *= 1 - ROLLING_ALPHA
+        delta = delta * (1 - ROLLING_ALPHA) + ROLLING_ALPHA * outcome
+    return weight, delta
+
+
+async def record_results(session: AsyncSession, user_id: int, answers: list, results: list) -> None:
+    """
+    Update the user's aggregates with one graded batch.
+    Each touched row is one upsert, so concurrent batches add up instead of
+    racing on insert or overwriting each other's counts.
+    """
+    outcomes = {}
+    for answer, result in zip(answers, results):
+        outcome = 1 if result.get("is_correct") else 0
+        for scope_key in _scope_keys(answer):
+            outcomes.setdefault(scope_key, []).append(outcome)
+    if not outcomes:
+        return
+
+    if session.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    now = datetime.now(timezone.utc)
+    # Same row order in every transaction, so concurrent batches cannot deadlock
+    for (scope, key), batch in sorted(outcomes.items()):
+        weight, delta = _fold(batch)
+        statement = insert(PerformanceStat).values(
+            user_id=user_id, scope=scope, key=key, attempted=len(batch), correct=sum(batch),
+            # A new row starts at its first outcome
+            rolling_accuracy=batch[0] * weight + delta, updated_at=now,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "scope", "key"],
+            set_={
+                "attempted": PerformanceStat.attempted + statement.excluded.attempted,
+                "correct": PerformanceStat.correct + statement.excluded.correct,
+                "rolling_accuracy": PerformanceStat.rolling_accuracy * weight + delta,
+                "updated_at": statement.excluded.updated_at,
+            },
+        )
+        await session.execute(statement)
+    await session.commit()
+
+
+def _summary(stat: PerformanceStat) -> dict:
+    return {
+        "attempted": stat.attempted,
+        "correct": stat.correct,
+        "accuracy": round(stat.correct / stat.attempted * 100, 2) if stat.attempted else 0,
+        "rolling_accuracy": round(stat.rolling_accuracy * 100, 2),
+    }
+
+
+async def get_insights(session: AsyncSession, user_id: int) -> dict:
+    """
+    Read the user's aggregates. Cost depends on the number of distinct
+    documents/topics, not on how many answers the user has submitted.
+    """
+    query = select(PerformanceStat).where(PerformanceStat.user_id == user_id)
+    stats = (await session.execute(query)).scalars().all()
+
+    overall = {"attempted": 0, "correct": 0, "accuracy": 0, "rolling_accuracy": 0}
+    documents, topics = {}, {}
+    for stat in stats:
+        if stat.scope == "overall":
+            overall = _summary(stat)
+        elif stat.scope == "document":
+            documents[stat.key] = _summary(stat)
+        elif stat.scope == "topic":
+            topics[stat.key] = _summary(stat)
+
+    weak_topics = sorted(
+        (t for t, s in topics.items()
+         if s["attempted"] >= MIN_TOPIC_ATTEMPTS and s["rolling_accuracy"] < settings.WEAK_TOPIC_ACCURACY),
+        key=lambda t: topics[t]["rolling_accuracy"],
+    )[:MAX_WEAK_TOPICS]
+
+    return {
+        "overall": overall,
+        "documents": documents,
+        "topics": topics,
+        "weak_topics": weak_topics,
+    }
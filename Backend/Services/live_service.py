@@ -0,0 +1,436 @@
+"""
+Live Service
+Host-driven classroom sessions. The host pushes questions from the existing
+generators, students answer over a WebSocket, and every question is graded
+in one pass when it closes.
+
+- A broadcast is serialised once and the same text is queued to every
+  socket. Each socket has its own bounded send queue drained by a writer
+  task, so a slow client never holds up the others; one whose queue fills
+  up is dropped (it can reconnect with its student_id and keep its score).
+- Answers are collected per question. On close, each distinct answer is
+  graded once with check_quiz_answers and the aggregate (option counts,
+  correct answers, leaderboard) is broadcast to everyone. If grading fails,
+  the results carry an "error" and the correct answer, without counts.
+- While a question is open, answered / connected counts are pushed every
+  LIVE_PROGRESS_INTERVAL_SECONDS when they change.
+
+A session lives in the worker process that created it: run live sessions on
+one worker, or route /live/sessions/{code} requests to the same worker.
+
+Messages are JSON objects with a "type": the server sends joined, question,
+progress, results and ended; students send
+    {"type": "answer", "question_id": n, "answer_index": i}   (or "answer": text)
+"""
+import json
+import time
+import heapq
+import asyncio
+import logging
+import secrets
+from fastapi import HTTPException, WebSocket, WebSocketException, status
+from config import settings
+from Services.rag_service import check_quiz_answers
+from Services.collection_service import add_reference, remove_reference
+from Services.metrics_service import Counter, register_collector
+
+logger = logging.getLogger(__name__)
+
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+CODE_LENGTH = 6
+LEADERBOARD_SIZE = 10
+MAX_NAME_LENGTH = 40
+MAX_ANSWER_LENGTH = 200
+# Sessions are ended after this long, and their document reference expires with them
+SESSION_MAX_AGE_SECONDS = 6 * 3600
+# Close codes for a client that fell behind, or that reconnected elsewhere
+SLOW_CLIENT_CLOSE = 4008
+REPLACED_CLOSE = 4009
+
+live_dropped_clients = Counter(
+    "flashquiz_live_dropped_clients_total", "Live session clients dropped for falling behind")
+
+
+async def _close(websocket: WebSocket, code: int = status.WS_1000_NORMAL_CLOSURE) -> None:
+    try:
+        await asyncio.wait_for(websocket.close(code), 5)
+    except Exception:
+        pass
+
+
+class Participant:
+    """A student; while connected, a bounded send queue drained by its own writer task."""
+
+    def __init__(self, student_id: str, name: str):
+        self.student_id = student_id
+        self.name = name
+        self.score = 0
+        self.websocket = None
+        self._queue = None
+        self._writer = None
+
+    @property
+    def connected(self) -> bool:
+        return self.websocket is not None
+
+    def attach(self, websocket: WebSocket) -> None:
+        self.websocket = websocket
+        self._queue = asyncio.Queue(maxsize=settings.LIVE_SEND_QUEUE)
+        self._writer = asyncio.create_task(self._write(websocket, self._queue))
+
+    def detach(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+        self.websocket = self._queue = self._writer = None
+
+    def send(self, text: str | None) -> bool:
+        """Queue an already serialised message (None closes the socket); False if the queue is full."""
+        try:
+            self._queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    @staticmethod
+    async def _write(websocket: WebSocket, queue: asyncio.Queue) -> None:
+        try:
+            while (text := await queue.get()) is not None:
+                await websocket.send_text(text)
+            await _close(websocket)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Connection gone; the receive loop notices and leaves the session
+            pass
+
+
+class LiveQuestion:
+    def __init__(self, question_id: int, item: dict, time_limit: float):
+        self.question_id = question_id
+        self.item = item
+        self.time_limit = time_limit
+        self.closes_at = time.time() + time_limit
+        # student_id -> (answer_index, answer_text); the first answer counts
+        self.answers = {}
+        self.closed = False
+        self.results = None
+
+    def public(self) -> dict:
+        """The question as students see it: no answer, no explanation."""
+        return {
+            "type": "question",
+            "question_id": self.question_id,
+            "question": self.item["question"],
+            "options": self.item["options"],
+            "question_type": self.item.get("type"),
+            "time_limit": self.time_limit,
+            "closes_at": self.closes_at,
+        }
+
+
+def _answer_key(index: int | None, text: str | None) -> tuple:
+    return ("index", index) if index is not None else ("text", " ".join(text.lower().split()))
+
+
+class LiveSession:
+    def __init__(self, code: str, host_id: int, document_id: str):
+        self.code = code
+        self.host_id = host_id
+        self.document_id = document_id
+        self.created_at = time.time()
+        self.participants = {}
+        self.questions = []
+        self.ended = False
+        self._question_text = None
+        self._tasks = []
+        self._close_lock = asyncio.Lock()
+
+    @property
+    def open_question(self) -> LiveQuestion | None:
+        if self.questions and not self.questions[-1].closed:
+            return self.questions[-1]
+        return None
+
+    def connected(self) -> int:
+        return sum(1 for p in self.participants.values() if p.connected)
+
+    def leaderboard(self, size: int = LEADERBOARD_SIZE) -> list:
+        top = heapq.nlargest(size, self.participants.values(), key=lambda p: p.score)
+        return [{"name": p.name, "score": p.score} for p in top]
+
+    def broadcast(self, payload: dict) -> str:
+        """Serialise once and queue the same text to every connected student."""
+        text = json.dumps(payload)
+        for participant in list(self.participants.values()):
+            if participant.connected and not participant.send(text):
+                self._drop(participant)
+        return text
+
+    def _drop(self, participant: Participant) -> None:
+        live_dropped_clients.inc()
+        websocket = participant.websocket
+        participant.detach()
+        asyncio.create_task(_close(websocket, SLOW_CLIENT_CLOSE))
+
+    # ----- students -----
+
+    def join(self, websocket: WebSocket, name: str, student_id: str = None) -> Participant:
+        if self.ended:
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Session has ended")
+        participant = self.participants.get(student_id) if student_id else None
+        if participant is None:
+            if len(self.participants) >= settings.LIVE_MAX_PARTICIPANTS:
+                raise WebSocketException(code=status.WS_1013_TRY_AGAIN_LATER, reason="Session is full")
+            participant = Participant(secrets.token_urlsafe(12), name.strip()[:MAX_NAME_LENGTH] or "Student")
+            self.participants[participant.student_id] = participant
+        elif participant.connected:
+            # Reconnected (e.g. a new tab): the old socket is closed
+            old = participant.websocket
+            participant.detach()
+            asyncio.create_task(_close(old, REPLACED_CLOSE))
+        participant.attach(websocket)
+        participant.send(json.dumps({
+            "type": "joined",
+            "session_id": self.code,
+            "student_id": participant.student_id,
+            "name": participant.name,
+            "score": participant.score,
+        }))
+        if self.open_question is not None:
+            participant.send(self._question_text)
+        return participant
+
+    def leave(self, participant: Participant, websocket: WebSocket) -> None:
+        # A participant that reconnected meanwhile keeps its new socket
+        if participant.websocket is websocket:
+            participant.detach()
+
+    def submit(self, participant: Participant, data: dict) -> None:
+        question = self.open_question
+        if question is None or data.get("question_id") != question.question_id:
+            return
+        if participant.student_id in question.answers:
+            return
+        index, text = data.get("answer_index"), data.get("answer")
+        if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(question.item["options"]):
+            index = None
+        text = str(text)[:MAX_ANSWER_LENGTH] if text is not None else None
+        if index is None and not (text and text.strip()):
+            return
+        question.answers[participant.student_id] = (index, text)
+        if len(question.answers) >= self.connected():
+            # Everyone connected has answered: no need to wait for the timer
+            self._start(self.close_question())
+
+    # ----- host -----
+
+    def _start(self, coroutine) -> None:
+        self._tasks = [task for task in self._tasks if not task.done()]
+        self._tasks.append(asyncio.create_task(coroutine))
+
+    def _stop_tasks(self) -> None:
+        current = asyncio.current_task()
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+        self._tasks = []
+
+    async def push_question(self, item: dict, time_limit: float) -> dict:
+        """Close the open question (if any), then broadcast a new one."""
+        # Under the close lock, so a question being graded has its results out first
+        async with self._close_lock:
+            if self.ended:
+                raise HTTPException(status_code=409, detail="The session has ended")
+            await self._close_open_question()
+            question = LiveQuestion(len(self.questions) + 1, item, time_limit)
+            self.questions.append(question)
+            self._question_text = self.broadcast(question.public())
+            self._start(self._close_after(question))
+            self._start(self._push_progress(question))
+        return {"question_id": question.question_id, **item, "closes_at": question.closes_at}
+
+    async def _close_after(self, question: LiveQuestion) -> None:
+        await asyncio.sleep(question.time_limit)
+        async with self._close_lock:
+            if self.open_question is question:
+                await self._close_open_question()
+
+    async def _push_progress(self, question: LiveQuestion) -> None:
+        last = None
+        while not question.closed:
+            await asyncio.sleep(settings.LIVE_PROGRESS_INTERVAL_SECONDS)
+            counts = (len(question.answers), self.connected())
+            if counts != last and not question.closed:
+                last = counts
+                self.broadcast({"type": "progress", "question_id": question.question_id,
+                                "answered": counts[0], "connected": counts[1]})
+
+    async def close_question(self) -> dict | None:
+        """Grade the open question and broadcast its results. None if no question is open."""
+        async with self._close_lock:
+            return await self._close_open_question()
+
+    async def _close_open_question(self) -> dict | None:
+        # Callers hold _close_lock
+        question = self.open_question
+        if question is None:
+            return None
+        question.closed = True
+        self._stop_tasks()
+        try:
+            question.results = await self._grade(question)
+        except Exception:
+            # Students are waiting for this question's outcome either way
+            logger.exception("Grading question %d of live session %s failed", question.question_id, self.code)
+            question.results = self._ungraded(question)
+        self.broadcast(question.results)
+        return question.results
+
+    def _ungraded(self, question: LiveQuestion) -> dict:
+        item = question.item
+        return {
+            "type": "results",
+            "question_id": question.question_id,
+            "correct_answer": item["correctAnswer"],
+            "correct_answer_text": item["correctAnswerText"],
+            "explanation": item.get("explanation"),
+            "answered": len(question.answers),
+            "error": "Answers could not be graded",
+            "leaderboard": self.leaderboard(),
+        }
+
+    async def _grade(self, question: LiveQuestion) -> dict:
+        """One check_quiz_answers call over the distinct answers, fanned out to every student."""
+        item = question.item
+        options = item["options"]
+        keys, batch = {}, []
+        for index, text in question.answers.values():
+            key = _answer_key(index, text)
+            if key not in keys:
+                keys[key] = len(batch)
+                batch.append({
+                    "question_id": len(batch),
+                    "user_answer": options[index] if index is not None else text,
+                    "correct_answer": item["correctAnswerText"],
+                    "user_answer_index": index,
+                    "correct_answer_index": item["correctAnswer"] if index is not None else None,
+                })
+        graded = (await check_quiz_answers(batch))["results"] if batch else []
+
+        lowered = [option.strip().lower() for option in options]
+        counts, other, correct = [0] * len(options), 0, 0
+        for student_id, (index, text) in question.answers.items():
+            is_correct = graded[keys[_answer_key(index, text)]]["is_correct"]
+            if index is None and text.strip().lower() in lowered:
+                index = lowered.index(text.strip().lower())
+            if index is not None:
+                counts[index] += 1
+            else:
+                other += 1
+            if is_correct:
+                correct += 1
+                participant = self.participants.get(student_id)
+                if participant is not None:
+                    participant.score += 1
+        return {
+            "type": "results",
+            "question_id": question.question_id,
+            "correct_answer": item["correctAnswer"],
+            "correct_answer_text": item["correctAnswerText"],
+            "explanation": item.get("explanation"),
+            "counts": counts,
+            "other_answers": other,
+            "answered": len(question.answers),
+            "correct": correct,
+            "distinct_answers": len(batch),
+            "leaderboard": self.leaderboard(),
+        }
+
+    async def end(self) -> dict:
+        # A question still being graded gets its results and scores in before the summary
+        async with self._close_lock:
+            await self._close_open_question()
+            self.ended = True
+            self._stop_tasks()
+            summary = {"type": "ended", "questions": len(self.questions), "leaderboard": self.leaderboard()}
+            self.broadcast(summary)
+            for participant in self.participants.values():
+                # Closed by each writer once the summary is sent
+                if participant.connected and not participant.send(None):
+                    self._drop(participant)
+            return summary
+
+    def summary(self) -> dict:
+        question = self.open_question
+        return {
+            "session_id": self.code,
+            "document_id": self.document_id,
+            "created_at": self.created_at,
+            "participants": len(self.participants),
+            "connected": self.connected(),
+            "questions": len(self.questions),
+            "open_question": question.public() if question else None,
+            "answered": len(question.answers) if question else 0,
+            "leaderboard": self.leaderboard(),
+        }
+
+
+# code -> LiveSession, in this worker
+_sessions = {}
+
+
+def _new_code() -> str:
+    while True:
+        code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+        if code not in _sessions:
+            return code
+
+
+async def create_session(host_id: int, document_id: str) -> LiveSession:
+    now = time.time()
+    for code in [c for c, s in _sessions.items() if now - s.created_at > SESSION_MAX_AGE_SECONDS]:
+        await end_session(code)
+    session = LiveSession(_new_code(), host_id, document_id)
+    # Keep the document from being evicted while the class is running
+    await add_reference(document_id, f"live:{session.code}", ttl=SESSION_MAX_AGE_SECONDS)
+    _sessions[session.code] = session
+    logger.info("Live session %s started on document %s", session.code, document_id)
+    return session
+
+
+def find_session(code: str) -> LiveSession | None:
+    session = _sessions.get(code.upper())
+    return None if session is None or session.ended else session
+
+
+def host_session(code: str, user_id: int) -> LiveSession:
+    """The session, if the user hosts it; 404 / 403 otherwise."""
+    session = find_session(code)
+    if session is None:
+        raise HTTPException(status_code=404, detail="No live session with this code")
+    if session.host_id != user_id:
+        raise HTTPException(status_code=403, detail="Only the host can control this session")
+    return session
+
+
+async def end_session(code: str) -> dict:
+    session = _sessions.pop(code, None)
+    if session is None:
+        # Ended meanwhile by another request (or the stale-session cleanup)
+        raise HTTPException(status_code=404, detail="No live session with this code")
+    summary = await session.end()
+    await remove_reference(session.document_id, f"live:{code}")
+    logger.info("Live session %s ended after %d questions", code, len(session.questions))
+    return summary
+
+
+def _live_metrics() -> list:
+    return [
+        "# TYPE flashquiz_live_sessions gauge",
+        f"flashquiz_live_sessions {len(_sessions)}",
+        "# TYPE flashquiz_live_clients gauge",
+        f"flashquiz_live_clients {sum(s.connected() for s in _sessions.values())}",
+    ]
+
+
+register_collector(_live_metrics)
@@ -0,0 +1,218 @@
+"""
+LLM Dispatch Service
+Latency-aware dispatch across the configured model clients (the RAG client
+in rag_service and the agent client in agent.py). Each is wrapped in a
+HedgedChatCompletionClient that prefers its own client:
+
+- every call has a deadline (LLM_TIMEOUT_SECONDS);
+- if the preferred client has not answered after its recent p95 latency,
+  a hedged duplicate goes to the alternate client; the first success wins
+  and the other call is cancelled;
+- a client that keeps failing is taken out of rotation by a circuit breaker
+  and given one trial call after BREAKER_COOLDOWN_SECONDS.
+
+Hedging after p95 duplicates roughly 5% of calls and cuts the slow tail
+that a single upstream sets. Works with any ChatCompletionClient, so local
+fakes with injected latency exercise it in tests and benchmarks.
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Sequence
+from autogen_core.models import ChatCompletionClient, RequestUsage
+from config import settings
+from Services.metrics_service import Counter, register_collector, record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 200
+# Latency samples needed before the p95 replaces HEDGE_DEFAULT_DELAY_SECONDS
+MIN_SAMPLES = 20
+# A call cancelled this close to the deadline timed out rather than lost a hedge
+TIMED_OUT_FRACTION = 0.95
+
+llm_hedges = Counter(
+    "flashquiz_llm_hedges_total", "Hedged LLM calls by which client answered", ("client", "winner"))
+llm_client_failures = Counter(
+    "flashquiz_llm_client_failures_total", "Failed or timed-out LLM calls per client", ("client",))
+# Losers' latencies are censored (only a lower bound), so they are counted, not sampled
+llm_hedge_losers = Counter(
+    "flashquiz_llm_hedge_losers_total", "LLM calls cancelled because the other client answered first", ("client",))
+
+
+class ClientState:
+    """Recent latencies and circuit breaker of one underlying client."""
+
+    def __init__(self, name: str, client: ChatCompletionClient):
+        self.name = name
+        self.client = client
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial_running = False
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < MIN_SAMPLES:
+            return settings.HEDGE_DEFAULT_DELAY_SECONDS
+        ordered = sorted(self.latencies)
+        p95 = ordered[int(0.95 * (len(ordered) - 1))]
+        return max(settings.HEDGE_MIN_DELAY_SECONDS, p95)
+
+    def available(self) -> bool:
+        """Closed breaker, or an expired open one with no trial call in flight (half-open)."""
+        if self.failures < settings.BREAKER_FAILURES:
+            return True
+        return time.monotonic() >= self.open_until and not self.trial_running
+
+    def record(self, seconds: float, ok: bool) -> None:
+        if ok:
+            self.latencies.append(seconds)
+            if self.failures >= settings.BREAKER_FAILURES:
+                logger.info("LLM client %s recovered; closing its circuit breaker", self.name)
+            self.failures = 0
+            return
+        llm_client_failures.inc(client=self.name)
+        self.failures += 1
+        if self.failures >= settings.BREAKER_FAILURES:
+            if time.monotonic() >= self.open_until:
+                logger.warning("LLM client %s failed %d times; opening its circuit breaker", self.name, self.failures)
+            self.open_until = time.monotonic() + settings.BREAKER_COOLDOWN_SECONDS
+
+    def breaker_state(self) -> str:
+        if self.failures < settings.BREAKER_FAILURES:
+            return "closed"
+        return "half_open" if time.monotonic() >= self.open_until else "open"
+
+
+# name -> ClientState, in registration order (the order alternates are tried)
+_clients = {}
+
+
+def register_client(name: str, client: ChatCompletionClient) -> ClientState:
+    _clients[name] = ClientState(name, client)
+    return _clients[name]
+
+
+def _breaker_metrics() -> list:
+    lines = ["# TYPE flashquiz_llm_breaker_open gauge"]
+    for state in _clients.values():
+        lines.append(f'flashquiz_llm_breaker_open{{client="{state.name}"}} {int(state.breaker_state() == "open")}')
+    return lines
+
+
+register_collector(_breaker_metrics)
+
+
+def _prompt_tokens(state: ClientState, messages) -> int:
+    try:
+        return state.client.count_tokens(messages)
+    except Exception:
+        # Not every model is known to the client's tokenizer
+        return 0
+
+
+class HedgedChatCompletionClient(ChatCompletionClient):
+    """ChatCompletionClient preferring one registered client, hedged to the others."""
+
+    def __init__(self, preferred: str):
+        self.preferred = preferred
+
+    @property
+    def _state(self) -> ClientState:
+        return _clients[self.preferred]
+
+    def _candidates(self) -> list:
+        ordered = [self._state] + [s for name, s in _clients.items() if name != self.preferred]
+        available = [s for s in ordered if s.available()]
+        # Every breaker open: try the preferred client rather than fail outright
+        return available or [self._state]
+
+    async def _call(self, state: ClientState, messages, kwargs):
+        start = time.perf_counter()
+        half_open = state.failures >= settings.BREAKER_FAILURES
+        if half_open:
+            state.trial_running = True
+        try:
+            result = await state.client.create(messages, **kwargs)
+        except asyncio.CancelledError:
+            elapsed = time.perf_counter() - start
+            if elapsed >= TIMED_OUT_FRACTION * settings.LLM_TIMEOUT_SECONDS:
+                # Cancelled by the deadline (ours or the caller's wait_for): a timeout
+                state.record(elapsed, ok=False)
+            else:
+                # The loser of a hedge. Its prompt was sent and is billed, so
+                # charge it to the caller; its completion tokens are unknown
+                llm_hedge_losers.inc(client=state.name)
+                record_llm_usage(RequestUsage(prompt_tokens=_prompt_tokens(state, messages), completion_tokens=0))
+            raise
+        except Exception:
+            state.record(time.perf_counter() - start, ok=False)
+            raise
+        finally:
+            if half_open:
+                state.trial_running = False
+        state.record(time.perf_counter() - start, ok=True)
+        return result
+
+    async def create(self, messages: Sequence, **kwargs) -> Any:
+        if not settings.LLM_HEDGING:
+            return await self._state.client.create(messages, **kwargs)
+        candidates = self._candidates()
+        deadline = time.monotonic() + settings.LLM_TIMEOUT_SECONDS
+        tasks = {asyncio.create_task(self._call(candidates[0], messages, kwargs)): candidates[0]}
+        spare = candidates[1:]
+        hedged = False
+        error = None
+        try:
+            while tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                # Until the hedge fires, wait only as long as the primary's p95
+                timeout = min(remaining, candidates[0].hedge_delay()) if spare and not hedged else remaining
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    state = tasks.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            llm_hedges.inc(client=self.preferred, winner=state.name)
+                        return task.result()
+                    error = task.exception()
+                    logger.warning("LLM client %s failed: %s", state.name, error)
+                # Hedge after the delay, or fail over at once when the only call failed
+                if spare and (not done or not tasks):
+                    state = spare.pop(0)
+                    hedged = hedged or bool(tasks)
+                    tasks[asyncio.create_task(self._call(state, messages, kwargs))] = state
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def create_stream(self, messages: Sequence, **kwargs):
+        # Streaming is not hedged: a partial stream cannot be swapped for another
+        return self._candidates()[0].client.create_stream(messages, **kwargs)
+
+    async def close(self) -> None:
+        await self._state.client.close()
+
+    def actual_usage(self):
+        return self._state.client.actual_usage()
+
+    def total_usage(self):
+        return self._state.client.total_usage()
+
+    def count_tokens(self, messages: Sequence, **kwargs) -> int:
+        return self._state.client.count_tokens(messages, **kwargs)
+
+    def remaining_tokens(self, messages: Sequence, **kwargs) -> int:
+        return self._state.client.remaining_tokens(messages, **kwargs)
+
+    @property
+    def capabilities(self):
+        return self._state.client.capabilities
+
+    @property
+    def model_info(self):
+        return self._state.client.model_info
@@ -0,0 +1,177 @@
+"""
+Metrics Service
+Low-overhead in-process counters and histograms rendered in the Prometheus
+text exposition format by the /metrics endpoint.
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Route template of the request being served; set by the label_endpoint dependency in main.py
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="background")
+# Signed-in user and document the request works on; attribute token usage
+current_user_id: ContextVar[int | None] = ContextVar("current_user_id", default=None)
+current_document_id: ContextVar[str | None] = ContextVar("current_document_id", default=None)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_collectors = []
+_usage_listeners = []
+
+
+def _escape(value) -> str:
+    # Label values escape backslash, double quote and newline in the text format
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0.0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the with-block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def register_collector(func) -> None:
+    """Register a callable returning extra exposition lines (e.g. cache gauges)."""
+    _collectors.append(func)
+
+
+def register_usage_listener(func) -> None:
+    """Register a callable receiving (prompt_tokens, completion_tokens) for every LLM call."""
+    _usage_listeners.append(func)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+# ============== APPLICATION METRICS ==============
+
+# stage: pdf_parse, split, embed, chroma_write, retrieval, llm, grading
+stage_seconds = Histogram(
+    "flashquiz_stage_seconds", "Duration of pipeline stages", ("stage", "endpoint"))
+http_request_seconds = Histogram(
+    "flashquiz_http_request_seconds", "HTTP request latency", ("method", "endpoint", "status"))
+db_pool_checkout_seconds = Histogram(
+    "flashquiz_db_pool_checkout_seconds", "Time spent waiting for a database pool connection")
+llm_parse_failures = Counter(
+    "flashquiz_llm_parse_failures_total", "LLM responses (or lines) that could not be parsed", ("endpoint",))
+llm_tokens = Counter(
+    "flashquiz_llm_tokens_total", "LLM tokens used", ("endpoint", "kind"))
+rule_generations = Counter(
+    "flashquiz_rule_generations_total", "Requests served by the rule-based generator", ("endpoint", "reason"))
+
+
+@contextmanager
+def time_stage(stage: str):
+    """Time a pipeline stage, labelled with the endpoint being served."""
+    with stage_seconds.time(stage=stage, endpoint=current_endpoint.get()):
+        yield
+
+
+def record_parse_failure(count: int = 1) -> None:
+    if count:
+        llm_parse_failures.inc(count, endpoint=current_endpoint.get())
+
+
+def record_llm_usage(usage) -> None:
+    """Record a RequestUsage (prompt_tokens / completion_tokens) for the current endpoint."""
+    if usage is None:
+        return
+    endpoint = current_endpoint.get()
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    llm_tokens.inc(prompt, endpoint=endpoint, kind="prompt")
+    llm_tokens.inc(completion, endpoint=endpoint, kind="completion")
+    for listener in _usage_listeners:
+        listener(prompt, completion)
+
+
+def record_task_usage(task_result) -> None:
+    """Record the token usage of every model message in an AssistantAgent TaskResult."""
+    for message in getattr(task_result, "messages", []):
+        record_llm_usage(getattr(message, "models_usage", None))
+
+
+def record_rule_generation(reason: str) -> None:
+    """reason: "mode" (requested) or "timeout" (LLM fallback)."""
+    rule_generations.inc(endpoint=current_endpoint.get(), reason=reason)
@@ -0,0 +1,252 @@
+"""
+Parser Service
+Single-pass, incremental parser for LLM quiz / flashcard output.
+Handles both the JSON format used by rag_service and the pipe-delimited format
+used by agent_service (full MCQ items, or question + answer only when the
+distractor engine supplies the options), and salvages every valid item instead of failing the
+whole response when one question is malformed or the output is truncated.
+"""
+import re
+import json
+
+# Leading "1." / "2)" / "-" / "*" list markers some models add before pipe lines
+LINE_PREFIX = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+")
+ANSWER_LETTERS = {"A": 0, "B": 1, "C": 2, "D": 3}
+HEADER_FIELDS = {"ANSWER", "FRONT"}
+
+
+def _answer_index(value, options: list):
+    """Resolve correctAnswer given as an int, digit, letter or option text."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if 0 <= value < len(options) else None
+    if isinstance(value, str):
+        text = value.strip()
+        if text.isdigit():
+            return _answer_index(int(text), options)
+        letter = text.upper().strip("().:")
+        if len(letter) == 1 and letter in ANSWER_LETTERS and ANSWER_LETTERS[letter] < len(options):
+            return ANSWER_LETTERS[letter]
+        lowered = [o.lower() for o in options]
+        if text.lower() in lowered:
+            return lowered.index(text.lower())
+    return None
+
+
+def normalize_question(obj: dict) -> dict | None:
+    """Validate a JSON quiz item and fill in correctAnswerText / type. None if unusable."""
+    question = str(obj.get("question") or "").strip()
+    options = obj.get("options")
+    if not question or not isinstance(options, list) or len(options) < 2:
+        return None
+    options = [str(o).strip() for o in options]
+    if not all(options):
+        return None
+
+    index = _answer_index(obj.get("correctAnswer"), options)
+    if index is None:
+        index = _answer_index(obj.get("correctAnswerText"), options)
+    if index is None:
+        return None
+
+    item = dict(obj)
+    item["question"] = question
+    item["options"] = options
+    item["correctAnswer"] = index
+    item["correctAnswerText"] = options[index]
+    item["type"] = obj.get("type") or ("truefalse" if len(options) == 2 else "mcq")
+    return item
+
+
+def normalize_short_answer(obj: dict) -> dict | None:
+    """
+    Validate a question + answer item (no options). True/False answers are
+    completed here; other items keep "answer" for the distractor engine.
+    """
+    question = str(obj.get("question") or "").strip()
+    answer = str(obj.get("answer") or "").strip()
+    if not question or not answer:
+        return None
+    item = dict(obj)
+    item["question"] = question
+    if answer.lower() in ("true", "false"):
+        item.pop("answer", None)
+        item["options"] = ["True", "False"]
+        item["correctAnswer"] = 0 if answer.lower() == "true" else 1
+        item["correctAnswerText"] = item["options"][item["correctAnswer"]]
+        item["type"] = "truefalse"
+        return item
+    item["answer"] = answer
+    item["type"] = "mcq"
+    return item
+
+
+def normalize_flashcard(obj: dict) -> dict | None:
+    front = str(obj.get("front") or "").strip()
+    back = str(obj.get("back") or "").strip()
+    if not front or not back:
+        return None
+    item = dict(obj)
+    item["front"] = front
+    item["back"] = back
+    return item
+
+
+def parse_pipe_line(line: str, expect: str = None):
+    """
+    Parse one pipe-delimited line.
+    Quiz:      ANSWER|QUESTION|OPTION_A|OPTION_B|OPTION_C|OPTION_D
+    QA:        ANSWER|QUESTION  (expect="qa"; answer is the text, options come later)
+    Flashcard: FRONT|BACK
+    Returns ("quiz" | "flashcard", item) or None.
+    """
+    parts = [p.strip() for p in LINE_PREFIX.sub("", line.strip()).split("|")]
+    if parts[0].upper() in HEADER_FIELDS:
+        return None
+
+    if expect != "flashcard" and len(parts) >= 6:
+        options = parts[2:6]
+        letter = parts[0].upper().strip("()[].:")
+        if len(letter) != 1 or letter not in ANSWER_LETTERS or not parts[1] or not all(options):
+            return None
+        index = ANSWER_LETTERS[letter]
+        return "quiz", {
+            "question": parts[1],
+            "options": options,
+            "correctAnswer": index,
+            "correctAnswerText": options[index],
+            "type": "mcq",
+        }
+
+    if expect == "qa" and len(parts) >= 2:
+        item = normalize_short_answer({"answer": parts[0], "question": parts[1]})
+        return ("quiz", item) if item else None
+
+    if expect not in ("quiz", "qa") and len(parts) >= 2:
+        card = normalize_flashcard({"front": parts[0], "back": parts[1]})
+        return ("flashcard", card) if card else None
+
+    return None
+
+
+class LLMOutputParser:
+    """
+    Feed model output (whole or streamed in pieces) and collect valid items.
+
+    JSON objects are recognised by brace matching as soon as they close, so an
+    item is kept even if a later one is malformed or the output is cut off.
+    Outside JSON, every complete line containing '|' is parsed as a pipe line.
+
+    Args:
+        expect: "quiz", "qa", "flashcard" or None (quiz or flashcard) for pipe lines
+    """
+
+    def __init__(self, expect: str = None):
+        self.expect = expect
+        self.questions = []
+        self.flashcards = []
+        self.failed = 0
+        self._buffer = ""
+        self._pos = 0
+        self._line_start = 0
+        self._in_string = False
+        self._escape = False
+        # Open JSON containers: [opening char, start index, contains a nested object]
+        self._stack = []
+
+    def feed(self, text: str) -> None:
+        self._buffer += text
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            c = buffer[i]
+            if self._stack:
+                self._json_char(c, i)
+            elif c in "{[" and "|" not in buffer[self._line_start:i]:
+                self._stack.append([c, i, False])
+            elif c == "\n":
+                self._line(buffer[self._line_start:i])
+                self._line_start = i + 1
+        self._pos = len(buffer)
+
+    def close(self) -> None:
+        """Flush the trailing line. An unterminated JSON tail is dropped."""
+        if not self._stack:
+            self._line(self._buffer[self._line_start:])
+        self._line_start = self._pos = len(self._buffer)
+
+    def _json_char(self, c: str, i: int) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"' or c == "\n":
+                # JSON strings cannot hold raw newlines; treat one as a missing quote
+                self._in_string = False
+            return
+        if c == '"':
+            self._in_string = True
+        elif c in "{[":
+            if c == "{":
+                for frame in self._stack:
+                    frame[2] = True
+            self._stack.append([c, i, False])
+        elif c in "}]":
+            opener, start, has_child = self._stack.pop()
+            if opener == "{" and c == "}":
+                self._object(self._buffer[start:i + 1], has_child)
+            # A closed top-level [...] stays part of its line: it may be a pipe
+            # line's "[A]" prefix, and _line skips it if the line is JSON
+            if not self._stack and opener == "{":
+                self._line_start = i + 1
+
+    def _object(self, raw: str, has_child: bool) -> None:
+        try:
+            obj = json.loads(raw)
+        except json.JSONDecodeError:
+            # Wrappers fail too when a child is broken; count only the innermost object
+            if not has_child:
+                self.failed += 1
+            return
+        if not isinstance(obj, dict):
+            return
+        if "question" in obj and "options" not in obj and "answer" in obj:
+            self._add("quiz", normalize_short_answer(obj))
+        elif "question" in obj:
+            self._add("quiz", normalize_question(obj))
+        elif "front" in obj or "back" in obj:
+            self._add("flashcard", normalize_flashcard(obj))
+
+    def _line(self, line: str) -> None:
+        line = line.strip()
+        if not line or "|" not in line or line.startswith("```"):
+            return
+        if line.startswith("["):
+            try:
+                json.loads(line)
+                return
+            except json.JSONDecodeError:
+                pass
+        parsed = parse_pipe_line(line, self.expect)
+        if parsed is None:
+            if line.split("|")[0].strip().upper() not in HEADER_FIELDS:
+                self.failed += 1
+            return
+        self._add(*parsed)
+
+    def _add(self, kind: str, item: dict | None) -> None:
+        if item is None:
+            self.failed += 1
+            return
+        target = self.questions if kind == "quiz" else self.flashcards
+        item["id"] = len(target) + 1
+        target.append(item)
+
+
+def parse_llm_output(text: str, expect: str = None) -> LLMOutputParser:
+    """Parse a complete response in one pass; returns the finished parser."""
+    parser = LLMOutputParser(expect)
+    parser.feed(text)
+    parser.close()
+    return parser
@@ -0,0 +1,122 @@
+"""
+Question Bank Service
+Ready-made questions and flashcards generated offline (see question_bank.py)
+and imported from JSONL. Each document's bank lives in the shared
+"question_pool" state namespace, so any worker can serve it without an LLM.
+
+Bank files hold one JSON record per line:
+    {"kind": "question", "document_id": ..., "source": ..., <quiz item>}
+    {"kind": "flashcard", "document_id": ..., "source": ..., "front": ..., "back": ...}
+    {"kind": "document", "document_id": ..., "source": ..., "questions": n, ...}
+The "document" record closes a document's block and marks it complete.
+"""
+import json
+import time
+import random
+import logging
+from Services.state_service import state_store
+from Services.parser_service import normalize_question, normalize_flashcard
+
+logger = logging.getLogger(__name__)
+
+MAX_DRAW = 50
+# Fields describing where an item came from, not the item itself
+RECORD_FIELDS = ("kind", "document_id", "source")
+
+
+def read_bank(lines) -> tuple:
+    """
+    Parse bank lines (str or bytes) into {document_id: {"source", "questions",
+    "flashcards"}}. Returns (banks, skipped) where skipped counts unusable lines.
+    """
+    banks, skipped = {}, 0
+    for line in lines:
+        line = line.decode("utf-8") if isinstance(line, bytes) else line
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            document_id = str(record["document_id"])
+            kind = record["kind"]
+        except (ValueError, KeyError, TypeError):
+            skipped += 1
+            continue
+        bank = banks.setdefault(document_id, {"source": record.get("source"), "questions": [], "flashcards": []})
+        item = {k: v for k, v in record.items() if k not in RECORD_FIELDS}
+        if kind == "question":
+            item = normalize_question(item)
+            target = bank["questions"]
+        elif kind == "flashcard":
+            item = normalize_flashcard(item)
+            target = bank["flashcards"]
+        elif kind == "document":
+            continue
+        else:
+            item = None
+        if item is None:
+            skipped += 1
+        else:
+            target.append(item)
+    return banks, skipped
+
+
+def _merge(existing: list, new: list, key: str) -> list:
+    seen = {str(item[key]).strip().lower() for item in existing}
+    merged = list(existing)
+    for item in new:
+        text = str(item[key]).strip().lower()
+        if text not in seen:
+            seen.add(text)
+            merged.append(item)
+    return merged
+
+
+async def import_bank(lines) -> dict:
+    """Add the banks in a JSONL file to the question pool (duplicates are skipped)."""
+    banks, skipped = read_bank(lines)
+    imported = []
+    for document_id, bank in banks.items():
+        pool = await state_store.get("question_pool", document_id) or {"questions": [], "flashcards": []}
+        before = len(pool["questions"]), len(pool["flashcards"])
+        pool["source"] = bank["source"] or pool.get("source")
+        pool["questions"] = _merge(pool["questions"], bank["questions"], "question")
+        pool["flashcards"] = _merge(pool["flashcards"], bank["flashcards"], "front")
+        pool["imported_at"] = time.time()
+        await state_store.set("question_pool", document_id, pool)
+        imported.append({
+            "document_id": document_id,
+            "source": pool["source"],
+            "questions_added": len(pool["questions"]) - before[0],
+            "flashcards_added": len(pool["flashcards"]) - before[1],
+        })
+    logger.info("Imported question banks for %d documents (%d lines skipped)", len(imported), skipped)
+    return {"documents": imported, "skipped_lines": skipped}
+
+
+async def list_banks() -> list:
+    banks = []
+    for document_id in await state_store.keys("question_pool"):
+        pool = await state_store.get("question_pool", document_id)
+        if pool:
+            banks.append({
+                "document_id": document_id,
+                "source": pool.get("source"),
+                "questions": len(pool["questions"]),
+                "flashcards": len(pool["flashcards"]),
+            })
+    return banks
+
+
+async def draw_from_bank(document_id: str, num_questions: int = 5, num_flashcards: int = 0,
+                         previous_questions: list = None) -> dict | None:
+    """Random questions (and flashcards) from a document's bank; None if it has no bank."""
+    pool = await state_store.get("question_pool", document_id)
+    if pool is None:
+        return None
+    avoid = {q.strip().lower() for q in previous_questions or []}
+    candidates = [q for q in pool["questions"] if q["question"].strip().lower() not in avoid]
+    quiz = [dict(q) for q in random.sample(candidates, min(num_questions, MAX_DRAW, len(candidates)))]
+    for idx, q in enumerate(quiz):
+        q["id"] = idx + 1
+    flashcards = random.sample(pool["flashcards"], min(num_flashcards, MAX_DRAW, len(pool["flashcards"])))
+    return {"quiz": quiz, "flashcards": flashcards, "total": len(quiz), "generator": "bank"}
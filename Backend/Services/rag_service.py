@@ -1,26 +1,45 @@
 import os
+import uuid
 import shutil
-import json
 import random
 import asyncio
+import logging
+import time
+import hashlib
+import functools
+from collections.abc import Sequence
 from fastapi import UploadFile, HTTPException
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_core.models import ModelInfo, UserMessage
 from config import settings
-
-# Initialize Hugging Face Embeddings (keep for vector store)
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-# Initialize ChromaDB (Persistent)
-PERSIST_DIRECTORY = "./chroma_db"
-vector_store = Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
-
-# Initialize AutoGen Model Client for Gemini
-model_client = OpenAIChatCompletionClient(
+from Services.metrics_service import current_endpoint, current_user_id, current_document_id, stage_seconds, time_stage, record_parse_failure, record_llm_usage, record_rule_generation
+from Services.parser_service import parse_llm_output
+from Services import rulebased_service as RuleBased
+from Services.distractor_service import (
+    MIN_TERMS, TermIndex, build_term_index, extract_terms, save_term_index, load_term_index, has_term_index,
+    complete_questions,
+)
+from Services.topic_service import tag_chunks, build_topic_index, save_topic_index, find_topic_chunks
+from Services.fact_sheet_service import use_fact_sheets, build_rules_sheets, build_llm_sheets
+from Services.ingest_service import split_pdf, chunking, page_layout, merge_pages
+from Services.llm_dispatch_service import register_client, HedgedChatCompletionClient
+from Services.embedding_service import create_embeddings
+from Services.cache_service import TTLCache
+from Services import usage_service as UsageService
+from Services.state_service import state_store, chroma_write_lock
+from Services.chunk_service import save_chunks, load_chunks, open_chunks, registered_version
+from Services.collection_service import PERSIST_DIRECTORY, get_collection, delete_collection, touch
+
+logger = logging.getLogger(__name__)
+
+# Sentence embeddings, micro-batched across requests (or from the shared
+# embedding server, see embedding_service)
+embeddings = create_embeddings()
+
+# Vectors live in one ChromaDB collection per document (see collection_service)
+
+# Initialize AutoGen Model Client for Gemini; calls are hedged to the agent client (see llm_dispatch_service)
+register_client("rag", OpenAIChatCompletionClient(
     model="gemini-2.0-flash-lite",
     model_info=ModelInfo(
         vision=False,
@@ -30,56 +49,467 @@ model_client = OpenAIChatCompletionClient(
         structured_output=False
     ),
     api_key=settings.GEMINI_API_KEY,
-)
+))
+model_client = HedgedChatCompletionClient("rag")
 
-# Store chunks in memory for random selection (in addition to ChromaDB)
-document_chunks = []
+# Chunk texts and fact sheets live in memory-mapped chunk files (see
+# chunk_service); this per-worker cache keeps the open maps so requests do
+# not reopen them. Keys are (document_id, kind, registry version), so a
+# re-upload on any worker is picked up by the next request on every worker
+chunk_cache = TTLCache(maxsize=64, ttl=300)
+# How long "this document has no fact sheets" is cached; llm sheets arrive after upload
+MISSING_SHEETS_TTL = 30
+# Background ingestion stages (llm fact sheets), referenced until done
+_background_tasks = set()
 
-async def process_pdf(file: UploadFile):
-    global document_chunks
-    try:
-        print(f"Processing file: {file.filename}")
-        # Save uploaded file temporarily
-        temp_file_path = f"temp_{file.filename}"
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        print(f"File saved to {temp_file_path}")
 
-        # Load PDF
-        loader = PyPDFLoader(temp_file_path)
-        documents = loader.load()
-        print(f"Loaded {len(documents)} pages")
+async def get_active_document_id() -> str | None:
+    """The most recently uploaded document, as recorded in the shared registry."""
+    return await state_store.get("documents", "active")
 
-        # Split text into smaller chunks (200-250 words ≈ 500 chars for easier processing)
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        chunks = text_splitter.split_documents(documents)
-        print(f"Split into {len(chunks)} chunks")
 
-        # Store chunks in memory for random selection
-        document_chunks = [chunk.page_content for chunk in chunks]
-        print(f"Stored {len(document_chunks)} chunks in memory")
+async def get_document_chunks(document_id: str = None) -> Sequence:
+    """
+    Chunk texts of a document (default: the active one) as a ChunkStore,
+    cached per worker; texts are decoded only when indexed.
+    """
+    document_id = document_id or await get_active_document_id()
+    if document_id is None:
+        return []
+    current_document_id.set(document_id)
+    await touch(document_id)
+    return await _load_store(document_id, "chunks")
+
+
+async def get_fact_sheets(document_id: str) -> Sequence:
+    """Fact sheets of a document's chunks (same numbering); empty if it has none."""
+    return await _load_store(document_id, "fact_sheets")
+
+
+async def _load_store(document_id: str, kind: str) -> Sequence:
+    version = await registered_version(document_id, kind)
+    key = (document_id, kind, version)
+    store = chunk_cache.get(key)
+    if store is not None:
+        return store
+    if kind == "chunks" or version is not None:
+        store = await load_chunks(document_id, version, kind)
+    if store:
+        chunk_cache.set(key, store)
+        return store
+    if kind == "fact_sheets":
+        chunk_cache.set(key, [], ttl=MISSING_SHEETS_TTL)
+    return []
+
+
+def make_document_id(filename: str, owner=None) -> str:
+    """Stable id per owner and file name, so a re-upload replaces the old copy.
+    Anonymous uploads always get a fresh id."""
+    if owner is None:
+        return uuid.uuid4().hex
+    return hashlib.sha1(f"{owner}:{filename}".encode()).hexdigest()[:24]
+
+
+def _embed_batched(texts: list) -> list:
+    """Embed texts with one request per EMBED_BATCH_SIZE slice, so other callers' texts fit between them."""
+    vectors = []
+    for start in range(0, len(texts), settings.EMBED_BATCH_SIZE):
+        vectors.extend(embeddings.embed_documents(texts[start:start + settings.EMBED_BATCH_SIZE]))
+    return vectors
+
+
+async def _save_upload(file: UploadFile, document_id: str) -> str:
+    # Unique name: several workers (and files of one batch) may upload at once
+    temp_file_path = f"temp_{document_id}_{os.path.basename(file.filename)}"
+    with open(temp_file_path, "wb") as buffer:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, buffer)
+    return temp_file_path
+
+
+def _stored_vectors(document_id: str) -> dict:
+    """Chunk number -> (vector id, metadata) of a document's collection."""
+    stored = get_collection(document_id).get(include=["metadatas"])
+    return {
+        metadata["chunk"]: (vector_id, metadata)
+        for vector_id, metadata in zip(stored["ids"], stored["metadatas"])
+        if metadata and "chunk" in metadata
+    }
 
-        # Store in ChromaDB (keeping for potential future use)
-        print("Adding to ChromaDB...")
-        vector_store.add_documents(chunks)
-        print("Added to ChromaDB")
 
-        # Clean up temp file
-        os.remove(temp_file_path)
+async def _previous_version(document_id: str) -> dict:
+    """
+    What a re-upload can reuse of the document's current version: its page
+    layout, chunk texts, fact sheets and vectors. Empty for a new document,
+    or one ingested with another chunking or before pages were hashed.
+    """
+    entry = await state_store.get("documents", document_id)
+    if not entry or "page_hashes" not in entry or entry.get("chunking") != list(chunking()):
+        return {}
+    chunks = await load_chunks(document_id, entry["chunks_version"])
+    if chunks is None or chunks.version != entry["chunks_version"]:
+        return {}
+    vectors = await asyncio.to_thread(_stored_vectors, document_id)
+    if len(vectors) != len(chunks):
+        return {}
+    sheets = None
+    if entry.get("fact_sheets_version"):
+        sheets = await load_chunks(document_id, entry["fact_sheets_version"], "fact_sheets")
+        if sheets is not None and sheets.version != entry["fact_sheets_version"]:
+            sheets = None
+    return {
+        "entry": entry,
+        "layout": page_layout(entry["page_hashes"], entry["page_chunks"]),
+        "chunks": chunks,
+        "fact_sheets": sheets or [],
+        "vectors": vectors,
+    }
 
-        return {"message": "PDF processed and stored successfully", "chunks_count": len(chunks)}
 
+async def _split_upload(temp_file_path: str, document_id: str, previous: dict = None) -> dict:
+    """
+    Parse and chunk in the ingest worker pool; fails on PDFs without text.
+    With a previous version, only changed pages are split: the result holds
+    every chunk of the new version, and "reused" maps the new number of each
+    chunk of an unchanged page to its number in the previous version.
+    """
+    previous = previous or {}
+    parts = await split_pdf(temp_file_path, previous.get("layout", {}).keys())
+    endpoint = current_endpoint.get()
+    stage_seconds.observe(parts["parse_seconds"], stage="pdf_parse", endpoint=endpoint)
+    stage_seconds.observe(parts["split_seconds"], stage="split", endpoint=endpoint)
+    for metadata in parts["metadatas"]:
+        metadata["document_id"] = document_id
+
+    plan = merge_pages(parts, previous.get("layout", {}))
+    texts, metadatas, reused, taken = [], [], {}, set()
+    for page, number, index in plan["chunks"]:
+        if number is None:
+            texts.append(parts["texts"][index])
+            metadatas.append(parts["metadatas"][index])
+            continue
+        # Page metadata (page number, labels) is current; tags come from the previous version
+        metadata = {**previous["vectors"][number][1], **parts["page_metadatas"][page], "document_id": document_id}
+        # A page repeated in the new version gets its own copy of the vector
+        if number not in taken:
+            taken.add(number)
+            reused[len(texts)] = number
+        texts.append(previous["chunks"][number])
+        metadatas.append(metadata)
+    if not texts:
+        raise ValueError("No extractable text found in PDF")
+    parts.update(texts=texts, metadatas=metadatas, reused=reused,
+                 page_chunks=plan["page_chunks"], pages_changed=plan["pages_changed"])
+    return parts
+
+
+def _fresh_texts(parts: dict) -> list:
+    """Texts of the chunks that need embedding: all but those reused from the previous version."""
+    reused = parts.get("reused", {})
+    return [text for n, text in enumerate(parts["texts"]) if n not in reused]
+
+
+def _write_vectors(document_id: str, metadatas: list, vectors: list, reused: dict = None,
+                   stored: dict = None) -> None:
+    """
+    Chroma keeps only vectors and metadata; the "chunk" number points into the
+    chunk store. vectors belong to the chunks not in reused, in order.
+    """
+    metadatas = [{**(metadata or {}), "chunk": n} for n, metadata in enumerate(metadatas)]
+    fresh = [n for n in range(len(metadatas)) if n not in (reused or {})]
+    if not reused:
+        # A re-upload that keeps nothing replaces the collection
+        delete_collection(document_id)
+        with chroma_write_lock(PERSIST_DIRECTORY):
+            get_collection(document_id).add(
+                ids=[str(uuid.uuid4()) for _ in fresh],
+                embeddings=vectors,
+                metadatas=metadatas,
+            )
+        return
+    # Keep the vectors of unchanged pages (renumbered if pages moved); drop those of changed pages
+    kept = {stored[number][0]: n for n, number in reused.items()}
+    stale = [vector_id for vector_id, _ in stored.values() if vector_id not in kept]
+    moved = [(vector_id, metadatas[n]) for vector_id, n in kept.items() if stored[reused[n]][1] != metadatas[n]]
+    with chroma_write_lock(PERSIST_DIRECTORY):
+        collection = get_collection(document_id)
+        if stale:
+            collection.delete(ids=stale)
+        if moved:
+            collection.update(ids=[vector_id for vector_id, _ in moved],
+                              metadatas=[metadata for _, metadata in moved])
+        if fresh:
+            collection.add(
+                ids=[str(uuid.uuid4()) for _ in fresh],
+                embeddings=vectors,
+                metadatas=[metadatas[n] for n in fresh],
+            )
+
+
+async def _register_document(document_id: str, filename: str, owner, parts: dict, vectors: list,
+                             term_index=None, make_active: bool = True, previous: dict = None) -> dict:
+    """
+    Write vectors and term index, then publish the document in the shared
+    state. vectors are those of _fresh_texts(parts); for a re-upload, the
+    chunks reused from the previous version keep their vectors, topic tags
+    and fact sheets.
+    """
+    texts = parts["texts"]
+    reused = parts.get("reused", {})
+    previous = previous or {}
+    # Topic tags go into the chunk metadata and an inverted index for topic sampling
+    with time_stage("topic_index"):
+        fresh_tags = iter(await asyncio.to_thread(tag_chunks, _fresh_texts(parts)))
+    tags = [
+        [tag for tag in metadata.get("tags", "").split(", ") if tag] if n in reused else next(fresh_tags)
+        for n, metadata in enumerate(parts["metadatas"])
+    ]
+    for metadata, chunk_tags in zip(parts["metadatas"], tags):
+        metadata["tags"] = ", ".join(chunk_tags)
+    with time_stage("chroma_write"):
+        await asyncio.to_thread(_write_vectors, document_id, parts["metadatas"], vectors, reused,
+                                previous.get("vectors"))
+    await save_topic_index(document_id, build_topic_index(tags))
+    # Key terms for distractors, so generation can ask the LLM for question + answer only
+    if settings.DISTRACTOR_ENGINE:
+        await save_term_index(document_id, term_index)
+
+    # Register the document in the shared state so every worker can sample it
+    version = await save_chunks(document_id, texts)
+    now = time.time()
+    entry = {
+        "filename": filename,
+        "owner": owner,
+        "chunks_count": len(texts),
+        "chunks_version": version,
+        "version": previous.get("entry", {}).get("version", 0) + 1,
+        "created_at": now,
+        "last_access": now,
+    }
+    if "page_chunks" in parts:
+        # Page hashes let the next upload of this document skip unchanged pages
+        entry.update(chunking=list(chunking()), page_hashes=parts["page_hashes"], page_chunks=parts["page_chunks"])
+    # Compact fact sheets for generation prompts (see fact_sheet_service)
+    old_sheets = previous.get("fact_sheets", [])
+    sheets = [None] * len(texts)
+    for n, number in reused.items():
+        if number < len(old_sheets):
+            sheets[n] = old_sheets[number]
+    if settings.FACT_SHEETS == "rules":
+        missing = [n for n, sheet in enumerate(sheets) if sheet is None]
+        with time_stage("fact_sheets"):
+            for n, sheet in zip(missing, await asyncio.to_thread(build_rules_sheets, [texts[n] for n in missing])):
+                sheets[n] = sheet
+        entry["fact_sheets_version"] = await save_chunks(document_id, sheets, "fact_sheets")
+    await state_store.set("documents", document_id, entry)
+    if make_active:
+        await state_store.set("documents", "active", document_id)
+    chunk_cache.set((document_id, "chunks", version), await asyncio.to_thread(open_chunks, document_id))
+    if settings.FACT_SHEETS == "llm":
+        task = asyncio.create_task(_write_llm_sheets(document_id, owner, texts, version, sheets))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    result = {"chunks_count": len(texts), "document_id": document_id, "version": entry["version"]}
+    if "page_chunks" in parts:
+        result.update(pages_changed=parts["pages_changed"], chunks_reused=len(reused))
+    logger.info("Processed %s: %d pages (%s changed), %d chunks (%d reused)", filename, parts["pages"],
+                parts.get("pages_changed", "all"), len(texts), len(reused))
+    return result
+
+
+async def _write_llm_sheets(document_id: str, owner, texts: list, chunks_version: str, sheets: list) -> None:
+    """
+    FACT_SHEETS=llm stage, after upload, for the chunks without a sheet (None)
+    in sheets; published only if the chunks were not replaced meanwhile.
+    The calls are charged to the uploader; batches past their budget (or of
+    anonymous uploads while budgets are on) get extractive sheets instead.
+    """
+    current_user_id.set(owner)
+    current_document_id.set(document_id)
+
+    async def complete(prompt: str) -> str:
+        await UsageService.check_budget(owner)
+        return await _complete(prompt)
+
+    try:
+        missing = [n for n, sheet in enumerate(sheets) if sheet is None]
+        with time_stage("fact_sheets"):
+            built = await build_llm_sheets([texts[n] for n in missing], complete)
+        sheets = list(sheets)
+        for n, sheet in zip(missing, built):
+            sheets[n] = sheet
+        entry = await state_store.get("documents", document_id)
+        if entry is None or entry.get("chunks_version") != chunks_version:
+            return
+        entry["fact_sheets_version"] = await save_chunks(document_id, sheets, "fact_sheets")
+        await state_store.set("documents", document_id, entry)
+        logger.info("Wrote fact sheets for %d chunks of %s", len(missing), document_id)
+    except Exception:
+        logger.exception("Building fact sheets for %s failed", document_id)
+
+
+def _remove_temp_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def process_pdf(file: UploadFile, owner=None):
+    logger.info("Processing file: %s", file.filename)
+    document_id = make_document_id(file.filename, owner)
+    temp_file_path = None
+    try:
+        temp_file_path = await _save_upload(file, document_id)
+        # A re-upload only splits and embeds the pages that changed
+        previous = await _previous_version(document_id)
+        parts = await _split_upload(temp_file_path, document_id, previous)
+
+        # Embed off the event loop, then write the vectors to ChromaDB (timed as separate stages)
+        with time_stage("embed"):
+            vectors = await asyncio.to_thread(_embed_batched, _fresh_texts(parts))
+        term_index = None
+        if settings.DISTRACTOR_ENGINE:
+            embed = _embed_batched
+            previous_index = await load_term_index(document_id) if parts["reused"] else None
+            if previous_index is not None:
+                # Terms the previous version already had keep their vectors
+                embed = functools.partial(previous_index.vectors_for, embed=_embed_batched)
+            with time_stage("term_index"):
+                term_index = await asyncio.to_thread(build_term_index, parts["texts"], embed)
+
+        result = await _register_document(document_id, file.filename, owner, parts, vectors, term_index,
+                                          previous=previous)
+        return {"message": "PDF processed and stored successfully", **result}
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Error in process_pdf: {str(e)}")
+        logger.exception("Error in process_pdf")
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+    finally:
+        if temp_file_path:
+            _remove_temp_file(temp_file_path)
+
 
-def retrieve_documents(query: str) -> str:
-    """Retrieves relevant documents from the vector store based on the query."""
-    retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-    docs = retriever.invoke(query)
-    return "\n\n".join([doc.page_content for doc in docs])
+async def process_pdfs(files: list, owner=None) -> dict:
+    """
+    Ingest several PDFs in one request. Files are parsed concurrently in the
+    ingest worker pool (CPU-aware limit); the new chunks of all files (only
+    changed pages of a re-upload), and then their key terms, are embedded
+    together in EMBED_BATCH_SIZE batches.
+    Each file gets its own result, and one bad file does not stop the rest.
+    """
+    results = [None] * len(files)
+    jobs, temp_paths, seen, previous_versions = [], [], set(), {}
+
+    def fail(i: int, error) -> None:
+        logger.warning("Batch upload: %s failed: %s", files[i].filename, error)
+        results[i] = {"filename": files[i].filename, "error": str(error)}
+
+    try:
+        for i, file in enumerate(files):
+            document_id = make_document_id(file.filename, owner)
+            if document_id in seen:
+                fail(i, "Duplicate file name in this upload")
+                continue
+            seen.add(document_id)
+            try:
+                temp_paths.append(await _save_upload(file, document_id))
+                jobs.append((i, document_id, temp_paths[-1]))
+            except Exception as e:
+                fail(i, e)
+
+        async def split(document_id: str, path: str) -> dict:
+            previous_versions[document_id] = await _previous_version(document_id)
+            return await _split_upload(path, document_id, previous_versions[document_id])
+
+        parsed = await asyncio.gather(
+            *(split(document_id, path) for _, document_id, path in jobs), return_exceptions=True)
+        ready = []
+        for (i, document_id, _), parts in zip(jobs, parsed):
+            if isinstance(parts, BaseException):
+                fail(i, parts)
+            else:
+                ready.append((i, document_id, parts))
+
+        # One embedding pass over every file's chunks, one over every file's key terms
+        try:
+            with time_stage("embed"):
+                vectors = await asyncio.to_thread(_embed_batched, [t for _, _, p in ready for t in _fresh_texts(p)])
+            term_lists = [[] for _ in ready]
+            term_vectors = [[] for _ in ready]
+            if settings.DISTRACTOR_ENGINE:
+                with time_stage("term_index"):
+                    term_lists = [await asyncio.to_thread(extract_terms, p["texts"]) for _, _, p in ready]
+                    # As in process_pdf, terms a re-upload's previous version had keep their vectors
+                    previous_indexes = [await load_term_index(document_id) if p["reused"] else None
+                                        for _, document_id, p in ready]
+                    new_terms = [index.unknown(terms) if index is not None else terms
+                                 for terms, index in zip(term_lists, previous_indexes)]
+                    embedded = await asyncio.to_thread(_embed_batched, [t for terms in new_terms for t in terms])
+                    offset = 0
+                    for k, (terms, index) in enumerate(zip(term_lists, previous_indexes)):
+                        file_new = embedded[offset:offset + len(new_terms[k])]
+                        offset += len(new_terms[k])
+                        term_vectors[k] = index.vectors_for(terms, embed=lambda _, v=file_new: v) if index else file_new
+        except Exception as e:
+            logger.exception("Batch upload: embedding failed")
+            for i, _, _ in ready:
+                fail(i, e)
+            ready = []
+
+        last_document_id = None
+        chunk_offset = 0
+        for (i, document_id, parts), terms, file_term_vectors in zip(ready, term_lists, term_vectors):
+            fresh = len(parts["texts"]) - len(parts["reused"])
+            file_vectors = vectors[chunk_offset:chunk_offset + fresh]
+            chunk_offset += fresh
+            term_index = TermIndex(terms, file_term_vectors) if len(terms) >= MIN_TERMS else None
+            try:
+                result = await _register_document(
+                    document_id, files[i].filename, owner, parts, file_vectors, term_index, make_active=False,
+                    previous=previous_versions[document_id])
+                results[i] = {"filename": files[i].filename, **result}
+                last_document_id = document_id
+            except Exception as e:
+                logger.exception("Batch upload: storing %s failed", files[i].filename)
+                fail(i, e)
+
+        if last_document_id is not None:
+            await state_store.set("documents", "active", last_document_id)
+    finally:
+        for path in temp_paths:
+            _remove_temp_file(path)
+
+    failed = sum(1 for r in results if "error" in r)
+    return {"results": results, "succeeded": len(results) - failed, "failed": failed}
+
+
+async def retrieve_documents(query: str, document_id: str = None, k: int = 5) -> str:
+    """Retrieves relevant chunks of one document (default: the active one) for the query."""
+    document_id = document_id or await get_active_document_id()
+    if document_id is None:
+        return ""
+    current_document_id.set(document_id)
+    await touch(document_id)
+    with time_stage("retrieval"):
+        query_vector = await asyncio.to_thread(embeddings.embed_query, query)
+        numbers, stored = await asyncio.to_thread(_nearest, document_id, query_vector, k)
+    chunks = await get_document_chunks(document_id)
+    texts = [chunks[n] if n is not None and n < len(chunks) else text for n, text in zip(numbers, stored)]
+    return "\n\n".join(text for text in texts if text)
+
+
+def _nearest(document_id: str, query_vector: list, k: int) -> tuple:
+    """
+    Chunk numbers of the k chunks nearest the query vector (blocking), with the
+    texts Chroma holds for collections written before it stopped storing them.
+    """
+    result = get_collection(document_id).query(
+        query_embeddings=[query_vector], n_results=k, include=["metadatas", "documents"])
+    metadatas = result["metadatas"][0] if result["metadatas"] else []
+    stored = result["documents"][0] if result["documents"] else [None] * len(metadatas)
+    return [(metadata or {}).get("chunk") for metadata in metadatas], stored
 
 
 def format_option(text: str, max_length: int = 100) -> str:
@@ -101,7 +531,7 @@ def format_quiz_options(options: list, max_length: int = 100) -> list:
     return [format_option(opt, max_length) for opt in options]
 
 
-def check_answer_similarity(user_answer: str, correct_answer: str) -> dict:
+async def check_answer_similarity(user_answer: str, correct_answer: str) -> dict:
     """
     Check if user's answer is correct using direct comparison first,
     then cosine similarity as fallback.
@@ -118,9 +548,8 @@ def check_answer_similarity(user_answer: str, correct_answer: str) -> dict:
                 "is_correct": True
             }
         
-        # Get embeddings for both answers for similarity score
-        user_embedding = embeddings.embed_query(user_answer)
-        correct_embedding = embeddings.embed_query(correct_answer)
+        # Get embeddings for both answers (one request) for similarity score
+        user_embedding, correct_embedding = await embeddings.aembed_documents([user_answer, correct_answer])
         
         # Calculate cosine similarity
         import numpy as np
@@ -137,7 +566,7 @@ def check_answer_similarity(user_answer: str, correct_answer: str) -> dict:
             "is_correct": is_correct
         }
     except Exception as e:
-        print(f"Error in similarity check: {e}")
+        logger.warning("Error in similarity check: %s", e)
         # Fallback to exact match on error
         return {
             "similarity": 1.0 if user_answer.strip().lower() == correct_answer.strip().lower() else 0.0,
@@ -145,34 +574,56 @@ def check_answer_similarity(user_answer: str, correct_answer: str) -> dict:
         }
 
 
+def check_answer_index(user_index: int, correct_index: int) -> dict:
+    """
+    Grade an MCQ or True/False answer by comparing the selected option index
+    with the correct option index. No embeddings are needed for this path.
+    """
+    is_correct = user_index == correct_index
+    return {
+        "similarity": 1.0 if is_correct else 0.0,
+        "is_correct": is_correct
+    }
+
+
 async def check_quiz_answers(answers: list) -> dict:
     """
-    Check all quiz answers using cosine similarity.
-    answers: list of {question_id, user_answer, correct_answer}
+    Check all quiz answers.
+    MCQ and True/False answers that carry option indices are graded with an
+    integer comparison; free-text answers fall back to cosine similarity.
+    answers: list of {question_id, user_answer, correct_answer,
+                      user_answer_index?, correct_answer_index?}
     """
     results = []
     correct_count = 0
     
-    print(f"Checking {len(answers)} answers...")
+    async def grade(answer: dict) -> dict:
+        user_idx = answer.get("user_answer_index")
+        correct_idx = answer.get("correct_answer_index")
+        # Option-index fast path for MCQ and True/False answers
+        if user_idx is not None and correct_idx is not None:
+            result = check_answer_index(user_idx, correct_idx)
+            result["graded_by"] = "index"
+        else:
+            result = await check_answer_similarity(answer.get("user_answer", ""), answer.get("correct_answer", ""))
+            result["graded_by"] = "similarity"
+        return result
+
+    with time_stage("grading"):
+        # Concurrent similarity checks share embedding model calls
+        graded = await asyncio.gather(*(grade(answer) for answer in answers))
+        for answer, result in zip(answers, graded):
+            user_ans = answer.get("user_answer", "")
+            correct_ans = answer.get("correct_answer", "")
+            result["question_id"] = answer.get("question_id")
+            result["user_answer"] = user_ans
+            result["correct_answer"] = correct_ans
+            results.append(result)
+            
+            if result["is_correct"]:
+                correct_count += 1
     
-    for answer in answers:
-        user_ans = answer.get("user_answer", "")
-        correct_ans = answer.get("correct_answer", "")
-        
-        print(f"Q{answer.get('question_id')}: User='{user_ans}' | Correct='{correct_ans}'")
-        
-        result = check_answer_similarity(user_ans, correct_ans)
-        result["question_id"] = answer.get("question_id")
-        result["user_answer"] = user_ans
-        result["correct_answer"] = correct_ans
-        results.append(result)
-        
-        print(f"  -> Similarity: {result['similarity']:.2f}, Correct: {result['is_correct']}")
-        
-        if result["is_correct"]:
-            correct_count += 1
-    
-    print(f"Final score: {correct_count}/{len(answers)}")
+    logger.debug("Graded %d answers, score %d", len(answers), correct_count)
     
     return {
         "results": results,
@@ -182,28 +633,35 @@ async def check_quiz_answers(answers: list) -> dict:
     }
 
 
-async def generate_single_question(topic: str, difficulty: str = "medium", question_type: str = "mcq", previous_questions: list = None):
-    """Generate a single quiz question at a time using AutoGen model client."""
-    try:
-        # Get a random chunk for this question
-        context = get_random_chunks(1)
-        
-        if not context or len(context) < 50:
-            return {"error": "No content found. Upload a PDF first."}
-        
-        # Truncate if too long
-        if len(context) > 1500:
-            context = context[:1500]
-        
-        # Build prompt for single question
-        q_type = "MCQ with 4 options" if question_type == "mcq" else "True/False" if question_type == "truefalse" else "MCQ with 4 options"
-        
-        # Avoid duplicate questions
-        avoid_text = ""
-        if previous_questions:
-            avoid_text = f"Do NOT ask about: {', '.join(previous_questions[:5])}"
-        
-        prompt = f"""Generate exactly 1 {difficulty} {q_type} question from this text.
+async def _complete(prompt: str) -> str:
+    """
+    Send one prompt to the model client, recording latency and token usage.
+    Raises asyncio.TimeoutError after LLM_TIMEOUT_SECONDS.
+    """
+    messages = [UserMessage(content=prompt, source="user")]
+    with time_stage("llm"):
+        response = await asyncio.wait_for(model_client.create(messages=messages), settings.LLM_TIMEOUT_SECONDS)
+    record_llm_usage(response.usage)
+    return response.content
+
+
+def _single_question_prompt(context: str, difficulty: str, q_type: str, avoid_text: str, short_answer: bool = False) -> str:
+    if short_answer:
+        return f"""Generate exactly 1 {difficulty} question from this text. Its answer must be a short term or phrase (max 5 words) from the text.
+{avoid_text}
+
+TEXT:
+{context}
+
+RESPOND WITH ONLY PLAIN JSON TEXT. NO MARKDOWN. NO CODE BLOCKS. NO EXPLANATION.
+Just return this exact format with your content:
+{{"question":"your question here","answer":"short answer","explanation":"brief explanation"}}
+
+Rules:
+- Do NOT write answer options; they are added automatically
+- Question must be directly from the provided text
+- OUTPUT ONLY THE JSON OBJECT, NOTHING ELSE"""
+    return f"""Generate exactly 1 {difficulty} {q_type} question from this text.
 {avoid_text}
 
 TEXT:
@@ -222,80 +680,166 @@ Rules:
 - For True/False: options are ["True","False"]
 - OUTPUT ONLY THE JSON OBJECT, NOTHING ELSE"""
 
-        print(f"Generating single question with AutoGen...")
+
+def _rules_single_question(context: str, question_type: str, previous_questions: list, reason: str) -> dict:
+    record_rule_generation(reason)
+    questions = RuleBased.generate_questions(context, 1, question_type, previous_questions)
+    if not questions:
+        return {"error": "Could not build a question from this part of the document."}
+    questions[0]["generator"] = "rules"
+    return questions[0]
+
+
+async def generate_single_question(topic: str, difficulty: str = "medium", question_type: str = "mcq", previous_questions: list = None, document_id: str = None, mode: str = None):
+    """
+    Generate a single quiz question at a time using AutoGen model client,
+    or the rule-based generator for mode="rules" and when the LLM times out.
+    With a term index for the document, the LLM writes only the question and
+    answer and the distractor engine supplies the options.
+    """
+    try:
+        # Get a chunk about the topic (random for a general topic)
+        context = await get_topic_chunks(topic, 1, document_id, facts=use_fact_sheets(mode))
         
-        # Use AutoGen model client to generate response
-        messages = [UserMessage(content=prompt, source="user")]
-        response = await model_client.create(messages=messages)
+        if not context or len(context) < 50:
+            return {"error": "No content found. Upload a PDF first."}
         
-        # Extract text content from response
-        result = response.content.strip()
+        if RuleBased.use_rules(mode):
+            return _rules_single_question(context, question_type, previous_questions, "mode")
         
-        # Clean markdown wrappers if LLM still adds them
-        if result.startswith("```json"):
-            result = result[7:]
-        elif result.startswith("```"):
-            result = result[3:]
-        if result.endswith("```"):
-            result = result[:-3]
-        result = result.strip()
+        # Truncate if too long
+        if len(context) > 1500:
+            context = context[:1500]
         
-        # Parse and validate
-        parsed = json.loads(result)
+        # Build prompt for single question
+        q_type = "MCQ with 4 options" if question_type == "mcq" else "True/False" if question_type == "truefalse" else "MCQ with 4 options"
         
-        # Format options to max 100 characters
-        if 'options' in parsed:
-            parsed['options'] = format_quiz_options(parsed['options'], 100)
+        # Avoid duplicate questions
+        avoid_text = ""
+        if previous_questions:
+            avoid_text = f"Do NOT ask about: {', '.join(previous_questions[:5])}"
+        
+        short_answer = settings.DISTRACTOR_ENGINE and question_type != "truefalse" and await has_term_index(document_id)
+        prompt = _single_question_prompt(context, difficulty, q_type, avoid_text, short_answer)
         
-        # Ensure correctAnswerText is set (after formatting)
-        idx = parsed.get('correctAnswer', 0)
-        opts = parsed.get('options', [])
-        if opts and 0 <= idx < len(opts):
-            parsed['correctAnswerText'] = opts[idx]
+        # Parse tolerantly; re-ask only if nothing usable came back
+        for attempt in range(settings.LLM_PARSE_RETRIES + 1):
+            try:
+                result = await _complete(prompt)
+            except asyncio.TimeoutError:
+                logger.warning("LLM timed out, using rule-based question")
+                return _rules_single_question(context, question_type, previous_questions, "timeout")
+            parser = parse_llm_output(result, expect="quiz")
+            record_parse_failure(parser.failed)
+            questions = await complete_questions(parser.questions, document_id)
+            if questions:
+                break
+            logger.warning("No valid question in response (attempt %d): %.200s", attempt + 1, result)
+        else:
+            return {"error": "Failed to parse question"}
+        
+        parsed = questions[0]
+        
+        # Format options to max 100 characters
+        parsed['options'] = format_quiz_options(parsed['options'], 100)
+        parsed['correctAnswerText'] = parsed['options'][parsed['correctAnswer']]
         
-        print(f"Generated question: {parsed.get('question', '')[:50]}...")
         return parsed
         
-    except json.JSONDecodeError as e:
-        print(f"JSON parse error: {e}")
-        print(f"Raw result: {result[:200] if 'result' in dir() else 'N/A'}")
-        return {"error": "Failed to parse question"}
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Error generating question: {e}")
+        logger.exception("Error generating question")
         return {"error": str(e)}
 
 
-def get_random_chunks(num_chunks: int = 5) -> str:
-    """Gets random chunks from the stored document chunks."""
-    global document_chunks
-    
-    if not document_chunks:
-        # Try to get chunks from ChromaDB if memory is empty
-        try:
-            all_docs = vector_store.get()
-            if all_docs and all_docs.get('documents'):
-                document_chunks = all_docs['documents']
-        except Exception as e:
-            print(f"Error retrieving from ChromaDB: {e}")
+async def get_random_chunks(num_chunks: int = 5, document_id: str = None, facts: bool = False) -> str:
+    """Gets random chunks from the stored document chunks (their fact sheets with facts=True)."""
+    document_id = document_id or await get_active_document_id()
+    document_chunks = await get_document_chunks(document_id)
     
     if not document_chunks:
         return ""
     
-    # Select random chunks (or all if fewer than requested)
+    # Select random chunks (or all if fewer than requested); only those are decoded
     num_to_select = min(num_chunks, len(document_chunks))
-    selected_chunks = random.sample(document_chunks, num_to_select)
+    selected = random.sample(range(len(document_chunks)), num_to_select)
     
-    return "\n\n---\n\n".join(selected_chunks)
+    return await _join_chunks(document_id, document_chunks, selected, facts)
+
+
+async def _join_chunks(document_id: str, document_chunks: Sequence, selected: list, facts: bool) -> str:
+    """Prompt context from the selected chunks; with facts, each chunk's fact sheet where it has one."""
+    sheets = await get_fact_sheets(document_id) if facts else []
+    texts = [sheets[i] if i < len(sheets) and sheets[i] else document_chunks[i] for i in selected]
+    return "\n\n---\n\n".join(texts)
+
+
+def _search_chunks(document_id: str, query: str, k: int) -> list:
+    """Numbers of the k chunks closest to the query (blocking; run in a thread)."""
+    numbers, _ = _nearest(document_id, embeddings.embed_query(query), k)
+    return [n for n in numbers if n is not None]
+
+
+async def get_topic_chunks(topic: str, num_chunks: int = 5, document_id: str = None, facts: bool = False) -> str:
+    """
+    Gets chunks about the topic from the topic index, varied between calls.
+    A general topic, or one nothing in the document relates to, gets random chunks.
+    With facts=True the chunks' fact sheets are used where they exist.
+    """
+    document_id = document_id or await get_active_document_id()
+    document_chunks = await get_document_chunks(document_id)
+    if not document_chunks:
+        return ""
+
+    search = functools.partial(_search_chunks, document_id)
+    ranked = await find_topic_chunks(topic, document_id, document_chunks, search)
+    if not ranked:
+        return await get_random_chunks(num_chunks, document_id, facts)
+    # Sample among the best matches so repeated requests see different passages
+    pool = ranked[:num_chunks * 2]
+    selected = sorted(random.sample(pool, min(num_chunks, len(pool))))
+    return await _join_chunks(document_id, document_chunks, selected, facts)
+
+def _quiz_prompt(num_questions: int, difficulty: str, q_type: str, context: str, flashcard_note: str = "", avoid_text: str = "", short_answer: bool = False) -> str:
+    if short_answer:
+        # Options are filled in by the distractor engine: far fewer output tokens
+        item_format = '{"question":"...","answer":"...","explanation":"..."}'
+        rules = "answer=short term or phrase from the text (max 5 words), or True/False for T/F; do NOT write options; questions from text only."
+    else:
+        item_format = '{"id":1,"question":"...","options":["A","B","C","D"],"correctAnswer":0,"correctAnswerText":"A","explanation":"...","type":"mcq"}'
+        rules = "correctAnswer=index(0-3 MCQ,0-1 T/F), correctAnswerText=exact option text, questions from text only."
+    return f"""Generate {num_questions} {difficulty} {q_type} questions from this text. {flashcard_note}
+{avoid_text}
+TEXT:
+{context}
+
+RESPOND WITH ONLY PLAIN JSON TEXT. NO MARKDOWN. NO CODE BLOCKS. NO EXPLANATION.
+{{"quiz":[{item_format}],"flashcards":[{{"id":1,"front":"...","back":"..."}}]}}
+
+Rules: {rules}
+OUTPUT ONLY THE JSON OBJECT, NOTHING ELSE."""
+
+
+def _rules_quiz(context: str, num_questions: int, include_flashcards: bool, question_type: str, reason: str) -> dict:
+    record_rule_generation(reason)
+    quiz = RuleBased.generate_questions(context, num_questions, question_type)
+    flashcards = RuleBased.generate_flashcards(context, 5) if include_flashcards else []
+    if not quiz and not flashcards:
+        return {"quiz": [], "flashcards": [], "error": "Could not build questions from this document."}
+    return {"quiz": quiz, "flashcards": flashcards, "generator": "rules"}
 
-async def generate_quiz_from_rag(topic: str, num_questions: int = 5, include_flashcards: bool = False, difficulty: str = "medium", question_type: str = "mixed"):
+
+async def generate_quiz_from_rag(topic: str, num_questions: int = 5, include_flashcards: bool = False, difficulty: str = "medium", question_type: str = "mixed", document_id: str = None, mode: str = None):
     try:
-        # Get random chunks (fewer chunks = fewer tokens)
+        if RuleBased.use_rules(mode):
+            # No token budget to respect: give the generator more text to work with
+            context = await get_topic_chunks(topic, max(3, num_questions), document_id)
+            if not context:
+                return {"quiz": [], "flashcards": [], "error": "No content found. Upload a PDF first."}
+            return _rules_quiz(context, num_questions, include_flashcards, question_type, "mode")
+        
+        # Get chunks (or their fact sheets) about the topic (fewer chunks = fewer tokens)
         num_chunks = min(3, max(2, num_questions // 2))
-        print(f"Getting {num_chunks} random chunks for quiz generation")
-        context = get_random_chunks(num_chunks)
-        print(f"Retrieved context length: {len(context)} characters")
+        context = await get_topic_chunks(topic, num_chunks, document_id, facts=use_fact_sheets(mode))
         
         # Truncate context if too long (save tokens)
         max_context_chars = 2000
@@ -303,55 +847,48 @@ async def generate_quiz_from_rag(topic: str, num_questions: int = 5, include_fla
             context = context[:max_context_chars] + "..."
         
         if not context or len(context) < 50:
-            return json.dumps({"quiz": [], "flashcards": [], "error": "No content found. Upload a PDF first."})
+            return {"quiz": [], "flashcards": [], "error": "No content found. Upload a PDF first."}
 
         # Build compact prompt
         q_type = "MCQ(4 options)" if question_type == "mcq" else "True/False" if question_type == "truefalse" else "mixed MCQ+T/F"
         flashcard_note = "Include 5 flashcards." if include_flashcards else ""
+        short_answer = settings.DISTRACTOR_ENGINE and question_type != "truefalse" and await has_term_index(document_id)
         
-        prompt = f"""Generate {num_questions} {difficulty} {q_type} questions from this text. {flashcard_note}
-
-TEXT:
-{context}
-
-RESPOND WITH ONLY PLAIN JSON TEXT. NO MARKDOWN. NO CODE BLOCKS. NO EXPLANATION.
-{{"quiz":[{{"id":1,"question":"...","options":["A","B","C","D"],"correctAnswer":0,"correctAnswerText":"A","explanation":"...","type":"mcq"}}],"flashcards":[{{"id":1,"front":"...","back":"..."}}]}}
-
-Rules: correctAnswer=index(0-3 MCQ,0-1 T/F), correctAnswerText=exact option text, questions from text only.
-OUTPUT ONLY THE JSON OBJECT, NOTHING ELSE."""
-
-        print(f"Calling AutoGen model client...")
+        try:
+            result = await _complete(_quiz_prompt(num_questions, difficulty, q_type, context, flashcard_note, short_answer=short_answer))
+        except asyncio.TimeoutError:
+            logger.warning("LLM timed out, using rule-based quiz")
+            return _rules_quiz(context, num_questions, include_flashcards, question_type, "timeout")
         
-        # Use AutoGen model client
-        messages = [UserMessage(content=prompt, source="user")]
-        response = await model_client.create(messages=messages)
-        result = response.content.strip()
+        # Salvage every valid item, even if some are malformed or the output is cut off
+        parser = parse_llm_output(result)
+        record_parse_failure(parser.failed)
+        quiz, flashcards = await complete_questions(parser.questions, document_id), parser.flashcards
         
-        # Clean markdown wrappers
-        if result.startswith("```json"):
-            result = result[7:]
-        elif result.startswith("```"):
-            result = result[3:]
-        if result.endswith("```"):
-            result = result[:-3]
-        result = result.strip()
+        # Re-request only the missing questions instead of regenerating the batch
+        for _ in range(settings.LLM_PARSE_RETRIES):
+            missing = num_questions - len(quiz)
+            if missing <= 0:
+                break
+            avoid_text = "Do NOT repeat these questions: " + "; ".join(q["question"] for q in quiz[:10]) if quiz else ""
+            logger.info("Response had %d/%d questions, requesting %d more", len(quiz), num_questions, missing)
+            try:
+                retry = parse_llm_output(await _complete(_quiz_prompt(missing, difficulty, q_type, context, avoid_text=avoid_text, short_answer=short_answer)))
+            except asyncio.TimeoutError:
+                # Keep what the model produced and fill the rest without it
+                record_rule_generation("timeout")
+                quiz.extend(RuleBased.generate_questions(context, missing, question_type, [q["question"] for q in quiz]))
+                break
+            record_parse_failure(retry.failed)
+            quiz.extend((await complete_questions(retry.questions, document_id))[:missing])
         
-        # Parse and validate
-        try:
-            parsed = json.loads(result)
-            for q in parsed.get('quiz', []):
-                idx = q.get('correctAnswer', 0)
-                opts = q.get('options', [])
-                if opts and 0 <= idx < len(opts):
-                    q['correctAnswerText'] = opts[idx]
-            print(f"Generated {len(parsed.get('quiz', []))} questions")
-            return json.dumps(parsed)
-        except json.JSONDecodeError as e:
-            print(f"JSON error: {e}")
-            return json.dumps({"quiz": [], "flashcards": [], "error": "Parse error"})
+        for idx, q in enumerate(quiz):
+            q["id"] = idx + 1
+        
+        if not quiz and not flashcards:
+            return {"quiz": [], "flashcards": [], "error": "Parse error"}
+        return {"quiz": quiz[:num_questions], "flashcards": flashcards}
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"Error generating quiz: {e}")
+        logger.exception("Error generating quiz")
         raise HTTPException(status_code=500, detail=str(e))
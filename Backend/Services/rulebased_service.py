@@ -0,0 +1,272 @@
+"""
+Rule-Based Generation Service
+Builds quiz questions and flashcards from document text without an LLM:
+sentence segmentation plus keyphrase extraction, turned into cloze,
+definition and true/false items. Output uses the same schema as the LLM
+generators, so it can serve mode=rules requests and stand in when the
+model times out. Pure Python; generates hundreds of items per second.
+"""
+import re
+import random
+from collections import Counter
+from config import settings
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each either else etc even ever
+every few for from further had has have having he her here hers him his how however i if in into
+is it its itself just like may me might more most much must my no nor not now of off often on once
+only or other our ours out over own per rather same several she should since so some such than that
+the their theirs them then there these they this those through thus to too under until up upon us
+used using very via was we were what when where whether which while who whom whose why will with
+within without would yet you your
+""".split())
+
+# Sentence boundary: end punctuation followed by whitespace and an upper-case start
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]?\s+(?=[\"'(\[]?[A-Z0-9])")
+WORD = re.compile(r"[A-Za-z][A-Za-z0-9\-']*|\d+(?:\.\d+)?")
+# "<Term> is/are/refers to/means ... <definition>"
+DEFINITION = re.compile(
+    r"^(?P<term>[A-Z][\w\-]*(?:\s+[\w\-]+){0,4}?)\s+"
+    r"(?:is|are|refers to|means|is defined as|is known as)\s+"
+    r"(?P<definition>(?:a|an|the)\s.{10,}|.{15,})$"
+)
+MIN_SENTENCE_WORDS = 6
+MAX_SENTENCE_WORDS = 40
+MAX_PHRASE_WORDS = 3
+
+
+def split_sentences(text: str) -> list:
+    """Split text into cleaned sentences of a quizzable length."""
+    text = re.sub(r"\s+", " ", text.replace("---", " ")).strip()
+    sentences = []
+    for raw in SENTENCE_BOUNDARY.split(text):
+        sentence = raw.strip(" -•*\"'")
+        words = len(sentence.split())
+        if MIN_SENTENCE_WORDS <= words <= MAX_SENTENCE_WORDS and sentence[-1:] in ".!?":
+            sentences.append(sentence)
+    return sentences
+
+
+def _candidate_phrases(sentence: str) -> list:
+    """Runs of up to MAX_PHRASE_WORDS content words, split at stopwords (RAKE-style)."""
+    phrases, run = [], []
+    for token in WORD.findall(sentence):
+        if token.lower() in STOPWORDS or len(token) < 3 and not token.isdigit():
+            if run:
+                phrases.append(run)
+            run = []
+        else:
+            run.append(token)
+    if run:
+        phrases.append(run)
+    # Long runs are split into leading chunks so options stay short
+    return [" ".join(run[i:i + MAX_PHRASE_WORDS]) for run in phrases for i in range(0, len(run), MAX_PHRASE_WORDS)]
+
+
+def extract_keyphrases(sentences: list, top_k: int = 50) -> list:
+    """
+    Rank content phrases by RAKE-style degree/frequency of their words, boosted
+    for multi-word phrases and repetition across sentences.
+    """
+    word_freq, word_degree, phrase_freq = Counter(), Counter(), Counter()
+    for sentence in sentences:
+        for phrase in _candidate_phrases(sentence):
+            words = phrase.lower().split()
+            phrase_freq[phrase] += 1
+            for word in words:
+                word_freq[word] += 1
+                word_degree[word] += len(words)
+
+    scores = {}
+    for phrase, freq in phrase_freq.items():
+        words = phrase.lower().split()
+        # Cheap noun-phrase filter without a tagger: drop numbers, adverbs and past-tense endings
+        if phrase.isdigit() or words[-1].endswith(("ed", "ly")) or words[0].endswith("ly"):
+            continue
+        scores[phrase] = sum(word_degree[w] / word_freq[w] for w in words) * (1 + 0.5 * (freq - 1))
+    ranked = sorted(scores, key=scores.get, reverse=True)
+
+    # Keep one casing per phrase
+    seen, result = set(), []
+    for phrase in ranked:
+        if phrase.lower() not in seen:
+            seen.add(phrase.lower())
+            result.append(phrase)
+        if len(result) >= top_k:
+            break
+    return result
+
+
+def _pick_distractors(answer: str, pool: list, rng: random.Random, count: int = 3, exclude_text: str = "") -> list:
+    """Other keyphrases of similar length that do not appear in the source sentence."""
+    answer_words = len(answer.split())
+    exclude = exclude_text.lower()
+    candidates = [
+        p for p in pool
+        if p.lower() != answer.lower() and p.lower() not in exclude and answer.lower() not in p.lower()
+    ]
+    candidates.sort(key=lambda p: abs(len(p.split()) - answer_words))
+    # Shuffle within the closest-length candidates so the same distractors are not always used
+    nearest = candidates[:count * 3]
+    rng.shuffle(nearest)
+    return nearest[:count]
+
+
+def _mcq(question: str, answer: str, distractors: list, explanation: str, rng: random.Random) -> dict:
+    options = [answer] + distractors
+    rng.shuffle(options)
+    index = options.index(answer)
+    return {
+        "question": question,
+        "options": options,
+        "correctAnswer": index,
+        "correctAnswerText": answer,
+        "explanation": explanation,
+        "type": "mcq",
+    }
+
+
+def make_cloze(sentence: str, phrase: str, pool: list, rng: random.Random) -> dict | None:
+    """Blank out a keyphrase; the other keyphrases supply the distractors."""
+    match = re.search(r"\b" + re.escape(phrase) + r"\b", sentence, re.IGNORECASE)
+    if not match:
+        return None
+    distractors = _pick_distractors(phrase, pool, rng, exclude_text=sentence)
+    if len(distractors) < 3:
+        return None
+    blanked = sentence[:match.start()] + "_____" + sentence[match.end():]
+    return _mcq(f"Fill in the blank: {blanked}", match.group(0), distractors,
+                f"From the text: \"{sentence}\"", rng)
+
+
+def find_definitions(sentences: list) -> list:
+    """(term, definition, sentence) triples for sentences shaped like definitions."""
+    definitions = []
+    for sentence in sentences:
+        match = DEFINITION.match(sentence)
+        if match:
+            term = match.group("term").strip()
+            if term.split()[0].lower() in STOPWORDS:
+                continue
+            definitions.append((term, match.group("definition").rstrip(" ."), sentence))
+    return definitions
+
+
+def make_definition(term: str, definition: str, sentence: str, others: list, rng: random.Random) -> dict | None:
+    """Asks which option best describes the term; other terms' definitions are the distractors."""
+    distractors = [d for t, d, _ in others if t.lower() != term.lower() and d != definition]
+    if len(distractors) < 3:
+        return None
+    rng.shuffle(distractors)
+    return _mcq(f"Which of the following best describes {term}?", definition, distractors[:3],
+                f"From the text: \"{sentence}\"", rng)
+
+
+def make_true_false(sentence: str, phrase: str, pool: list, rng: random.Random) -> dict | None:
+    """State the sentence as-is (True) or with the keyphrase swapped for another (False)."""
+    statement, is_true = sentence, True
+    if rng.random() < 0.5:
+        replacement = _pick_distractors(phrase, pool, rng, count=1, exclude_text=sentence)
+        pattern = re.compile(r"\b" + re.escape(phrase) + r"\b", re.IGNORECASE)
+        if replacement and pattern.search(sentence):
+            statement, is_true = pattern.sub(replacement[0], sentence, count=1), False
+    index = 0 if is_true else 1
+    return {
+        "question": f"True or False: {statement}",
+        "options": ["True", "False"],
+        "correctAnswer": index,
+        "correctAnswerText": ["True", "False"][index],
+        "explanation": f"From the text: \"{sentence}\"",
+        "type": "truefalse",
+    }
+
+
+def _phrase_in(sentence: str, pool: list) -> str | None:
+    lowered = sentence.lower()
+    for phrase in pool:
+        if re.search(r"\b" + re.escape(phrase.lower()) + r"\b", lowered):
+            return phrase
+    return None
+
+
+def generate_questions(text: str, num_questions: int = 5, question_type: str = "mixed",
+                       previous_questions: list = None, seed: int = None) -> list:
+    """
+    Generate up to num_questions questions from text.
+    question_type: "mcq" (cloze + definition), "truefalse", or "mixed".
+    Questions whose text appears in previous_questions are skipped.
+    """
+    rng = random.Random(seed)
+    sentences = split_sentences(text)
+    if not sentences:
+        return []
+    pool = extract_keyphrases(sentences)
+    definitions = find_definitions(sentences)
+    previous = {p.strip().lower() for p in previous_questions or []}
+
+    makers = {"mcq": ["definition", "cloze"], "truefalse": ["truefalse"]}.get(
+        question_type, ["definition", "cloze", "truefalse"])
+    order = sentences[:]
+    rng.shuffle(order)
+    definition_by_sentence = {s: (t, d) for t, d, s in definitions}
+
+    questions, used = [], set()
+    for sentence in order:
+        if len(questions) >= num_questions:
+            break
+        item = None
+        for kind in makers:
+            if kind == "definition" and sentence in definition_by_sentence:
+                term, definition = definition_by_sentence[sentence]
+                item = make_definition(term, definition, sentence, definitions, rng)
+            elif kind in ("cloze", "truefalse"):
+                phrase = _phrase_in(sentence, pool)
+                if phrase:
+                    maker = make_cloze if kind == "cloze" else make_true_false
+                    item = maker(sentence, phrase, pool, rng)
+            if item:
+                break
+        if item is None or item["question"].lower() in previous or item["question"] in used:
+            continue
+        used.add(item["question"])
+        # Rotate the preferred kind so a mixed quiz does not start with one type only
+        makers = makers[1:] + makers[:1]
+        item["id"] = len(questions) + 1
+        questions.append(item)
+    return questions
+
+
+def generate_flashcards(text: str, num_flashcards: int = 5, previous_flashcards: list = None, seed: int = None) -> list:
+    """Definition cards first ("What is X?"), then keyphrase cloze cards."""
+    rng = random.Random(seed)
+    sentences = split_sentences(text)
+    if not sentences:
+        return []
+    previous = {p.strip().lower() for p in previous_flashcards or []}
+    cards = [(f"What is {term}?", definition[0].upper() + definition[1:])
+             for term, definition, _ in find_definitions(sentences)]
+
+    pool = extract_keyphrases(sentences)
+    order = sentences[:]
+    rng.shuffle(order)
+    for sentence in order:
+        phrase = _phrase_in(sentence, pool)
+        if phrase:
+            blanked = re.sub(r"\b" + re.escape(phrase) + r"\b", "_____", sentence, count=1, flags=re.IGNORECASE)
+            cards.append((f"Complete: {blanked}", phrase))
+
+    flashcards, seen = [], set()
+    for front, back in cards:
+        if len(flashcards) >= num_flashcards:
+            break
+        if front.lower() in previous or front in seen:
+            continue
+        seen.add(front)
+        flashcards.append({"id": len(flashcards) + 1, "front": front, "back": back})
+    return flashcards
+
+
+def use_rules(mode: str = None) -> bool:
+    """True when a request (or the GENERATION_MODE default) asks for rule-based generation."""
+    return (mode or settings.GENERATION_MODE) == "rules"
@@ -0,0 +1,186 @@
+"""
+Scheduler Service
+Weighted fair queue in front of the expensive endpoints (generation, chat,
+ingestion). Each worker runs at most SCHEDULER_CONCURRENCY of them at once
+and any one user at most USER_CONCURRENCY; requests beyond that wait in a
+per-user queue. Free slots go to the waiting request with the smallest
+virtual finish time (cost / weight added to the user's own clock), so a user
+sending many or large requests only delays their own later work.
+
+A user whose queue is full, or whose request waited longer than
+QUEUE_MAX_WAIT_SECONDS, is told to come back later (429 + Retry-After)
+instead of piling more latency onto everyone's queue.
+"""
+import math
+import time
+import asyncio
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
+from config import settings
+from Services.metrics_service import Counter, Histogram, current_endpoint, register_collector
+
+# Anonymous callers share capacity by client address at half the weight of signed-in users
+ANONYMOUS_WEIGHT = 0.5
+# Largest cost one request is charged (e.g. num_questions)
+MAX_COST = 50
+
+queue_wait_seconds = Histogram(
+    "flashquiz_queue_wait_seconds", "Time requests waited in the fair queue", ("endpoint",))
+queue_rejections = Counter(
+    "flashquiz_queue_rejections_total", "Requests refused by the fair queue", ("endpoint", "reason"))
+
+
+class _Entry:
+    __slots__ = ("start", "finish", "seq", "future")
+
+    def __init__(self, start: float, finish: float, seq: int, future: asyncio.Future):
+        self.start = start
+        self.finish = finish
+        self.seq = seq
+        self.future = future
+
+
+class FairScheduler:
+    def __init__(self, capacity: int, per_user: int, queue_limit: int, max_wait: float):
+        self.capacity = capacity
+        self.per_user = per_user
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self.running = 0
+        self._active = {}     # user -> requests running
+        self._waiting = {}    # user -> deque of _Entry (FIFO per user)
+        self._finish = {}     # user -> virtual finish time of their last request
+        self._vtime = 0.0
+        self._seq = itertools.count()
+        # Moving average of how long a slot is held, used for Retry-After
+        self._hold_seconds = 1.0
+
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._waiting.values())
+
+    def retry_after(self, user) -> int:
+        """Seconds until the user's queue has likely drained by one request."""
+        ahead = self._active.get(user, 0) + len(self._waiting.get(user, ()))
+        return max(1, math.ceil(self._hold_seconds * ahead / max(self.per_user, 1)))
+
+    async def acquire(self, user, cost: float = 1.0, weight: float = 1.0) -> float:
+        """
+        Wait for a slot; returns the seconds spent waiting.
+        Raises HTTPException 429 when the user's queue is full or the wait times out.
+        """
+        queue = self._waiting.setdefault(user, deque())
+        if len(queue) >= self.queue_limit:
+            raise self._reject(user, "user_limit")
+
+        start = max(self._vtime, self._finish.get(user, 0.0))
+        entry = _Entry(start, start + min(cost, MAX_COST) / weight, next(self._seq),
+                       asyncio.get_running_loop().create_future())
+        self._finish[user] = entry.finish
+        queue.append(entry)
+        began = time.perf_counter()
+        self._dispatch()
+
+        try:
+            if not entry.future.done():
+                await asyncio.wait({entry.future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # Client went away: give back a slot granted in the meantime, or leave the queue
+            if entry.future.done():
+                self.release(user)
+            else:
+                self._abandon(user, entry)
+            raise
+        if not entry.future.done():
+            self._abandon(user, entry)
+            raise self._reject(user, "timeout")
+        return time.perf_counter() - began
+
+    def release(self, user, held: float = None) -> None:
+        self.running -= 1
+        self._active[user] -= 1
+        if held is not None:
+            self._hold_seconds += 0.2 * (held - self._hold_seconds)
+        self._forget(user)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.running < self.capacity:
+            best = None
+            for user, queue in self._waiting.items():
+                if queue and self._active.get(user, 0) < self.per_user:
+                    head = queue[0]
+                    if best is None or (head.finish, head.seq) < (best[1].finish, best[1].seq):
+                        best = (user, head)
+            if best is None:
+                return
+            user, entry = best
+            self._waiting[user].popleft()
+            self._vtime = max(self._vtime, entry.start)
+            self.running += 1
+            self._active[user] = self._active.get(user, 0) + 1
+            entry.future.set_result(None)
+
+    def _abandon(self, user, entry: _Entry) -> None:
+        """Remove an entry that was never granted and take back its virtual time."""
+        queue = self._waiting.get(user)
+        if queue is not None and entry in queue:
+            # The user's clock and their later entries were advanced by this cost
+            cost = entry.finish - entry.start
+            position = queue.index(entry)
+            del queue[position]
+            for later in itertools.islice(queue, position, None):
+                later.start -= cost
+                later.finish -= cost
+            if user in self._finish:
+                self._finish[user] -= cost
+        self._forget(user)
+
+    def _forget(self, user) -> None:
+        # Idle users keep no state, so the maps stay as small as the active user set;
+        # a returning user starts again from the current virtual time
+        if not self._active.get(user) and not self._waiting.get(user):
+            self._active.pop(user, None)
+            self._waiting.pop(user, None)
+            self._finish.pop(user, None)
+
+    def _reject(self, user, reason: str) -> HTTPException:
+        queue_rejections.inc(endpoint=current_endpoint.get(), reason=reason)
+        self._forget(user)
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests in progress for this user, please retry shortly",
+            headers={"Retry-After": str(self.retry_after(user))},
+        )
+
+    @asynccontextmanager
+    async def slot(self, user, cost: float = 1.0, weight: float = 1.0):
+        """Hold a slot for the duration of the with-block, recording the queue wait."""
+        waited = await self.acquire(user, cost, weight)
+        queue_wait_seconds.observe(waited, endpoint=current_endpoint.get())
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(user, time.perf_counter() - began)
+
+
+scheduler = FairScheduler(
+    capacity=settings.SCHEDULER_CONCURRENCY,
+    per_user=settings.USER_CONCURRENCY,
+    queue_limit=settings.USER_QUEUE_LIMIT,
+    max_wait=settings.QUEUE_MAX_WAIT_SECONDS,
+)
+
+
+def _queue_metrics() -> list:
+    return [
+        "# TYPE flashquiz_queue_running gauge",
+        f"flashquiz_queue_running {scheduler.running}",
+        "# TYPE flashquiz_queue_waiting gauge",
+        f"flashquiz_queue_waiting {scheduler.waiting()}",
+    ]
+
+
+register_collector(_queue_metrics)
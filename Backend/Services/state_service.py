@@ -0,0 +1,182 @@
+"""
+State Service
+Pluggable shared state for data that must be visible to every uvicorn worker
+and replica: the document registry, document chunks, question pools and
+shared caches.
+
+    STATE_BACKEND=memory  one process only (default, no setup)
+    STATE_BACKEND=sql     table in Postgres (the app database) or any async
+                          SQLAlchemy URL given in STATE_DATABASE_URL
+
+Values are JSON-serialisable. Namespaces used by the app:
+    documents       doc_id -> registry entry; "active" -> most recent doc_id
+                    (entries keep per-page content hashes for incremental re-uploads)
+    document_access doc_id -> time of the last access (TTL eviction)
+    chunks          doc_id -> list of chunk texts (shared backends; hosts keep
+                    memory-mapped copies, see chunk_service)
+    fact_sheets     doc_id -> compact fact sheet per chunk (same numbering as chunks)
+    question_pool   doc_id -> ready-made questions and flashcards (imported question banks)
+    term_index      doc_id -> key terms + embeddings for distractors
+    topic_index     doc_id -> topic tags per chunk + inverted index tag word -> chunks
+    document_refs   "doc_id:holder" -> reference pinning a document against eviction
+    user_versions   email -> token changed on every user update/delete (auth cache invalidation)
+"""
+import os
+import json
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from Api.Models.state_entry import StateEntry
+from config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to an in-process lock only
+    fcntl = None
+
+
+class StateStore:
+    """Async key/value interface grouped by namespace."""
+
+    async def get(self, namespace: str, key: str, default=None):
+        raise NotImplementedError
+
+    async def set(self, namespace: str, key: str, value, ttl: float = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    async def keys(self, namespace: str) -> list:
+        raise NotImplementedError
+
+
+class InProcessStateStore(StateStore):
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    async def get(self, namespace, key, default=None):
+        with self._lock:
+            item = self._data.get((namespace, key))
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[(namespace, key)]
+                return default
+            return value
+
+    async def set(self, namespace, key, value, ttl=None):
+        with self._lock:
+            self._data[(namespace, key)] = (value, time.time() + ttl if ttl else None)
+
+    async def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    async def keys(self, namespace):
+        now = time.time()
+        with self._lock:
+            return [k for (ns, k), (_, exp) in self._data.items() if ns == namespace and (exp is None or exp > now)]
+
+
+class SQLStateStore(StateStore):
+    """Stores entries in the state_entries table; shared by every process using the same database."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._ready = False
+        self._ready_lock = asyncio.Lock()
+
+    async def _ensure_table(self):
+        if self._ready:
+            return
+        async with self._ready_lock:
+            if not self._ready:
+                async with self.engine.begin() as conn:
+                    await conn.run_sync(StateEntry.__table__.create, checkfirst=True)
+                self._ready = True
+
+    async def get(self, namespace, key, default=None):
+        await self._ensure_table()
+        query = select(StateEntry.value, StateEntry.expires_at).where(
+            StateEntry.namespace == namespace, StateEntry.key == key)
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(query)).first()
+        if row is None or (row.expires_at is not None and row.expires_at <= time.time()):
+            return default
+        return json.loads(row.value)
+
+    async def set(self, namespace, key, value, ttl=None):
+        await self._ensure_table()
+        values = {
+            "namespace": namespace,
+            "key": key,
+            "value": json.dumps(value),
+            "expires_at": time.time() + ttl if ttl else None,
+        }
+        if self.engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(StateEntry).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=["namespace", "key"],
+            set_={"value": statement.excluded.value, "expires_at": statement.excluded.expires_at},
+        )
+        async with self.engine.begin() as conn:
+            await conn.execute(statement)
+
+    async def delete(self, namespace, key):
+        await self._ensure_table()
+        async with self.engine.begin() as conn:
+            await conn.execute(delete(StateEntry).where(StateEntry.namespace == namespace, StateEntry.key == key))
+
+    async def keys(self, namespace):
+        await self._ensure_table()
+        query = select(StateEntry.key, StateEntry.expires_at).where(StateEntry.namespace == namespace)
+        now = time.time()
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(query)).all()
+        return [r.key for r in rows if r.expires_at is None or r.expires_at > now]
+
+
+def create_state_store() -> StateStore:
+    if settings.STATE_BACKEND == "sql":
+        if settings.STATE_DATABASE_URL:
+            return SQLStateStore(create_async_engine(settings.STATE_DATABASE_URL))
+        from database import engine
+        return SQLStateStore(engine)
+    return InProcessStateStore()
+
+
+state_store = create_state_store()
+
+
+# ============== CHROMA COORDINATION ==============
+
+_chroma_thread_lock = threading.Lock()
+
+
+@contextmanager
+def chroma_write_lock(persist_directory: str):
+    """
+    Serialise writes to a local persistent Chroma directory across threads and
+    worker processes on the same host. With CHROMA_HOST set, the Chroma server
+    does its own coordination and this is only a thread lock.
+    """
+    with _chroma_thread_lock:
+        if fcntl is None or settings.CHROMA_HOST:
+            yield
+            return
+        os.makedirs(persist_directory, exist_ok=True)
+        with open(os.path.join(persist_directory, ".write.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
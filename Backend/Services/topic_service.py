@@ -0,0 +1,142 @@
+"""
+Topic Service
+Keyphrase tags for every chunk, computed once at ingestion, and an inverted
+index from tag words to chunk numbers. Choosing chunks for a topic is then a
+few dict lookups, about the cost of random sampling.
+
+Topics that match no tag are expanded with the nearest key terms from the
+document's term index (one small matrix product). Without a term index, a
+vector search on the document's collection is used instead. Either way the
+result is cached per worker, so a topic pays for the fallback once. Cached
+indexes and topics are keyed by the document's chunks version, so a
+re-upload on any worker retires them everywhere.
+"""
+import asyncio
+import logging
+from Services.cache_service import TTLCache
+from Services.state_service import state_store
+from Services.chunk_service import registered_version
+from Services import rulebased_service as RuleBased
+from Services.distractor_service import load_term_index
+
+logger = logging.getLogger(__name__)
+
+TAGS_PER_CHUNK = 8
+# Topics that mean "anything": served by random sampling
+GENERAL_TOPICS = frozenset({"", "general", "any", "all", "random", "everything"})
+# Term-index terms used to expand a topic that matches no tag, and how close they must be
+EXPANSION_TERMS = 5
+MIN_TERM_SIMILARITY = 0.35
+# Chunks taken from the vector search fallback
+SEARCH_RESULTS = 8
+
+# (document_id, chunks version) -> topic index
+index_cache = TTLCache(maxsize=32, ttl=300)
+# (document_id, chunks version, normalised topic) -> ranked chunk numbers
+topic_cache = TTLCache(maxsize=1024, ttl=300)
+
+
+def _stem(word: str) -> str:
+    # Plural folding only: enough to match "enzymes" with "enzyme"
+    word = word.lower()
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def topic_words(text: str) -> list:
+    """Content words of a topic or tag, lower-cased and plural-folded."""
+    words = []
+    for token in RuleBased.WORD.findall(text):
+        if token.lower() not in RuleBased.STOPWORDS and len(token) >= 3:
+            word = _stem(token)
+            if word not in words:
+                words.append(word)
+    return words
+
+
+def tag_chunks(chunks: list) -> list:
+    """Top keyphrases of each chunk."""
+    return [
+        RuleBased.extract_keyphrases(RuleBased.split_sentences(chunk) or [chunk], top_k=TAGS_PER_CHUNK)
+        for chunk in chunks
+    ]
+
+
+def build_topic_index(tags: list) -> dict:
+    """Inverted index: tag word -> numbers of the chunks tagged with it."""
+    words = {}
+    for number, chunk_tags in enumerate(tags):
+        for word in topic_words(" ".join(chunk_tags)):
+            words.setdefault(word, []).append(number)
+    return {"tags": tags, "words": words}
+
+
+def rank_chunks(index: dict, words: list) -> list:
+    """Chunk numbers tagged with any of the words, most matching words first."""
+    scores = {}
+    for word in words:
+        for number in index["words"].get(word, ()):
+            scores[number] = scores.get(number, 0) + 1
+    return sorted(scores, key=lambda n: (-scores[n], n))
+
+
+async def save_topic_index(document_id: str, index: dict) -> None:
+    await state_store.set("topic_index", document_id, index)
+
+
+async def load_topic_index(document_id: str, version: str = None) -> dict | None:
+    key = (document_id, version or await registered_version(document_id))
+    index = index_cache.get(key)
+    if index is None:
+        index = await state_store.get("topic_index", document_id)
+        if index is not None:
+            index_cache.set(key, index)
+    return index
+
+
+def _expand_with_terms(term_index, topic: str) -> list:
+    """Content words of the term-index terms nearest to the topic (embeds the topic once)."""
+    scores = term_index.vectors_for([topic])[0] @ term_index.matrix.T
+    nearest = scores.argsort()[::-1][:EXPANSION_TERMS]
+    terms = [term_index.terms[i] for i in nearest if scores[i] >= MIN_TERM_SIMILARITY]
+    return topic_words(" ".join(terms))
+
+
+async def find_topic_chunks(topic: str, document_id: str, chunks: list, search=None) -> list:
+    """
+    Numbers of the document's chunks about the topic, best first; empty for a
+    general topic or when nothing relates to it. search(query, k) -> chunk
+    numbers is the vector search used when the document has no term index.
+    """
+    topic = " ".join((topic or "").lower().split())
+    if topic in GENERAL_TOPICS:
+        return []
+    version = getattr(chunks, "version", None) or await registered_version(document_id)
+    key = (document_id, version, topic)
+    ranked = topic_cache.get(key)
+    if ranked is not None:
+        return ranked
+
+    index = await load_topic_index(document_id, version)
+    ranked = rank_chunks(index, topic_words(topic)) if index else []
+    if not ranked:
+        ranked = await _fallback(topic, document_id, index, search, version)
+    ranked = [n for n in ranked if n < len(chunks)]
+    topic_cache.set(key, ranked)
+    return ranked
+
+
+async def _fallback(topic: str, document_id: str, index: dict | None, search, version: str = None) -> list:
+    term_index = await load_term_index(document_id, version)
+    try:
+        if term_index is not None and index is not None:
+            words = await asyncio.to_thread(_expand_with_terms, term_index, topic)
+            return rank_chunks(index, words)
+        if search is not None:
+            return await asyncio.to_thread(search, topic, SEARCH_RESULTS)
+    except Exception:
+        logger.exception("Topic fallback failed for %r", topic)
+    return []
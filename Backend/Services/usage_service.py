@@ -0,0 +1,194 @@
+"""
+Usage Service
+Per-user LLM token accounting and daily budgets. Every model call adds its
+prompt/completion tokens to an in-memory aggregate keyed by (user, day,
+endpoint, document); a background loop flushes the aggregate to the
+token_usage table in one upsert batch, so the request path never writes to
+the database.
+
+Budgets are checked before a request reaches the LLM, against the persisted
+total for the day plus this worker's unflushed usage. A request that starts
+under budget is allowed to finish, so a user can overshoot by one request.
+While budgets are on, LLM calls need a signed-in user to charge them to.
+"""
+import asyncio
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.future import select
+from config import settings
+from database import engine
+from Api.Models.token_usage import TokenUsage
+from Services.cache_service import TTLCache
+from Services.metrics_service import current_endpoint, current_user_id, current_document_id, register_usage_listener
+
+logger = logging.getLogger(__name__)
+
+ANONYMOUS_USER = 0
+
+# (user_id, day, endpoint, document_id) -> [prompt_tokens, completion_tokens, calls]
+_pending = {}
+_lock = threading.Lock()
+# user_id -> tokens persisted for today, refreshed at most once per flush interval
+_persisted = TTLCache(maxsize=10000, ttl=settings.USAGE_FLUSH_INTERVAL_SECONDS)
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def record_usage(prompt_tokens: int, completion_tokens: int) -> None:
+    """Add one LLM call to the aggregate (registered as a metrics usage listener)."""
+    key = (
+        current_user_id.get() or ANONYMOUS_USER,
+        _today(),
+        current_endpoint.get()[:200],
+        (current_document_id.get() or "")[:200],
+    )
+    with _lock:
+        totals = _pending.get(key)
+        if totals is None:
+            totals = _pending[key] = [0, 0, 0]
+        totals[0] += prompt_tokens
+        totals[1] += completion_tokens
+        totals[2] += 1
+
+
+register_usage_listener(record_usage)
+
+
+def _pending_tokens(user_id: int, day: date) -> int:
+    with _lock:
+        return sum(t[0] + t[1] for (user, d, _, _), t in _pending.items() if user == user_id and d == day)
+
+
+async def flush() -> int:
+    """Write the pending aggregate to the database; returns the number of rows upserted."""
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"user_id": user, "day": day, "endpoint": endpoint, "document_id": document,
+         "prompt_tokens": t[0], "completion_tokens": t[1], "calls": t[2], "updated_at": now}
+        for (user, day, endpoint, document), t in batch.items()
+    ]
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(TokenUsage).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=["user_id", "day", "endpoint", "document_id"],
+        set_={
+            "prompt_tokens": TokenUsage.prompt_tokens + statement.excluded.prompt_tokens,
+            "completion_tokens": TokenUsage.completion_tokens + statement.excluded.completion_tokens,
+            "calls": TokenUsage.calls + statement.excluded.calls,
+            "updated_at": statement.excluded.updated_at,
+        },
+    )
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(statement)
+    except Exception:
+        # Put the batch back so the next flush retries it
+        with _lock:
+            for key, t in batch.items():
+                totals = _pending.setdefault(key, [0, 0, 0])
+                for i in range(3):
+                    totals[i] += t[i]
+        raise
+
+    # Keep cached daily totals in step with what was just persisted
+    today = _today()
+    for (user, day, _, _), t in batch.items():
+        cached = _persisted.get(user) if day == today else None
+        if cached is not None:
+            _persisted.set(user, cached + t[0] + t[1])
+    return len(rows)
+
+
+async def run_flusher(interval: float = None) -> None:
+    """Background loop started from the app lifespan."""
+    interval = interval or settings.USAGE_FLUSH_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush()
+        except Exception:
+            logger.exception("Token usage flush failed")
+
+
+async def tokens_used_today(user_id: int) -> int:
+    """Tokens the user has used today: persisted total plus this worker's unflushed usage."""
+    day = _today()
+    persisted = _persisted.get(user_id)
+    if persisted is None:
+        query = select(func.coalesce(func.sum(TokenUsage.prompt_tokens + TokenUsage.completion_tokens), 0)).where(
+            TokenUsage.user_id == user_id, TokenUsage.day == day)
+        async with engine.connect() as conn:
+            persisted = int((await conn.execute(query)).scalar())
+        _persisted.set(user_id, persisted)
+    return persisted + _pending_tokens(user_id, day)
+
+
+async def check_budget(user_id: int | None) -> None:
+    """
+    Raise 429 when the user's daily token budget (USER_DAILY_TOKEN_BUDGET,
+    0 = unlimited) is spent, and 401 for anonymous callers while budgets are on.
+    """
+    budget = settings.USER_DAILY_TOKEN_BUDGET
+    if not budget:
+        return
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Sign in to use LLM generation, or use mode=rules",
+        )
+    if await tokens_used_today(user_id) < budget:
+        return
+    now = datetime.now(timezone.utc)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Daily token budget used up; it resets at 00:00 UTC",
+        headers={"Retry-After": str(int((midnight - now).total_seconds()) + 1)},
+    )
+
+
+async def get_usage(user_id: int) -> dict:
+    """Today's token usage for a user, per endpoint, with the remaining budget."""
+    day = _today()
+    query = select(
+        TokenUsage.endpoint,
+        func.sum(TokenUsage.prompt_tokens),
+        func.sum(TokenUsage.completion_tokens),
+        func.sum(TokenUsage.calls),
+    ).where(TokenUsage.user_id == user_id, TokenUsage.day == day).group_by(TokenUsage.endpoint)
+    async with engine.connect() as conn:
+        rows = (await conn.execute(query)).all()
+
+    endpoints = {row[0]: {"prompt_tokens": int(row[1]), "completion_tokens": int(row[2]), "calls": int(row[3])}
+                 for row in rows}
+    with _lock:
+        for (user, d, endpoint, _), t in _pending.items():
+            if user == user_id and d == day:
+                totals = endpoints.setdefault(endpoint, {"prompt_tokens": 0, "completion_tokens": 0, "calls": 0})
+                totals["prompt_tokens"] += t[0]
+                totals["completion_tokens"] += t[1]
+                totals["calls"] += t[2]
+
+    used = sum(e["prompt_tokens"] + e["completion_tokens"] for e in endpoints.values())
+    budget = settings.USER_DAILY_TOKEN_BUDGET
+    return {
+        "day": day.isoformat(),
+        "used_tokens": used,
+        "budget": budget or None,
+        "remaining": max(budget - used, 0) if budget else None,
+        "endpoints": endpoints,
+    }
@@ -5,7 +5,7 @@ from Api.Models.reg_user import user
 
 
 async def create_user(request:CreateUser,db:AsyncSession) ->ReturnedUser:
-    hasehd_password = AuthService.hash_password(request.password)
+    hasehd_password = await AuthService.hash_password_async(request.password)
     new_user = user(
         name=request.name,
         email = request.email,
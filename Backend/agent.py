@@ -1,9 +1,8 @@
 from autogen_agentchat.agents import AssistantAgent
 from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_agentchat.messages import TextMessage
 from autogen_core.models import ModelInfo
 from pydantic import BaseModel
-import asyncio
+from Services.llm_dispatch_service import register_client, HedgedChatCompletionClient
 from dotenv import load_dotenv
 import os
 load_dotenv()
@@ -11,79 +10,30 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 MODEL = os.getenv('MODEL')
 
-model_client = OpenAIChatCompletionClient(
+# Calls are hedged to the RAG client when this one is slow or failing (see llm_dispatch_service)
+register_client("agent", OpenAIChatCompletionClient(
     model = MODEL,
     model_info=ModelInfo(vision=True, function_calling=True, json_output=True, family="unknown", structured_output=True),
     api_key=GEMINI_API_KEY,
-)
+))
+model_client = HedgedChatCompletionClient("agent")
 
-Assistant = AssistantAgent(name='Assistant',description='A helpful Assistant',model_client=model_client,system_message='Generate quiz questions in this EXACT format using | as delimiter: ANSWER|QUESTION|OPTION_A|OPTION_B|OPTION_C|OPTION_D. Rules: 1) ANSWER is single letter A/B/C/D indicating correct option. 2) QUESTION is the quiz question (max 50 chars). 3) Each OPTION is max 50 chars. 4) Use | to separate ALL fields. 5) One question per line. 6) Output ONLY data lines, no headers or explanations. Example: A|What is the capital of France?|Paris|London|Berlin|Madrid')
+QUIZ_SYSTEM_MESSAGE = 'Generate quiz questions in this EXACT format using | as delimiter: ANSWER|QUESTION|OPTION_A|OPTION_B|OPTION_C|OPTION_D. Rules: 1) ANSWER is single letter A/B/C/D indicating correct option. 2) QUESTION is the quiz question (max 50 chars). 3) Each OPTION is max 50 chars. 4) Use | to separate ALL fields. 5) One question per line. 6) Output ONLY data lines, no headers or explanations. Example: A|What is the capital of France?|Paris|London|Berlin|Madrid'
+QA_SYSTEM_MESSAGE = 'Generate quiz questions in this EXACT format using | as delimiter: ANSWER|QUESTION. Rules: 1) ANSWER is the correct answer: a short term or phrase from the text (max 5 words). 2) QUESTION is the quiz question (max 80 chars). 3) Do NOT write answer options; they are added automatically. 4) One question per line. 5) Output ONLY data lines, no headers or explanations. Example: Paris|What is the capital of France?'
+FLASHCARD_SYSTEM_MESSAGE = 'Generate flashcards in this EXACT format using | as delimiter: FRONT|BACK. Rules: 1) FRONT is the question or term (the front of the flashcard). 2) BACK is the answer or definition (the back of the flashcard). 3) Use | to separate the two fields. 4) One flashcard per line. 5) Output ONLY data lines, no headers or explanations. Example: What is photosynthesis?|The process by which plants convert sunlight into energy'
+RAG_SYSTEM_MESSAGE = "You are a knowledgeable assistant that provides accurate answers based on the given context. Use the context to answer questions factually and concisely. If the answer is not in the context, respond with 'I don't know.'"
 
-flashcard_Agent = AssistantAgent(name='FlashcardAgent',description='A helpful Flashcard Generator',model_client=model_client,system_message='Generate flashcards in this EXACT format using | as delimiter: FRONT|BACK. Rules: 1) FRONT is the question or term (the front of the flashcard). 2) BACK is the answer or definition (the back of the flashcard). 3) Use | to separate the two fields. 4) One flashcard per line. 5) Output ONLY data lines, no headers or explanations. Example: What is photosynthesis?|The process by which plants convert sunlight into energy')
+# AssistantAgent keeps the conversation in memory, so concurrent requests must not share one.
+# The factories build a fresh, stateless agent per request (cheap: no network or model load).
+def build_quiz_agent():
+    return AssistantAgent(name='Assistant',description='A helpful Assistant',model_client=model_client,system_message=QUIZ_SYSTEM_MESSAGE)
 
+# Question + answer only; options come from the document's distractor index
+def build_qa_agent():
+    return AssistantAgent(name='QAAssistant',description='A helpful Question Writer',model_client=model_client,system_message=QA_SYSTEM_MESSAGE)
 
-Rag_assistant = AssistantAgent(name="RagAssistant",description="An assistant that uses Retrieval-Augmented Generation (RAG) to answer questions based on provided context.",model_client=model_client,system_message="You are a knowledgeable assistant that provides accurate answers based on the given context. Use the context to answer questions factually and concisely. If the answer is not in the context, respond with 'I don't know.'")
-def parse_quiz_line(line):
-    # Format: ANSWER|QUESTION|OPTION_A|OPTION_B|OPTION_C|OPTION_D
-    parts = line.split('|')
-    if len(parts) < 6:
-        print(f"Invalid line format: {line}")
-        return
-    
-    correct_answer = parts[0].strip().upper()
-    question       = parts[1].strip()
-    option_1       = parts[2].strip()
-    option_2       = parts[3].strip()
-    option_3       = parts[4].strip()
-    option_4       = parts[5].strip()
-
-    print(f"Correct: {correct_answer}")
-    print(f"Question: {question}")
-    print(f"Option A: {option_1}")
-    print(f"Option B: {option_2}")
-    print(f"Option C: {option_3}")
-    print(f"Option D: {option_4}")
-
-
-def get_flashcard_line(line):
-    # Format: FRONT|BACK
-    parts = line.split('|')
-    if len(parts) < 2:
-        print(f"Invalid flashcard format: {line}")
-        return
-    
-    question = parts[0].strip()
-    answer   = parts[1].strip()
-
-    print(f"Flashcard Question: {question}")
-    print(f"Flashcard Answer: {answer}")
-async def get_response(query:str):
-    response = await Assistant.run(task=[TextMessage(content=query,source='user')])
-    structured_output = response.messages[-1].content
-    parse_quiz_line(structured_output)
-    return structured_output
-
-async def get_flashcards(query:str):
-    response = await flashcard_Agent.run(task=[TextMessage(content=query,source='user')])
-    return response.messages[-1].content
-
-# Only run test when executing this file directly, not when importing
-if __name__ == "__main__":
-    asyncio.run(get_response("""
-                             Retrieval-Augmented Generation (RAG)
-                    Retrieval-Augmented Generation (RAG) is an advanced framework in natural language
-                    processing (NLP) that enhances large language models (LLMs) by integrating external
-                    knowledge retrieval into the text generation process. Traditional language models rely
-                    solely on the knowledge embedded in their parameters during training, which can become
-                    outdated, incomplete, or inaccurate. RAG addresses this limitation by dynamically
-                    retrieving relevant information from external data sources and using it to generate more
-                    accurate, grounded, and context-aware responses.
-                    The concept of RAG was formally introduced by researchers at Facebook AI (now Meta AI)
-                    in 2020. In their foundational paper, Lewis et al. proposed combining a neural retriever
-                    with a neural generator, allowing models to access large corpora such as Wikipedia at
-                    inference time rather than memorizing all knowledge during training [1]. This hybrid
-                    approach significantly improves factual accuracy and interpretability while reducing
-                    hallucinations—responses that sound plausible but are factually incorrect
-                             """))
-
+def build_flashcard_agent():
+    return AssistantAgent(name='FlashcardAgent',description='A helpful Flashcard Generator',model_client=model_client,system_message=FLASHCARD_SYSTEM_MESSAGE)
 
+def build_rag_agent():
+    return AssistantAgent(name="RagAssistant",description="An assistant that uses Retrieval-Augmented Generation (RAG) to answer questions based on provided context.",model_client=model_client,system_message=RAG_SYSTEM_MESSAGE)
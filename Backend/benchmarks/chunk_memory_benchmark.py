@@ -0,0 +1,94 @@
+"""
+Chunk Storage Memory Benchmark
+Compares holding each document's chunks as a list of str (loaded from the
+JSON state, as workers did before chunk_service) with the memory-mapped
+ChunkStore: Python heap per document, file bytes (page cache, shared by every
+worker on the host) and the cost of sampling random chunks and of reading
+the chunks a retrieval returns.
+
+Needs no models or database:
+    python -m benchmarks.chunk_memory_benchmark --documents 20 --pages 200
+"""
+import sys
+import os
+import gc
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_pdf import make_pages
+from Services import chunk_service
+
+
+def make_chunks(pages: int, seed: int, size: int = 500) -> list:
+    text = "\n".join(make_pages(pages, seed=seed))
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+def heap_bytes(load) -> tuple:
+    """Python heap held by the loaded objects (tracemalloc), and the objects."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    loaded = load()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, loaded
+
+
+def time_sampling(documents: list, rounds: int, k: int) -> float:
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for i in range(rounds):
+        chunks = documents[i % len(documents)]
+        "\n\n---\n\n".join(chunks[n] for n in rng.sample(range(len(chunks)), min(k, len(chunks))))
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main(args) -> None:
+    documents = [make_chunks(args.pages, seed) for seed in range(args.documents)]
+    total_chunks = sum(len(chunks) for chunks in documents)
+    text_bytes = sum(len(text.encode("utf-8")) for chunks in documents for text in chunks)
+    serialized = [json.dumps(chunks) for chunks in documents]
+    print(f"{args.documents} documents, {total_chunks} chunks, {text_bytes / 1e6:.1f} MB of text")
+
+    chunk_service.STORE_DIRECTORY = tempfile.mkdtemp(prefix="chunk-store-")
+    try:
+        for i, chunks in enumerate(documents):
+            chunk_service.write_chunks(f"doc{i}", chunks)
+        del documents
+
+        list_heap, lists = heap_bytes(lambda: [json.loads(data) for data in serialized])
+        store_heap, stores = heap_bytes(
+            lambda: [chunk_service.open_chunks(f"doc{i}") for i in range(args.documents)])
+        mapped = sum(store.nbytes for store in stores)
+
+        print(f"{'':<12} {'heap/doc':>10} {'mapped/doc':>11} {'sample us':>10} {'read-all ms':>12}")
+        for name, loaded, heap, files in (("list", lists, list_heap, 0), ("chunk store", stores, store_heap, mapped)):
+            sample_us = time_sampling(loaded, args.rounds, args.k)
+            start = time.perf_counter()
+            for chunks in loaded:
+                for text in chunks:
+                    pass
+            read_ms = (time.perf_counter() - start) * 1000
+            print(f"{name:<12} {heap / args.documents / 1e3:>8.1f}kB {files / args.documents / 1e3:>9.1f}kB "
+                  f"{sample_us:>10.1f} {read_ms:>12.1f}")
+    finally:
+        del stores
+        gc.collect()
+        shutil.rmtree(chunk_service.STORE_DIRECTORY, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory of chunk lists vs memory-mapped chunk stores")
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=200, help="Synthetic pages per document")
+    parser.add_argument("--rounds", type=int, default=20000, help="Sampling calls timed")
+    parser.add_argument("--k", type=int, default=5, help="Chunks per sample")
+    main(parser.parse_args())
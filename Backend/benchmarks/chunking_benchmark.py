@@ -0,0 +1,89 @@
+"""
+Chunking Strategy Benchmark
+Ingests one synthetic PDF with each chunking strategy (see ingest_service)
+and reports ingestion throughput, the number of vectors stored, and the
+retrieval hit rate of retrieve_documents on labelled queries.
+
+Each synthetic page covers one topic, and every query asks about one of that
+topic's terms. A query is a hit when the top retrieved chunk mentions both
+the term and its topic. Context size is the average number of characters
+retrieved, which is what a prompt pays for.
+
+Run from the Backend directory (loads the embedding model, writes to the
+local Chroma directory and removes its collections afterwards):
+    python -m benchmarks.chunking_benchmark --pages 40
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_pdf import make_pdf, TOPICS
+from Services.ingest_service import STRATEGIES, load_and_split
+from Services.rag_service import _embed_batched, _register_document, retrieve_documents
+from Services.collection_service import get_collection, evict_document
+
+QUERY = "What role does {term} play?"
+
+
+async def ingest(path: str, document_id: str, strategy: str, size: int, overlap: int) -> dict:
+    start = time.perf_counter()
+    parts = load_and_split(path, strategy, size, overlap)
+    split = time.perf_counter()
+    vectors = _embed_batched(parts["texts"])
+    embedded = time.perf_counter()
+    await _register_document(document_id, os.path.basename(path), None, parts, vectors, make_active=False)
+    return {
+        "pages": parts["pages"],
+        "vectors": get_collection(document_id).count(),
+        "split_s": split - start,
+        "embed_s": embedded - split,
+        "total_s": time.perf_counter() - start,
+    }
+
+
+async def hit_rate(document_id: str) -> tuple:
+    hits = queries = chars = 0
+    for topic, terms in TOPICS.items():
+        for term in terms:
+            context = await retrieve_documents(QUERY.format(term=term), document_id, k=1)
+            queries += 1
+            chars += len(context)
+            lowered = context.lower()
+            hits += term.lower() in lowered and topic in lowered
+    return hits / queries, chars / queries
+
+
+async def main(args) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "chunking.pdf")
+    with open(path, "wb") as f:
+        f.write(make_pdf(args.pages))
+
+    print(f"{'strategy':<10} {'size':>5} {'vectors':>8} {'pages/s':>8} {'split':>8} {'embed':>8} "
+          f"{'hit@1':>6} {'context':>8}")
+    for strategy in args.strategies:
+        size = args.token_size if strategy == "token" else args.chunk_size
+        overlap = args.token_overlap if strategy == "token" else args.chunk_overlap
+        document_id = f"chunking-benchmark-{strategy}"
+        try:
+            stats = await ingest(path, document_id, strategy, size, overlap)
+            hits, context = await hit_rate(document_id)
+        finally:
+            await evict_document(document_id)
+        print(f"{strategy:<10} {size:>5} {stats['vectors']:>8} {stats['pages'] / stats['total_s']:>8.1f} "
+              f"{stats['split_s'] * 1000:>6.0f}ms {stats['embed_s'] * 1000:>6.0f}ms {hits:>6.0%} {context:>7.0f}c")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding cost vs retrieval quality per chunking strategy")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--strategies", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument("--chunk-size", type=int, default=500, help="Characters (fixed, page, sentence)")
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--token-size", type=int, default=128, help="Tokens (token strategy)")
+    parser.add_argument("--token-overlap", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
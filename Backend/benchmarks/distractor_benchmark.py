@@ -0,0 +1,108 @@
+"""
+Distractor Engine Benchmark
+Compares quiz generation with the LLM writing all four options against the
+LLM writing only question + answer while the term index supplies
+distractors. Reports output tokens and latency per question for the RAG and
+agent generators, plus the cost of building and querying the term index.
+
+The fake LLM models decode time as a fixed latency plus --token-latency
+seconds per output token, so the latency gap follows the token gap. Real
+savings depend on how long the model's options would have been.
+
+Run from the Backend directory (loads the embedding model):
+    python -m benchmarks.distractor_benchmark --questions 5 --rounds 10
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+import statistics
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_llm import install_fake_llm
+from benchmarks.synthetic_pdf import make_pages
+from config import settings
+from Services.state_service import state_store
+from Services.chunk_service import save_chunks
+from Services.rag_service import embeddings, generate_quiz_from_rag
+from Services.agent_service import generate_quiz_with_agent
+from Services.distractor_service import build_term_index, save_term_index
+
+DOCUMENT_ID = "distractor-benchmark"
+
+
+async def setup_document(pages: int):
+    chunks = make_pages(pages)
+    start = time.perf_counter()
+    index = build_term_index(chunks, embeddings.embed_documents)
+    print(f"term index: {len(index)} terms x {index.matrix.shape[1]} dims, "
+          f"built in {time.perf_counter() - start:.2f}s, {index.matrix.nbytes / 1024:.0f} KiB")
+    await save_chunks(DOCUMENT_ID, chunks)
+    await state_store.set("documents", "active", DOCUMENT_ID)
+    await save_term_index(DOCUMENT_ID, index)
+    return index
+
+
+def lookup_cost(index, batch: int, rounds: int = 200) -> None:
+    answers = index.terms[:batch]
+    index.nearest(answers)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        index.nearest(answers)
+    per_call = (time.perf_counter() - start) / rounds * 1000
+    print(f"distractor lookup: {per_call:.3f} ms per batch of {batch} indexed answers")
+
+
+async def measure(name: str, generate, fake, rounds: int) -> dict:
+    tokens_before, latencies, produced = fake.total_usage().completion_tokens, [], 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        produced += await generate()
+        latencies.append(time.perf_counter() - start)
+    tokens = fake.total_usage().completion_tokens - tokens_before
+    return {
+        "name": name,
+        "tokens_per_question": tokens / max(produced, 1),
+        "ms_per_request": statistics.mean(latencies) * 1000,
+        "questions": produced,
+    }
+
+
+async def main(args) -> None:
+    fake = install_fake_llm(latency=args.llm_latency, jitter=0, token_latency=args.token_latency)
+    index = await setup_document(args.pages)
+    lookup_cost(index, args.questions)
+    context = "\n\n".join(make_pages(2))
+
+    async def rag():
+        data = await generate_quiz_from_rag("general", args.questions, question_type="mcq",
+                                            document_id=DOCUMENT_ID)
+        return len(data["quiz"])
+
+    async def agent():
+        return len((await generate_quiz_with_agent(context, args.questions, document_id=DOCUMENT_ID))["quiz"])
+
+    for label, generate in (("rag", rag), ("agent", agent)):
+        results = []
+        for engine in (False, True):
+            settings.DISTRACTOR_ENGINE = engine
+            mode = "distractor engine" if engine else "llm options"
+            results.append(await measure(f"{label} / {mode}", generate, fake, args.rounds))
+        for r in results:
+            print(f"{r['name']:<28} {r['tokens_per_question']:6.1f} output tokens/question | "
+                  f"{r['ms_per_request']:8.1f} ms/request | {r['questions']} questions")
+        full, short = results
+        print(f"{label:<28} saves {1 - short['tokens_per_question'] / full['tokens_per_question']:.0%} output tokens, "
+              f"{1 - short['ms_per_request'] / full['ms_per_request']:.0%} latency")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distractor engine token and latency savings")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=5, help="Questions per request")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Fixed seconds per LLM call")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Seconds per output token")
+    asyncio.run(main(parser.parse_args()))
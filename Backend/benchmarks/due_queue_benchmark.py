@@ -0,0 +1,129 @@
+"""
+Due-Queue Benchmark
+Fills the flashcards table with --cards cards for one user (plus cards for
+other users), then times get_due_cards, the query behind GET
+/flashcards/due, and prints its query plan to confirm the (user_id, due_at)
+index is used. On SQLite the bare index lookup is also timed with the sync
+driver, separating query cost from async driver and session overhead.
+
+Defaults to a temporary SQLite file. With --database-url (e.g. Postgres) the
+users and flashcards tables are dropped and recreated, so point it at a
+scratch database and pass --reset to confirm:
+    python -m benchmarks.due_queue_benchmark --cards 100000
+    python -m benchmarks.due_queue_benchmark --database-url postgresql+asyncpg://.../scratch --reset
+"""
+import sys
+import os
+import time
+import random
+import asyncio
+import argparse
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta, timezone
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlmodel import SQLModel
+from Api.Models.reg_user import user as User
+from Api.Models.flashcard import Flashcard
+from Services.flashcard_service import get_due_cards
+from benchmarks.stats import percentile
+
+BATCH = 5000
+
+
+async def populate(engine, cards: int, other_users: int) -> None:
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all, tables=[Flashcard.__table__, User.__table__])
+        await conn.run_sync(SQLModel.metadata.create_all, tables=[User.__table__, Flashcard.__table__])
+        await conn.execute(insert(User.__table__), [
+            {"id": i, "name": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"}
+            for i in range(1, other_users + 2)
+        ])
+        for user_id in range(1, other_users + 2):
+            count = cards if user_id == 1 else cards // 2
+            for start in range(0, count, BATCH):
+                # Due times spread over +/- 60 days: roughly half the deck is due
+                await conn.execute(insert(Flashcard.__table__), [
+                    {"user_id": user_id, "front": f"Front {i}", "back": f"Back {i}",
+                     "ease_factor": 2.5, "interval_days": 1.0, "repetitions": 0, "lapses": 0,
+                     "due_at": now + timedelta(minutes=rng.randint(-86400, 86400)), "created_at": now}
+                    for i in range(start, min(start + BATCH, count))
+                ])
+
+
+async def show_plan(engine) -> None:
+    now = datetime.now(timezone.utc)
+    prefix = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    query = text(f"{prefix} SELECT * FROM flashcards WHERE user_id = :user AND due_at <= :now "
+                 "ORDER BY due_at LIMIT 20")
+    async with engine.connect() as conn:
+        rows = (await conn.execute(query, {"user": 1, "now": now})).all()
+    print("query plan:")
+    for row in rows:
+        print("   ", " | ".join(str(v) for v in row))
+
+
+def print_latency(name: str, samples: list) -> None:
+    print(f"{name:<32} p50 {percentile(samples, 50) * 1000:.3f} ms | "
+          f"p95 {percentile(samples, 95) * 1000:.3f} ms | "
+          f"p99 {percentile(samples, 99) * 1000:.3f} ms")
+
+
+def time_raw_sqlite(path: str, limit: int, rounds: int) -> list:
+    conn = sqlite3.connect(path)
+    now = datetime.now(timezone.utc).isoformat(" ")
+    query = ("SELECT id, front, back, document_id, due_at, interval_days, repetitions, ease_factor "
+             "FROM flashcards WHERE user_id = ? AND due_at <= ? ORDER BY due_at LIMIT ?")
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        conn.execute(query, (1, now, limit)).fetchall()
+        samples.append(time.perf_counter() - start)
+    conn.close()
+    return samples
+
+
+async def main(args) -> None:
+    database_url, path = args.database_url, None
+    if database_url and not args.reset:
+        sys.exit("--database-url drops the users and flashcards tables; add --reset on a scratch database")
+    if not database_url:
+        path = os.path.join(tempfile.mkdtemp(), "due_queue.db")
+        database_url = f"sqlite+aiosqlite:///{path}"
+    engine = create_async_engine(database_url)
+
+    start = time.perf_counter()
+    await populate(engine, args.cards, args.other_users)
+    print(f"inserted {args.cards} cards for user 1 (+{args.other_users} other users) "
+          f"in {time.perf_counter() - start:.1f}s")
+    await show_plan(engine)
+
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+    samples = []
+    async with session_factory() as session:
+        await get_due_cards(session, 1, args.limit)
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            cards = await get_due_cards(session, 1, args.limit)
+            samples.append(time.perf_counter() - start)
+    print_latency(f"get_due_cards -> {len(cards)} cards", samples)
+    await engine.dispose()
+    if path:
+        print_latency("index lookup (sqlite3)", time_raw_sqlite(path, args.limit, args.rounds))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flashcard due-queue latency")
+    parser.add_argument("--database-url", default="", help="Async SQLAlchemy URL (default: temporary SQLite)")
+    parser.add_argument("--reset", action="store_true", help="Allow recreating tables in --database-url")
+    parser.add_argument("--cards", type=int, default=100_000, help="Cards for the measured user")
+    parser.add_argument("--other-users", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
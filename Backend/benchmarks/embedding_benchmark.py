@@ -0,0 +1,122 @@
+"""
+Embedding Throughput Benchmark
+Concurrent callers each embed short texts one at a time, the way grading,
+chat and retrieval call embed_query. Compares:
+
+- direct:  every caller runs its own batch-of-one model call (as before);
+- batched: calls go through the in-process MicroBatcher;
+- server:  calls go over a socket to the shared embedding server (run here
+           in a background thread; in production it is its own process).
+
+Reports embeddings/sec, per-call latency and texts per model call.
+
+With the real model (loads all-MiniLM-L6-v2):
+    python -m benchmarks.embedding_benchmark --callers 32 --calls 50
+Offline, with a fake model costing a fixed overhead plus a per-text time:
+    python -m benchmarks.embedding_benchmark --fake-model
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stats import report
+from Services.embedding_service import MicroBatcher, RemoteEmbeddings, load_model, serve
+
+SENTENCES = [
+    "Chlorophyll absorbs light in the light reactions.",
+    "Entropy increases in an isolated system.",
+    "The congestion window limits packets in flight.",
+    "A mutation changes the sequence of an allele.",
+    "Cosine similarity compares embedding directions.",
+]
+
+
+class FakeModel:
+    """Forward pass = overhead + per-text cost, releasing the GIL like a real model; one pass at a time."""
+
+    def __init__(self, overhead_ms: float, per_text_ms: float):
+        self.overhead = overhead_ms / 1000
+        self.per_text = per_text_ms / 1000
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: list) -> list:
+        with self._lock:
+            self.calls += 1
+            time.sleep(self.overhead + self.per_text * len(texts))
+        return [[float(len(text))] * 384 for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+
+def drive(embeddings, callers: int, calls: int) -> tuple:
+    samples = []
+    lock = threading.Lock()
+
+    def caller(number: int) -> None:
+        for i in range(calls):
+            start = time.perf_counter()
+            embeddings.embed_query(f"{SENTENCES[(number + i) % len(SENTENCES)]} ({number}.{i})")
+            with lock:
+                samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(callers) as pool:
+        list(pool.map(caller, range(callers)))
+    return samples, time.perf_counter() - start
+
+
+def run(name: str, embeddings, args, count_calls) -> None:
+    before = count_calls()
+    samples, elapsed = drive(embeddings, args.callers, args.calls)
+    model_calls = count_calls() - before
+    report(name, samples)
+    print(f"{'':<14} {len(samples) / elapsed:.0f} embeddings/s | "
+          f"{len(samples) / max(model_calls, 1):.1f} texts per model call")
+
+
+def start_server(batcher: MicroBatcher) -> str:
+    address = os.path.join(tempfile.mkdtemp(), "embed.sock")
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_until_complete, args=(serve(address, batcher),), daemon=True).start()
+    while not os.path.exists(address):
+        time.sleep(0.01)
+    return address
+
+
+def main(args) -> None:
+    model = FakeModel(args.overhead_ms, args.per_text_ms) if args.fake_model else load_model()
+    calls = {"n": 0}
+    embed_documents = model.embed_documents
+
+    def counted(texts):
+        calls["n"] += 1
+        return embed_documents(texts)
+
+    model.embed_documents = counted
+    count_calls = lambda: calls["n"]
+    print(f"{args.callers} callers x {args.calls} calls, {'fake' if args.fake_model else 'real'} model")
+
+    run("direct", model, args, count_calls)
+    batcher = MicroBatcher(model, wait_ms=args.wait_ms)
+    run("batched", batcher, args, count_calls)
+    run("server", RemoteEmbeddings(start_server(batcher)), args, count_calls)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embeddings/sec with and without micro-batching")
+    parser.add_argument("--callers", type=int, default=32, help="Concurrent callers")
+    parser.add_argument("--calls", type=int, default=50, help="Calls per caller")
+    parser.add_argument("--wait-ms", type=float, default=None, help="Batching window (default: EMBED_BATCH_WAIT_MS)")
+    parser.add_argument("--fake-model", action="store_true", help="No model download; simulated forward passes")
+    parser.add_argument("--overhead-ms", type=float, default=8.0, help="Fake model: cost of a forward pass")
+    parser.add_argument("--per-text-ms", type=float, default=0.3, help="Fake model: added cost per text")
+    main(parser.parse_args())
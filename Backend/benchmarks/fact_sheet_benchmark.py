@@ -0,0 +1,126 @@
+"""
+Fact Sheet Benchmark
+Compares generation prompts built from raw chunks (FACT_SHEETS=off) with
+prompts built from the chunks' extractive fact sheets (FACT_SHEETS=rules).
+Reports prompt tokens per LLM call, the reduction, and latency per question
+for the single-question, RAG quiz and agent quiz generators, plus the cost
+of building the sheets and how many of each chunk's key terms they keep.
+
+The fake LLM models latency as a fixed time plus --prompt-token-latency
+seconds per prompt token (prefill) and --token-latency per output token,
+so the latency gap follows the prompt size. Each synthetic "chunk" is a
+two-paragraph page, about one CHUNK_SIZE chunk.
+
+Run from the Backend directory (loads the embedding model):
+    python -m benchmarks.fact_sheet_benchmark --pages 60 --rounds 20
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_llm import install_fake_llm
+from benchmarks.stats import report
+from benchmarks.synthetic_pdf import make_pages, TOPICS
+from config import settings
+from Services.state_service import state_store
+from Services.chunk_service import save_chunks
+from Services.fact_sheet_service import build_rules_sheets, build_llm_sheets
+from Services.rag_service import _complete, generate_single_question, generate_quiz_from_rag, get_random_chunks
+from Services.agent_service import generate_quiz_with_agent
+
+DOCUMENT_ID = "fact-sheet-benchmark"
+TERMS = sorted({term.lower() for terms in TOPICS.values() for term in terms})
+
+
+def sheet_stats(chunks: list, sheets: list, elapsed: float) -> None:
+    kept = total = 0
+    for chunk, sheet in zip(chunks, sheets):
+        present = [term for term in TERMS if term in chunk.lower()]
+        total += len(present)
+        kept += sum(term in sheet.lower() for term in present)
+    chunk_chars = sum(map(len, chunks)) / len(chunks)
+    sheet_chars = sum(map(len, sheets)) / len(sheets)
+    print(f"rules sheets: {elapsed / len(chunks) * 1000:.2f} ms/chunk | "
+          f"{chunk_chars:.0f} -> {sheet_chars:.0f} chars/chunk | {kept / max(total, 1):.0%} of key terms kept")
+
+
+async def setup_document(pages: int) -> None:
+    chunks = make_pages(pages, paragraphs_per_page=2)
+    start = time.perf_counter()
+    sheets = build_rules_sheets(chunks)
+    sheet_stats(chunks, sheets, time.perf_counter() - start)
+    await state_store.set("documents", DOCUMENT_ID, {
+        "filename": "fact-sheets.pdf",
+        "owner": None,
+        "chunks_count": len(chunks),
+        "chunks_version": await save_chunks(DOCUMENT_ID, chunks),
+        "fact_sheets_version": await save_chunks(DOCUMENT_ID, sheets, "fact_sheets"),
+        "created_at": time.time(),
+        "last_access": time.time(),
+    })
+    await state_store.set("documents", "active", DOCUMENT_ID)
+    return chunks
+
+
+async def measure(name: str, generate, fake, rounds: int) -> dict:
+    tokens_before, calls_before = fake.total_usage().prompt_tokens, fake.calls
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        produced = await generate()
+        elapsed = time.perf_counter() - start
+        samples.extend([elapsed / max(produced, 1)] * max(produced, 1))
+    report(name, samples)
+    return {"prompt_tokens": (fake.total_usage().prompt_tokens - tokens_before) / max(fake.calls - calls_before, 1),
+            "mean_s": sum(samples) / len(samples)}
+
+
+async def main(args) -> None:
+    fake = install_fake_llm(latency=args.llm_latency, jitter=0, token_latency=args.token_latency,
+                            prompt_token_latency=args.prompt_token_latency)
+    chunks = await setup_document(args.pages)
+
+    start, calls = time.perf_counter(), fake.calls
+    await build_llm_sheets(chunks, _complete)
+    print(f"llm sheets:   {fake.calls - calls} calls for {len(chunks)} chunks "
+          f"({settings.FACT_SHEET_BATCH} per call), {time.perf_counter() - start:.1f}s")
+
+    async def single():
+        question = await generate_single_question("general", document_id=DOCUMENT_ID, mode="llm")
+        return 0 if "error" in question else 1
+
+    async def rag():
+        data = await generate_quiz_from_rag("general", args.questions, question_type="mcq",
+                                            document_id=DOCUMENT_ID, mode="llm")
+        return len(data["quiz"])
+
+    async def agent():
+        # The /agent/generate endpoint: context chosen there, then the agent
+        context = await get_random_chunks(min(3, args.questions), DOCUMENT_ID, facts=settings.FACT_SHEETS != "off")
+        return len((await generate_quiz_with_agent(context[:1500], args.questions, "llm", DOCUMENT_ID))["quiz"])
+
+    print(f"latency per question, {args.rounds} rounds each")
+    for label, generate in (("single", single), ("rag", rag), ("agent", agent)):
+        results = {}
+        for mode in ("off", "rules"):
+            settings.FACT_SHEETS = mode
+            results[mode] = await measure(f"{label}/{mode}", generate, fake, args.rounds)
+        full, sheets = results["off"], results["rules"]
+        print(f"{'':<14} prompt tokens/call {full['prompt_tokens']:.0f} -> {sheets['prompt_tokens']:.0f} "
+              f"({1 - sheets['prompt_tokens'] / full['prompt_tokens']:.0%} fewer), "
+              f"latency {1 - sheets['mean_s'] / full['mean_s']:.0%} lower")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt tokens and latency with fact sheets vs raw chunks")
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--questions", type=int, default=5, help="Questions per quiz request")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fixed seconds per LLM call")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0005, help="Seconds per prompt token")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Seconds per output token")
+    asyncio.run(main(parser.parse_args()))
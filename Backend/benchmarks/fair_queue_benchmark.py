@@ -0,0 +1,84 @@
+"""
+Fair Queue Benchmark
+One heavy user keeps --heavy-concurrency large requests in flight while
+--light-users users send small requests one after another. Each request
+holds a slot for a simulated LLM call (--work seconds per unit of cost).
+Compares the light users' latency behind a plain FIFO semaphore with the
+same capacity against the weighted fair queue, and reports how many of the
+heavy user's requests the fair queue turned away with 429.
+
+Needs no LLM or database:
+    python -m benchmarks.fair_queue_benchmark --duration 10
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from Services.scheduler_service import FairScheduler
+from benchmarks.stats import report
+
+
+class FifoQueue:
+    """Baseline: first come, first served with the same global capacity."""
+
+    def __init__(self, capacity: int):
+        self._semaphore = asyncio.Semaphore(capacity)
+
+    @asynccontextmanager
+    async def slot(self, user, cost: float = 1.0, weight: float = 1.0):
+        async with self._semaphore:
+            yield
+
+
+async def client(queue, user, cost: int, work: float, deadline: float, samples: list, rejected: list) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            async with queue.slot(user, cost):
+                await asyncio.sleep(work * cost)
+        except HTTPException as e:
+            rejected.append(e)
+            await asyncio.sleep(float(e.headers["Retry-After"]))
+            continue
+        samples.append(time.perf_counter() - start)
+
+
+async def run(name: str, queue, args) -> None:
+    deadline = time.perf_counter() + args.duration
+    heavy, light, rejected = [], [], []
+    clients = [client(queue, "heavy", args.heavy_cost, args.work, deadline, heavy, rejected)
+               for _ in range(args.heavy_concurrency)]
+    clients += [client(queue, f"light{i}", 1, args.work, deadline, light, [])
+                for i in range(args.light_users)]
+    await asyncio.gather(*clients)
+    print(f"--- {name}")
+    report("light users", light)
+    report("heavy user", heavy)
+    if rejected:
+        print(f"heavy user rejected {len(rejected)} times with 429")
+
+
+async def main(args) -> None:
+    await run("fifo", FifoQueue(args.capacity), args)
+    fair = FairScheduler(capacity=args.capacity, per_user=args.per_user,
+                         queue_limit=args.queue_limit, max_wait=30)
+    await run("fair queue", fair, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of light users next to a heavy user")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--capacity", type=int, default=8)
+    parser.add_argument("--per-user", type=int, default=2)
+    parser.add_argument("--queue-limit", type=int, default=4)
+    parser.add_argument("--light-users", type=int, default=6)
+    parser.add_argument("--heavy-concurrency", type=int, default=30)
+    parser.add_argument("--heavy-cost", type=int, default=5, help="Cost units per heavy request")
+    parser.add_argument("--work", type=float, default=0.05, help="Seconds of simulated LLM time per cost unit")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,14 @@
+"""
+The FastAPI app with every LLM client replaced by FakeChatCompletionClient.
+
+    FAKE_LLM_LATENCY=0.5 uvicorn benchmarks.fake_app:app --workers 4
+"""
+import os
+from main import app
+from benchmarks.fake_llm import install_fake_llm
+
+fake_llm = install_fake_llm(
+    latency=float(os.getenv("FAKE_LLM_LATENCY", "0.5")),
+    jitter=float(os.getenv("FAKE_LLM_JITTER", "0.2")),
+    seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+)
@@ -0,0 +1,161 @@
+"""
+Fake LLM
+A deterministic, offline stand-in for OpenAIChatCompletionClient. It sleeps for
+a configurable latency and returns canned output in whatever format the prompt
+asks for (single JSON question, JSON quiz, pipe-delimited quiz or flashcard
+lines, question + answer only for the distractor engine, fact sheet lines, or
+plain chat text).
+"""
+import re
+import json
+import random
+import asyncio
+from typing import AsyncGenerator, Mapping, Sequence, Any
+from autogen_core.models import ChatCompletionClient, CreateResult, RequestUsage, ModelInfo
+
+
+def _prompt_text(messages: Sequence) -> str:
+    return "\n".join(str(getattr(m, "content", "")) for m in messages)
+
+
+def _requested_count(prompt: str) -> int:
+    match = re.search(r"(?:exactly|Generate)\s+(\d+)", prompt)
+    return int(match.group(1)) if match else 1
+
+
+def _fake_question(i: int) -> dict:
+    options = [f"Option {c} for question {i}" for c in "ABCD"]
+    return {
+        "id": i,
+        "question": f"Synthetic question number {i}?",
+        "options": options,
+        "correctAnswer": i % 4,
+        "correctAnswerText": options[i % 4],
+        "explanation": "Synthetic explanation",
+        "type": "mcq",
+    }
+
+
+def _fake_short_answer(i: int) -> dict:
+    return {"question": f"Synthetic question number {i}?", "answer": f"Synthetic term {i}",
+            "explanation": "Synthetic explanation"}
+
+
+def canned_response(prompt: str) -> str:
+    """Pick an output shape that matches what the prompt requests."""
+    count = _requested_count(prompt)
+    if "N|FACT; FACT" in prompt:
+        passages = len(re.findall(r"^\[\d+\] ", prompt, re.MULTILINE))
+        return "\n".join(f"{n}|Synthetic fact {n}a; Synthetic fact {n}b|term {n}, concept {n}"
+                         for n in range(1, passages + 1))
+    if "FRONT|BACK" in prompt:
+        return "\n".join(f"Synthetic term {i}|Synthetic definition {i}" for i in range(1, count + 1))
+    if "ANSWER|QUESTION|OPTION_A" in prompt:
+        return "\n".join(
+            f"{'ABCD'[i % 4]}|Synthetic question {i}?|Alpha {i}|Beta {i}|Gamma {i}|Delta {i}"
+            for i in range(1, count + 1)
+        )
+    if "ANSWER|QUESTION" in prompt:
+        return "\n".join(f"Synthetic term {i}|Synthetic question {i}?" for i in range(1, count + 1))
+    short_answer = '"answer"' in prompt
+    if '"quiz"' in prompt:
+        make = _fake_short_answer if short_answer else _fake_question
+        return json.dumps({"quiz": [make(i) for i in range(1, count + 1)], "flashcards": []})
+    if '"question"' in prompt:
+        return json.dumps(_fake_short_answer(1) if short_answer else _fake_question(1))
+    return "This is a synthetic answer based on the provided context."
+
+
+class FakeChatCompletionClient(ChatCompletionClient):
+    """
+    Args:
+        latency: mean simulated response time in seconds
+        jitter: uniform +/- fraction applied to latency (0.2 = +/-20%)
+        seed: seed for the jitter RNG so runs are reproducible
+        responder: optional callable(prompt) -> str replacing canned_response
+        token_latency: extra seconds per output token, to model decode time
+        prompt_token_latency: extra seconds per prompt token, to model prefill time
+        slow_rate: fraction of calls that take slow_latency instead (a slow upstream tail)
+        failure_rate: fraction of calls that raise ConnectionError after the latency
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, seed: int = 0, responder=None,
+                 token_latency: float = 0.0, prompt_token_latency: float = 0.0, slow_rate: float = 0.0, slow_latency: float = 5.0,
+                 failure_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.failure_rate = failure_rate
+        self.responder = responder or canned_response
+        self._rng = random.Random(seed)
+        self._total = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._last = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self.calls = 0
+
+    async def create(self, messages: Sequence, *, tools: Sequence = [], tool_choice: Any = "auto",
+                     json_output: Any = None, extra_create_args: Mapping[str, Any] = {},
+                     cancellation_token: Any = None) -> CreateResult:
+        self.calls += 1
+        prompt = _prompt_text(messages)
+        content = self.responder(prompt)
+        # Rough token estimate: ~4 characters per token
+        usage = RequestUsage(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4)
+        delay = self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter))
+        if self._rng.random() < self.slow_rate:
+            delay = self.slow_latency
+        fail = self._rng.random() < self.failure_rate
+        delay += self.token_latency * usage.completion_tokens + self.prompt_token_latency * usage.prompt_tokens
+        await asyncio.sleep(max(0.0, delay))
+        if fail:
+            raise ConnectionError("Injected upstream failure")
+        self._last = usage
+        self._total = RequestUsage(
+            prompt_tokens=self._total.prompt_tokens + usage.prompt_tokens,
+            completion_tokens=self._total.completion_tokens + usage.completion_tokens,
+        )
+        return CreateResult(finish_reason="stop", content=content, usage=usage, cached=False)
+
+    async def create_stream(self, messages: Sequence, **kwargs) -> AsyncGenerator:
+        result = await self.create(messages, **kwargs)
+        yield result.content
+        yield result
+
+    async def close(self) -> None:
+        return None
+
+    def actual_usage(self) -> RequestUsage:
+        return self._last
+
+    def total_usage(self) -> RequestUsage:
+        return self._total
+
+    def count_tokens(self, messages: Sequence, *, tools: Sequence = []) -> int:
+        return len(_prompt_text(messages)) // 4
+
+    def remaining_tokens(self, messages: Sequence, *, tools: Sequence = []) -> int:
+        return 1_000_000 - self.count_tokens(messages)
+
+    @property
+    def capabilities(self):
+        return self.model_info
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return ModelInfo(vision=False, function_calling=False, json_output=True, family="unknown", structured_output=False)
+
+
+def install_fake_llm(latency: float = 0.5, jitter: float = 0.2, seed: int = 0,
+                     token_latency: float = 0.0, prompt_token_latency: float = 0.0) -> FakeChatCompletionClient:
+    """Swap the model client used by rag_service and by the agents agent.py's factories build for a fake."""
+    import agent
+    from Services import rag_service
+
+    fake = FakeChatCompletionClient(latency=latency, jitter=jitter, seed=seed, token_latency=token_latency,
+                                    prompt_token_latency=prompt_token_latency)
+    rag_service.model_client = fake
+    # The build_*_agent factories read it on every call
+    agent.model_client = fake
+    return fake
@@ -0,0 +1,83 @@
+"""
+Grading Benchmark
+Compares wall-clock latency and CPU time of check_quiz_answers for a mixed
+batch of MCQ / True-False / free-text answers, with and without option indices.
+
+Run from the Backend directory:
+    python -m benchmarks.grading_benchmark
+"""
+import sys
+import os
+import time
+import random
+import asyncio
+import statistics
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Services.rag_service import check_quiz_answers
+
+MCQ_OPTIONS = ["Paris", "London", "Berlin", "Madrid"]
+TF_OPTIONS = ["True", "False"]
+FREE_TEXT = [
+    ("photosynthesis converts light into energy", "Photosynthesis converts sunlight into chemical energy"),
+    ("a neural retriever", "A neural retriever combined with a generator"),
+    ("2020", "2020"),
+]
+
+
+def build_answers(count: int, with_indices: bool) -> list:
+    """Build a mixed batch: roughly 45% MCQ, 45% T/F and 10% free text."""
+    rng = random.Random(42)
+    answers = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.9:
+            options = MCQ_OPTIONS if roll < 0.45 else TF_OPTIONS
+            user_idx = rng.randrange(len(options))
+            correct_idx = rng.randrange(len(options))
+            answer = {
+                "question_id": i,
+                "user_answer": options[user_idx],
+                "correct_answer": options[correct_idx],
+            }
+            if with_indices:
+                answer["user_answer_index"] = user_idx
+                answer["correct_answer_index"] = correct_idx
+        else:
+            user_ans, correct_ans = FREE_TEXT[i % len(FREE_TEXT)]
+            answer = {"question_id": i, "user_answer": user_ans, "correct_answer": correct_ans}
+        answers.append(answer)
+    return answers
+
+
+async def run_case(name: str, answers: list, rounds: int) -> dict:
+    wall, cpu = [], []
+    for _ in range(rounds):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        await check_quiz_answers(answers)
+        wall.append(time.perf_counter() - wall_start)
+        cpu.append(time.process_time() - cpu_start)
+    return {
+        "case": name,
+        "wall_ms_p50": statistics.median(wall) * 1000,
+        "cpu_ms_p50": statistics.median(cpu) * 1000,
+    }
+
+
+async def main(count: int = 50, rounds: int = 5):
+    # Warm up the embedding model so model loading is not measured
+    await check_quiz_answers(build_answers(3, with_indices=False))
+
+    results = [
+        await run_case("similarity-only", build_answers(count, with_indices=False), rounds),
+        await run_case("index-fast-path", build_answers(count, with_indices=True), rounds),
+    ]
+    for r in results:
+        print(f"{r['case']:<16} wall p50 {r['wall_ms_p50']:8.2f} ms | cpu p50 {r['cpu_ms_p50']:8.2f} ms")
+    speedup = results[0]["wall_ms_p50"] / max(results[1]["wall_ms_p50"], 1e-9)
+    print(f"Index fast path speedup: {speedup:.1f}x over {count} answers")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Hedged Request Benchmark
+Two fake model clients with a slow tail (--slow-rate of calls take
+--slow-latency seconds) stand in for the RAG and agent clients. The benchmark
+compares latency percentiles of calling one client directly with calling
+through HedgedChatCompletionClient, which re-sends a call to the other
+client after the first one's adaptive p95 delay. It reports how many extra
+calls hedging cost. A final phase makes the primary fail every call and
+shows the circuit breaker taking it out of rotation.
+
+Needs no LLM:
+    python -m benchmarks.hedging_benchmark --calls 400
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autogen_core.models import UserMessage
+from config import settings
+from benchmarks.fake_llm import FakeChatCompletionClient
+from benchmarks.stats import report
+from Services.llm_dispatch_service import register_client, HedgedChatCompletionClient
+
+MESSAGES = [UserMessage(content="Answer briefly.", source="user")]
+
+
+def make_fake(args, seed: int) -> FakeChatCompletionClient:
+    return FakeChatCompletionClient(latency=args.latency, jitter=0.3, seed=seed,
+                                    slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+
+
+async def drive(client, calls: int, concurrency: int) -> tuple:
+    samples, errors = [], 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with slots:
+            start = time.perf_counter()
+            try:
+                await client.create(MESSAGES)
+            except Exception:
+                errors += 1
+                return
+            samples.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return samples, errors
+
+
+async def main(args) -> None:
+    settings.HEDGE_MIN_DELAY_SECONDS = args.min_delay
+    settings.LLM_TIMEOUT_SECONDS = args.timeout
+
+    direct = make_fake(args, seed=1)
+    samples, _ = await drive(direct, args.calls, args.concurrency)
+    report("direct", samples)
+
+    primary = register_client("primary", make_fake(args, seed=1)).client
+    alternate = register_client("alternate", make_fake(args, seed=2)).client
+    hedged = HedgedChatCompletionClient("primary")
+    # Warm-up so the hedge delay is the measured p95, not the default
+    await drive(hedged, 50, args.concurrency)
+    before = primary.calls + alternate.calls
+    samples, errors = await drive(hedged, args.calls, args.concurrency)
+    report("hedged", samples)
+    extra = (primary.calls + alternate.calls - before) / args.calls - 1
+    print(f"hedge delay {hedged._state.hedge_delay() * 1000:.0f} ms | "
+          f"about {max(extra, 0):.1%} extra calls | {errors} errors")
+
+    primary.failure_rate = 1.0
+    before_primary, before_alternate = primary.calls, alternate.calls
+    samples, errors = await drive(hedged, args.calls // 4, 1)
+    report("primary down", samples)
+    print(f"primary received {primary.calls - before_primary} calls, alternate "
+          f"{alternate.calls - before_alternate}, {errors} errors; "
+          f"breaker {hedged._state.breaker_state()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tail latency with hedged LLM calls")
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="Typical seconds per call")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Fraction of slow calls")
+    parser.add_argument("--slow-latency", type=float, default=3.0)
+    parser.add_argument("--min-delay", type=float, default=0.1, help="HEDGE_MIN_DELAY_SECONDS")
+    parser.add_argument("--timeout", type=float, default=10.0, help="LLM_TIMEOUT_SECONDS")
+    asyncio.run(main(parser.parse_args()))
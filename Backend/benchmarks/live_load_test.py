@@ -0,0 +1,164 @@
+"""
+Live Session Load Test
+Runs the live router in an in-process uvicorn server and connects several
+hundred simulated students over WebSocket. The host pushes --questions
+questions; every student answers after a random think time (some with free
+text instead of an option index), which closes each question as soon as
+the last answer is in. Reports:
+
+- question fan-out: from the question opening on the server to each
+  student receiving it;
+- results: from the last answer being sent to each student receiving the
+  graded results (batched grading plus broadcast);
+- how many distinct answers were graded per question, and dropped clients.
+
+Rule-based questions by default (no LLM); --mode llm uses the fake LLM:
+    python -m benchmarks.live_load_test --clients 300 --questions 5
+"""
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+import websockets
+from types import SimpleNamespace
+from fastapi import FastAPI
+from benchmarks.synthetic_pdf import make_pages
+from benchmarks.stats import report
+from Api.Security.Oath2 import get_current_user, get_optional_user
+from Api.Router.live_router import router as live_router
+from Services.state_service import state_store
+from Services.chunk_service import save_chunks
+from Services.live_service import live_dropped_clients
+
+DOCUMENT_ID = "live-load-test"
+HOST = SimpleNamespace(id=1, email="host@example.com")
+
+
+async def setup_document(pages: int) -> None:
+    await save_chunks(DOCUMENT_ID, make_pages(pages))
+    await state_store.set("documents", "active", DOCUMENT_ID)
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(live_router)
+    # The host is signed in without a database; no budgets in the benchmark
+    app.dependency_overrides[get_current_user] = lambda: HOST
+    app.dependency_overrides[get_optional_user] = lambda: None
+    return app
+
+
+class Student:
+    def __init__(self, number: int, url: str, args, rng: random.Random):
+        self.name = f"student{number}"
+        self.url = f"{url}?name={self.name}"
+        self.args = args
+        self.rng = rng
+        self.fanout = []
+        self.results = {}
+        self.answered_at = {}
+        self.ready = asyncio.Event()
+
+    async def run(self) -> None:
+        async with websockets.connect(self.url, max_queue=None) as socket:
+            async for text in socket:
+                message = json.loads(text)
+                kind = message["type"]
+                if kind == "joined":
+                    self.ready.set()
+                elif kind == "question":
+                    opened_at = message["closes_at"] - message["time_limit"]
+                    self.fanout.append(time.time() - opened_at)
+                    asyncio.create_task(self.answer(socket, message))
+                elif kind == "results":
+                    self.results[message["question_id"]] = (time.time(), message)
+                elif kind == "ended":
+                    return
+
+    async def answer(self, socket, question: dict) -> None:
+        await asyncio.sleep(self.rng.uniform(0, self.args.think))
+        index = self.rng.randrange(len(question["options"]))
+        answer = {"type": "answer", "question_id": question["question_id"]}
+        if self.rng.random() < self.args.text_rate:
+            # Free text: an option typed out, in various cases
+            text = question["options"][index]
+            answer["answer"] = text.upper() if self.rng.random() < 0.5 else text
+        else:
+            answer["answer_index"] = index
+        self.answered_at[question["question_id"]] = time.time()
+        await socket.send(json.dumps(answer))
+
+
+async def run_session(base_url: str, ws_url: str, args) -> None:
+    rng = random.Random(args.seed)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as host:
+        response = await host.post("/live/sessions", params={"document_id": DOCUMENT_ID})
+        response.raise_for_status()
+        code = response.json()["session_id"]
+        url = f"{ws_url}/live/sessions/{code}/ws"
+
+        students = [Student(n, url, args, random.Random(rng.random())) for n in range(args.clients)]
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(s.run()) for s in students]
+        await asyncio.wait_for(asyncio.gather(*(s.ready.wait() for s in students)), 60)
+        print(f"{args.clients} students connected in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        results_latency, distinct = [], []
+        for question_id in range(1, args.questions + 1):
+            response = await host.post(f"/live/sessions/{code}/questions", params={
+                "topic": "general", "mode": args.mode, "time_limit": args.time_limit})
+            response.raise_for_status()
+            while not all(question_id in s.results for s in students):
+                await asyncio.sleep(0.05)
+            last_answer = max(s.answered_at.get(question_id, 0) for s in students)
+            results_latency.extend(s.results[question_id][0] - last_answer for s in students)
+            message = students[0].results[question_id][1]
+            distinct.append(message["distinct_answers"])
+            print(f"question {question_id}: {message['answered']} answers, {message['correct']} correct, "
+                  f"{message['distinct_answers']} distinct answers graded")
+
+        await host.delete(f"/live/sessions/{code}")
+        await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 30)
+
+    report("fan-out", [latency for s in students for latency in s.fanout])
+    report("results", results_latency)
+    print(f"{sum(distinct) / len(distinct):.1f} distinct answers graded per question for {args.clients} answers; "
+          f"{live_dropped_clients.value():.0f} clients dropped")
+
+
+async def main(args) -> None:
+    if args.mode == "llm":
+        from benchmarks.fake_llm import install_fake_llm
+        install_fake_llm(latency=0.5)
+    await setup_document(args.pages)
+    server = uvicorn.Server(uvicorn.Config(make_app(), host="127.0.0.1", port=args.port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        await run_session(f"http://127.0.0.1:{args.port}", f"ws://127.0.0.1:{args.port}", args)
+    finally:
+        server.should_exit = True
+        await serving
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live classroom session with many WebSocket clients")
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--think", type=float, default=2.0, help="Longest seconds before a student answers")
+    parser.add_argument("--text-rate", type=float, default=0.1, help="Fraction of free-text answers")
+    parser.add_argument("--time-limit", type=float, default=60)
+    parser.add_argument("--mode", choices=("llm", "rules"), default="rules")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
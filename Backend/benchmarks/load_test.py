@@ -0,0 +1,131 @@
+"""
+Load Test
+Drives the quiz API with concurrent scenario traffic and reports throughput and
+p50/p95/p99 per endpoint. Baselines can be saved and compared so regressions
+show up between runs.
+
+Against the in-process app with the fake LLM (no server, no API key):
+    python -m benchmarks.load_test --in-process --requests 100 --concurrency 10
+
+Against a running server (e.g. uvicorn benchmarks.fake_app:app --workers 4):
+    python -m benchmarks.load_test --base-url http://localhost:8000
+
+Save a baseline, then compare a later run to it:
+    python -m benchmarks.load_test --in-process --save-baseline fake-llm
+    python -m benchmarks.load_test --in-process --compare fake-llm
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import httpx
+# Add parent directory to path so the benchmarks package is importable as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.stats import summarize, save_baseline, load_baseline, compare_to_baseline
+from benchmarks.synthetic_pdf import make_pdf
+
+CHECK_ANSWERS_PAYLOAD = {
+    "answers": [
+        {"question_id": 1, "user_answer": "Paris", "correct_answer": "Paris", "user_answer_index": 0, "correct_answer_index": 0},
+        {"question_id": 2, "user_answer": "True", "correct_answer": "False", "user_answer_index": 0, "correct_answer_index": 1},
+        {"question_id": 3, "user_answer": "light into energy", "correct_answer": "converts light into chemical energy"},
+    ]
+}
+
+
+def scenario_requests(pdf_bytes: bytes) -> dict:
+    """Scenario name -> coroutine function issuing one request with the given client."""
+    return {
+        "upload_pdf": lambda c: c.post(
+            "/quiz/upload-pdf", files={"file": ("synthetic.pdf", pdf_bytes, "application/pdf")}),
+        "generate": lambda c: c.post("/quiz/generate", params={"topic": "general", "num_questions": 5}),
+        "agent_generate_one": lambda c: c.post("/quiz/agent/generate-one"),
+        "check_answers": lambda c: c.post("/quiz/check-answers", json=CHECK_ANSWERS_PAYLOAD),
+        "chat": lambda c: c.post("/quiz/chat", json={"message": "What is cosine similarity used for?"}),
+    }
+
+
+async def run_scenario(client, send, requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    remaining = list(range(requests))
+
+    async def worker():
+        nonlocal errors
+        while remaining:
+            remaining.pop()
+            start = time.perf_counter()
+            try:
+                response = await send(client)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def make_client(args) -> httpx.AsyncClient:
+    if args.in_process:
+        os.environ.setdefault("FAKE_LLM_LATENCY", str(args.llm_latency))
+        from benchmarks.fake_app import app
+        transport = httpx.ASGITransport(app=app)
+        return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120)
+    return httpx.AsyncClient(base_url=args.base_url, timeout=120)
+
+
+async def main(args) -> int:
+    pdf_bytes = make_pdf(args.pages)
+    scenarios = scenario_requests(pdf_bytes)
+    selected = args.scenarios or list(scenarios)
+
+    async with make_client(args) as client:
+        # Make sure there is a document to generate from before measuring
+        await scenarios["upload_pdf"](client)
+        # All selected scenarios run at the same time, each with its own worker pool
+        summaries = await asyncio.gather(*[
+            run_scenario(client, scenarios[name], args.requests, args.concurrency) for name in selected
+        ])
+    results = dict(zip(selected, summaries))
+
+    for name, summary in results.items():
+        print(
+            f"{name:<20} {summary['throughput_rps']:8.2f} req/s | "
+            f"p50 {summary['p50_ms']:8.1f} ms | p95 {summary['p95_ms']:8.1f} ms | "
+            f"p99 {summary['p99_ms']:8.1f} ms | errors {summary['errors']}"
+        )
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        print(f"Baseline saved to {save_baseline(args.save_baseline, results)}")
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        if baseline is None:
+            print(f"No baseline named {args.compare}")
+            return 1
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test for the quiz API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--in-process", action="store_true", help="Run against the app in-process with the fake LLM")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake LLM latency in seconds (--in-process)")
+    parser.add_argument("--scenarios", nargs="*", choices=list(scenario_requests(b"")), default=None)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients per scenario")
+    parser.add_argument("--pages", type=int, default=10, help="Pages in the synthetic upload PDF")
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging a regression")
+    parser.add_argument("--json", action="store_true", help="Also print the raw results as JSON")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,83 @@
+"""
+Login Load Test
+Simulates a classroom login rush against a running server and measures
+/token latency together with the latency of concurrent /quiz/* traffic.
+
+Start the API first (uvicorn main:app), then run from the Backend directory:
+    python -m benchmarks.login_load_test --logins 200 --concurrency 50
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import httpx
+# Add parent directory to path so the benchmarks package is importable as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.stats import report
+
+
+async def ensure_user(client: httpx.AsyncClient, email: str, password: str) -> None:
+    # 200 on first run; later runs may fail because the user already exists
+    await client.post("/user", json={"name": "loadtest", "email": email, "password": password})
+
+
+async def login_worker(client, email, password, remaining, latencies, statuses):
+    while remaining:
+        remaining.pop()
+        start = time.perf_counter()
+        response = await client.post("/token", data={"username": email, "password": password})
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def quiz_probe(client, stop: asyncio.Event, latencies: list) -> None:
+    """Cheap /quiz request (index-graded answers) issued continuously during the rush."""
+    payload = {"answers": [{"question_id": 1, "user_answer_index": 0, "correct_answer_index": 0}]}
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.post("/quiz/check-answers", json=payload)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def main(base_url: str, logins: int, concurrency: int):
+    email, password = "loadtest@example.com", "loadtest-password"
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await ensure_user(client, email, password)
+
+        # Baseline /quiz latency with no login traffic
+        idle_latencies = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(quiz_probe(client, stop, idle_latencies))
+        await asyncio.sleep(2)
+        stop.set()
+        await probe
+
+        # Login rush with the /quiz probe running alongside
+        login_latencies, quiz_latencies, statuses = [], [], {}
+        remaining = list(range(logins))
+        stop = asyncio.Event()
+        probe = asyncio.create_task(quiz_probe(client, stop, quiz_latencies))
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            login_worker(client, email, password, remaining, login_latencies, statuses)
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+
+    report("/token", login_latencies)
+    report("/quiz idle", idle_latencies)
+    report("/quiz in rush", quiz_latencies)
+    print(f"logins/sec {logins / elapsed:.1f} | status codes {statuses}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login rush load test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.base_url, args.logins, args.concurrency))
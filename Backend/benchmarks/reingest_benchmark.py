@@ -0,0 +1,99 @@
+"""
+Re-ingestion Benchmark
+Uploads a synthetic PDF, then re-uploads it with a few pages edited, and
+compares the re-upload with ingesting the edited file from scratch:
+wall time, texts embedded and pages re-split. With per-page hashes only the
+edited pages are split and embedded; parsing the PDF is the remaining cost
+that grows with its size.
+
+Run from the Backend directory (loads the embedding model, writes to the
+local Chroma directory and removes its collections afterwards):
+    python -m benchmarks.reingest_benchmark --pages 300 --changed 1
+"""
+import sys
+import os
+import io
+import time
+import random
+import asyncio
+import argparse
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import UploadFile
+from benchmarks.synthetic_pdf import make_pages, build_pdf
+from Services import rag_service
+from Services.collection_service import evict_document
+
+OWNER = "reingest-benchmark"
+
+
+class CountingEmbeddings:
+    """Counts the texts sent to the model."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.texts = 0
+
+    def embed_documents(self, texts: list) -> list:
+        self.texts += len(texts)
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list) -> list:
+        self.texts += len(texts)
+        return await self.inner.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> list:
+        return self.inner.embed_query(text)
+
+
+async def upload(pages: list, filename: str) -> dict:
+    embedded = rag_service.embeddings.texts
+    start = time.perf_counter()
+    result = await rag_service.process_pdf(UploadFile(io.BytesIO(build_pdf(pages)), filename=filename), owner=OWNER)
+    result["seconds"] = time.perf_counter() - start
+    result["embedded"] = rag_service.embeddings.texts - embedded
+    return result
+
+
+def edit(pages: list, changed: int, seed: int) -> list:
+    rng = random.Random(seed)
+    edited = list(pages)
+    for page in rng.sample(range(len(pages)), changed):
+        edited[page] = edited[page].replace(" is ", " was ", 1)
+    return edited
+
+
+def show(name: str, result: dict) -> None:
+    print(f"{name:<12} {result['seconds'] * 1000:8.0f} ms | {result['embedded']:5d} texts embedded | "
+          f"{result.get('pages_changed', '-'):>4} pages split | {result['chunks_count']} chunks")
+
+
+async def main(args) -> None:
+    rag_service.embeddings = CountingEmbeddings(rag_service.embeddings)
+    pages = make_pages(args.pages)
+    edited = edit(pages, args.changed, args.seed)
+    document_ids = set()
+    try:
+        first = await upload(pages, "course.pdf")
+        document_ids.add(first["document_id"])
+        show("first", first)
+        again = await upload(edited, "course.pdf")
+        show("re-upload", again)
+        fresh = await upload(edited, "course-copy.pdf")
+        document_ids.add(fresh["document_id"])
+        show("from scratch", fresh)
+        print(f"re-upload with {args.changed}/{args.pages} pages edited: "
+              f"{again['seconds'] / fresh['seconds']:.0%} of the time, "
+              f"{again['embedded'] / max(fresh['embedded'], 1):.1%} of the embeddings")
+    finally:
+        for document_id in document_ids:
+            await evict_document(document_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental re-ingestion vs ingesting from scratch")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--changed", type=int, default=1, help="Pages edited before the re-upload")
+    parser.add_argument("--seed", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,37 @@
+"""
+Rule-Based Generation Benchmark
+Measures questions and flashcards generated per second by the rule-based
+generator on synthetic document chunks (single CPU core, no LLM).
+
+Run from the Backend directory:
+    python -m benchmarks.rulebased_benchmark --pages 50 --rounds 200
+"""
+import sys
+import os
+import time
+import argparse
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_pdf import make_pages
+from Services.rulebased_service import generate_questions, generate_flashcards
+
+
+def run(pages: list, rounds: int, per_request: int) -> None:
+    for name, generate in (("questions", generate_questions), ("flashcards", generate_flashcards)):
+        produced, start = 0, time.perf_counter()
+        for i in range(rounds):
+            # One "request": a random-ish page of context, like get_random_chunks
+            produced += len(generate(pages[i % len(pages)], per_request, seed=i))
+        elapsed = time.perf_counter() - start
+        print(f"{name:<11} {produced:6d} items in {elapsed:6.2f}s | "
+              f"{produced / elapsed:8.0f} items/s | {elapsed / rounds * 1000:6.2f} ms/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rule-based generator throughput")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=200, help="Generation requests per kind")
+    parser.add_argument("--per-request", type=int, default=5, help="Items requested per call")
+    args = parser.parse_args()
+    run(make_pages(args.pages), args.rounds, args.per_request)
@@ -0,0 +1,69 @@
+"""Latency statistics and baseline files shared by the benchmark scripts."""
+import os
+import json
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: list, elapsed: float, errors: int = 0) -> dict:
+    """Latency samples are in seconds; the summary is in milliseconds."""
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+def report(name: str, samples: list) -> None:
+    print(
+        f"{name:<14} n={len(samples):<5} "
+        f"p50 {percentile(samples, 50) * 1000:8.1f} ms | "
+        f"p95 {percentile(samples, 95) * 1000:8.1f} ms | "
+        f"p99 {percentile(samples, 99) * 1000:8.1f} ms"
+    )
+
+
+def save_baseline(name: str, results: dict) -> str:
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_baseline(name: str) -> dict | None:
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float = 0.15) -> list:
+    """
+    Return human-readable regressions: p95/p99 more than `tolerance` slower,
+    or throughput more than `tolerance` lower, than the saved baseline.
+    """
+    regressions = []
+    for scenario, current in results.items():
+        previous = baseline.get(scenario)
+        if not previous:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if previous[key] and current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{scenario}: {key} {previous[key]} -> {current[key]}")
+        if previous["throughput_rps"] and current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{scenario}: throughput_rps {previous['throughput_rps']} -> {current['throughput_rps']}")
+    return regressions
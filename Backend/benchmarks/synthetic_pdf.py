@@ -0,0 +1,117 @@
+"""
+Synthetic PDF Generator
+Writes deterministic text-only PDFs (no third-party dependencies) that
+PyPDFLoader can parse, for benchmarks and load tests.
+
+    python -m benchmarks.synthetic_pdf out.pdf --pages 20
+"""
+import random
+import argparse
+
+TOPICS = {
+    "photosynthesis": ["chlorophyll", "light reactions", "Calvin cycle", "glucose", "stomata", "carbon dioxide"],
+    "retrieval": ["vector index", "embedding", "cosine similarity", "retriever", "chunk", "reranking"],
+    "thermodynamics": ["entropy", "enthalpy", "heat engine", "Carnot cycle", "temperature", "work"],
+    "networking": ["TCP handshake", "congestion window", "router", "packet loss", "latency", "bandwidth"],
+    "genetics": ["allele", "genotype", "phenotype", "mutation", "chromosome", "DNA replication"],
+}
+
+TEMPLATES = [
+    "The {a} is closely related to the {b} in the study of {topic}.",
+    "In {topic}, {a} describes how the {b} changes over time.",
+    "A key idea of {topic} is that {a} depends on {b}.",
+    "Researchers measure {a} to understand the role of {b} in {topic}.",
+    "{A} was first described as part of {topic} and later linked to {b}.",
+    "Without {a}, the {b} would not behave as expected in {topic}.",
+]
+
+
+def make_paragraph(rng: random.Random, topic: str, sentences: int = 6) -> str:
+    terms = TOPICS[topic]
+    out = []
+    for _ in range(sentences):
+        a, b = rng.sample(terms, 2)
+        out.append(rng.choice(TEMPLATES).format(a=a, A=a.capitalize(), b=b, topic=topic))
+    return " ".join(out)
+
+
+def make_pages(num_pages: int, seed: int = 7, paragraphs_per_page: int = 4) -> list:
+    """Return a list of page texts; each page focuses on one topic (round-robin)."""
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    pages = []
+    for page in range(num_pages):
+        topic = topics[page % len(topics)]
+        pages.append("\n\n".join(make_paragraph(rng, topic) for _ in range(paragraphs_per_page)))
+    return pages
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int = 90) -> list:
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            if len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        lines.append(line)
+    return lines
+
+
+def build_pdf(pages: list) -> bytes:
+    """Encode page texts as a minimal PDF 1.4 document using the Helvetica base font."""
+    objects = []  # object bodies; object number = index + 1
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(b"")  # Pages tree, filled in once page object numbers are known
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_refs = []
+    for text in pages:
+        stream_lines = [b"BT", b"/F1 10 Tf", b"12 TL", b"50 800 Td"]
+        for line in _wrap(text):
+            stream_lines.append(f"({_escape(line)}) '".encode("latin-1", "replace"))
+        stream_lines.append(b"ET")
+        stream = b"\n".join(stream_lines)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_refs)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(out)
+
+
+def make_pdf(num_pages: int = 10, seed: int = 7) -> bytes:
+    return build_pdf(make_pages(num_pages, seed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic study PDF")
+    parser.add_argument("output")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    with open(args.output, "wb") as f:
+        f.write(make_pdf(args.pages, args.seed))
+    print(f"Wrote {args.pages} pages to {args.output}")
@@ -0,0 +1,86 @@
+"""
+Topic Sampling Benchmark
+Builds the topic index for a synthetic document and compares the cost of
+choosing chunks for a topic with random sampling: topics found in the tags,
+a topic that needs the term-index fallback (first call and cached), and a
+general topic. Also reports how many chosen chunks are actually about the
+requested topic (each synthetic page covers one topic).
+
+Run from the Backend directory (loads the embedding model):
+    python -m benchmarks.topic_benchmark --pages 200
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+# Add parent directory to path to import from Services
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_pdf import make_pages
+from Services.state_service import state_store
+from Services.chunk_service import save_chunks
+from Services.rag_service import embeddings, get_random_chunks, get_topic_chunks
+from Services.distractor_service import build_term_index, save_term_index
+from Services.topic_service import tag_chunks, build_topic_index, save_topic_index, topic_cache
+
+DOCUMENT_ID = "topic-benchmark"
+# Requested topic -> synthetic page topic it belongs to
+TAG_TOPICS = {"entropy": "thermodynamics", "Carnot cycles": "thermodynamics", "DNA replication": "genetics"}
+
+
+async def setup_document(pages: int) -> list:
+    chunks = make_pages(pages)
+    start = time.perf_counter()
+    tags = tag_chunks(chunks)
+    index = build_topic_index(tags)
+    print(f"topic index: {len(chunks)} chunks, {len(index['words'])} tag words, "
+          f"built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    await save_chunks(DOCUMENT_ID, chunks)
+    await state_store.set("documents", "active", DOCUMENT_ID)
+    await save_term_index(DOCUMENT_ID, build_term_index(chunks, embeddings.embed_documents))
+    await save_topic_index(DOCUMENT_ID, index)
+    return chunks
+
+
+async def time_calls(fetch, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await fetch()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def on_topic(context: str, topic: str) -> float:
+    parts = context.split("\n\n---\n\n")
+    return sum(topic in part for part in parts) / max(len(parts), 1)
+
+
+async def main(args) -> None:
+    await setup_document(args.pages)
+    n = args.chunks
+    random_ms = await time_calls(lambda: get_random_chunks(n, DOCUMENT_ID), args.rounds)
+    print(f"{'random sampling':<36} {random_ms:.3f} ms/request")
+
+    for topic, home in TAG_TOPICS.items():
+        ms = await time_calls(lambda: get_topic_chunks(topic, n, DOCUMENT_ID), args.rounds)
+        context = await get_topic_chunks(topic, n, DOCUMENT_ID)
+        print(f"{'tag hit: ' + topic:<36} {ms:.3f} ms/request | {on_topic(context, home):.0%} chunks on topic")
+
+    topic = "biology of plants"
+    topic_cache.clear()
+    start = time.perf_counter()
+    await get_topic_chunks(topic, n, DOCUMENT_ID)
+    first_ms = (time.perf_counter() - start) * 1000
+    cached_ms = await time_calls(lambda: get_topic_chunks(topic, n, DOCUMENT_ID), args.rounds)
+    print(f"{'fallback: ' + topic:<36} {first_ms:.3f} ms first call, {cached_ms:.3f} ms/request cached")
+
+    general_ms = await time_calls(lambda: get_topic_chunks("general", n, DOCUMENT_ID), args.rounds)
+    print(f"{'general topic':<36} {general_ms:.3f} ms/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost of topic-targeted chunk sampling")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=3, help="Chunks per request")
+    parser.add_argument("--rounds", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
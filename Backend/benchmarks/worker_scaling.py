@@ -0,0 +1,90 @@
+"""
+Worker Scaling Check
+Starts the fake-LLM app under uvicorn with 1, 2, 4... workers and shared state,
+uploads one document, then drives the generation/grading/chat scenarios.
+A run passes when no request fails (every worker sees the upload made on
+another worker) and prints throughput per worker count so scaling is visible.
+
+Requires the database from .env (STATE_BACKEND=sql uses it):
+    python -m benchmarks.worker_scaling --workers 1 2 4 --requests 200
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+import httpx
+# Add parent directory to path so the benchmarks package is importable as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.load_test import scenario_requests, run_scenario
+from benchmarks.synthetic_pdf import make_pdf
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ["agent_generate_one", "generate", "check_answers", "chat"]
+
+
+def start_server(workers: int, port: int, llm_latency: float) -> subprocess.Popen:
+    env = dict(os.environ, STATE_BACKEND="sql", FAKE_LLM_LATENCY=str(llm_latency))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.fake_app:app",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+async def wait_until_ready(base_url: str, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get("/metrics")
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.5)
+    raise TimeoutError(f"Server at {base_url} did not start")
+
+
+async def measure(base_url: str, requests: int, concurrency: int, pages: int) -> dict:
+    scenarios = scenario_requests(make_pdf(pages))
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        await scenarios["upload_pdf"](client)
+        summaries = await asyncio.gather(*[
+            run_scenario(client, scenarios[name], requests, concurrency) for name in SCENARIOS
+        ])
+    return dict(zip(SCENARIOS, summaries))
+
+
+async def main(args) -> int:
+    failed = False
+    baseline_rps = None
+    for workers in args.workers:
+        server = start_server(workers, args.port, args.llm_latency)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            await wait_until_ready(base_url)
+            results = await measure(base_url, args.requests, args.concurrency, args.pages)
+        finally:
+            server.terminate()
+            server.wait()
+
+        total_rps = sum(r["throughput_rps"] for r in results.values())
+        errors = sum(r["errors"] for r in results.values())
+        baseline_rps = baseline_rps or total_rps / workers
+        print(f"workers={workers:<3} total {total_rps:8.1f} req/s | "
+              f"{total_rps / baseline_rps / workers:5.0%} of linear | errors {errors}")
+        for name, summary in results.items():
+            print(f"    {name:<20} {summary['throughput_rps']:8.1f} req/s | p95 {summary['p95_ms']:8.1f} ms")
+        failed = failed or errors > 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-worker shared-state scaling check")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients per scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--pages", type=int, default=10)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,22 @@
+"""
+Chroma Compaction
+Reclaims disk in the local persistent Chroma directory after documents were
+evicted: removes segment directories Chroma no longer references and
+VACUUMs its catalog (see Services/collection_service.py).
+
+Run it with the app stopped; live workers' Chroma clients hold the catalog
+and segment files open and do not expect them to change underneath them.
+
+    python -m compact_chroma
+"""
+import argparse
+
+from config import settings
+from logging_config import setup_logging
+from Services.collection_service import compact
+
+
+if __name__ == "__main__":
+    setup_logging(settings.LOG_LEVEL)
+    argparse.ArgumentParser(description="Reclaim disk in the local Chroma directory (app stopped)").parse_args()
+    print(compact())
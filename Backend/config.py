@@ -7,6 +7,85 @@ class dataBaseSetting(BaseSettings):
     POSTGRES_PASSWORD:str
     POSTGRES_DB:str
     GEMINI_API_KEY:str
+    # Verified-token / user lookup cache used by get_current_user
+    AUTH_CACHE_MAXSIZE:int = 10000
+    AUTH_CACHE_TTL_SECONDS:int = 300
+    # How long a worker trusts a cached user before checking the shared user version
+    AUTH_REVALIDATE_SECONDS:float = 5
+    # Password hashing pool (0 = min(4, cpu count)) and max queued hash jobs
+    HASH_WORKERS:int = 0
+    HASH_QUEUE_LIMIT:int = 64
+    # Insights: topics under this rolling accuracy (percent) are reported as weak
+    WEAK_TOPIC_ACCURACY:float = 70
+    # Observability
+    DB_ECHO:bool = False
+    LOG_LEVEL:str = "INFO"
+    # Extra LLM calls allowed to fill in items missing from a short or malformed response
+    LLM_PARSE_RETRIES:int = 1
+    # Shared state: "memory" (single process) or "sql" (shared by all workers/replicas)
+    STATE_BACKEND:str = "memory"
+    STATE_DATABASE_URL:str = ""
+    # Chroma server for multi-node deployments; empty = local persistent directory
+    CHROMA_HOST:str = ""
+    CHROMA_PORT:int = 8000
+    # Per-document collections: evict after this long without access; GC loop period
+    DOCUMENT_TTL_SECONDS:int = 7 * 24 * 3600
+    DOCUMENT_GC_INTERVAL_SECONDS:int = 3600
+    # Question generation: "llm" or "rules" (no LLM); LLM calls that exceed the
+    # timeout fall back to rule-based generation
+    GENERATION_MODE:str = "llm"
+    LLM_TIMEOUT_SECONDS:float = 30
+    # Hedged LLM calls across the RAG and agent model clients: duplicate a call to
+    # the other client after the first one's p95 latency (never sooner than the
+    # minimum; the default applies until enough samples exist), and take a client
+    # out of rotation after consecutive failures for the cooldown
+    LLM_HEDGING:bool = True
+    HEDGE_MIN_DELAY_SECONDS:float = 0.5
+    HEDGE_DEFAULT_DELAY_SECONDS:float = 5
+    BREAKER_FAILURES:int = 5
+    BREAKER_COOLDOWN_SECONDS:float = 30
+    # Build a per-document term index at upload and let it supply MCQ distractors,
+    # so the LLM only writes questions and answers
+    DISTRACTOR_ENGINE:bool = True
+    # Ingestion: PDF parsing processes (0 = min(4, cpu count)), files per batch
+    # upload, and texts per embedding model call
+    INGEST_WORKERS:int = 0
+    MAX_BATCH_FILES:int = 20
+    EMBED_BATCH_SIZE:int = 256
+    # Embeddings: calls arriving within the wait are merged into one model call;
+    # EMBEDDING_SERVER (unix socket path or host:port of `python -m embedding_server`)
+    # shares one model between all workers instead of loading it in each
+    EMBEDDING_MODEL:str = "all-MiniLM-L6-v2"
+    EMBED_BATCH_WAIT_MS:float = 5
+    EMBEDDING_SERVER:str = ""
+    # Chunking: fixed, page, sentence or token (see ingest_service); size and
+    # overlap are in characters, or tokens for the token strategy
+    CHUNK_STRATEGY:str = "fixed"
+    CHUNK_SIZE:int = 500
+    CHUNK_OVERLAP:int = 50
+    # Fact sheets for generation prompts instead of raw chunks: off, rules
+    # (extractive, built during upload) or llm (written by the model after
+    # upload, FACT_SHEET_BATCH chunks per call, FACT_SHEET_CONCURRENCY at a time)
+    FACT_SHEETS:str = "off"
+    FACT_SHEET_BATCH:int = 6
+    FACT_SHEET_CONCURRENCY:int = 2
+    # Token accounting: per-user daily LLM token budget (0 = unlimited) and how
+    # often the in-memory usage aggregate is flushed to the database
+    USER_DAILY_TOKEN_BUDGET:int = 0
+    USAGE_FLUSH_INTERVAL_SECONDS:float = 10
+    # Fair queue for generation, chat and ingestion (per worker): requests run at
+    # once, per user, extra requests a user may queue, and the longest queue wait
+    SCHEDULER_CONCURRENCY:int = 8
+    USER_CONCURRENCY:int = 2
+    USER_QUEUE_LIMIT:int = 4
+    QUEUE_MAX_WAIT_SECONDS:float = 30
+    # Live classroom sessions (per worker): students per session, default seconds
+    # to answer, how often answer counts are pushed, and messages buffered per
+    # socket before a client that is not keeping up is dropped
+    LIVE_MAX_PARTICIPANTS:int = 500
+    LIVE_QUESTION_SECONDS:float = 30
+    LIVE_PROGRESS_INTERVAL_SECONDS:float = 1
+    LIVE_SEND_QUEUE:int = 32
     
     model_config = SettingsConfigDict(
         env_file=".env",
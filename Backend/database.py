@@ -1,10 +1,25 @@
+import time
 from config import settings
 from typing import AsyncGenerator
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import create_async_engine,async_sessionmaker,AsyncSession
+from Services.metrics_service import db_pool_checkout_seconds
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each connection checkout waited."""
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_seconds.observe(time.perf_counter() - start)
+
 
 engine = create_async_engine(
     url=settings.POSTGRES_URL,
-    echo = True,
+    echo = settings.DB_ECHO,
+    poolclass=TimedQueuePool,
 )
 
 async_session = async_sessionmaker(
@@ -17,4 +32,4 @@ async def get_session()->AsyncGenerator[AsyncSession,None]:
     async with async_session() as session:
         yield session
     
-    
\ No newline at end of file
+    
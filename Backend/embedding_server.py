@@ -0,0 +1,40 @@
+"""
+Embedding Server
+One process holding the embedding model for every uvicorn worker on the
+host. Requests from all workers arriving within EMBED_BATCH_WAIT_MS are
+embedded in one forward pass (see Services/embedding_service.py).
+
+    python -m embedding_server --listen /tmp/flashquiz-embed.sock
+    EMBEDDING_SERVER=/tmp/flashquiz-embed.sock uvicorn main:app --workers 4
+
+--listen also takes host:port (e.g. 127.0.0.1:8765, or on Windows).
+"""
+import os
+import asyncio
+import argparse
+
+from config import settings
+from logging_config import setup_logging
+from Services.embedding_service import MicroBatcher, load_model, parse_address, serve
+
+
+def main(args) -> None:
+    batcher = MicroBatcher(load_model(args.model), wait_ms=args.wait_ms)
+    address = args.listen
+    # A socket file left behind by a previous run would make the bind fail
+    if not isinstance(parse_address(address), tuple) and os.path.exists(address):
+        os.remove(address)
+    try:
+        asyncio.run(serve(address, batcher))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    setup_logging(settings.LOG_LEVEL)
+    parser = argparse.ArgumentParser(description="Shared embedding model with micro-batching")
+    parser.add_argument("--listen", default=settings.EMBEDDING_SERVER or "/tmp/flashquiz-embed.sock",
+                        help="Unix socket path or host:port (default: EMBEDDING_SERVER)")
+    parser.add_argument("--model", default=None, help="Model name (default: EMBEDDING_MODEL)")
+    parser.add_argument("--wait-ms", type=float, default=None, help="Batching window (default: EMBED_BATCH_WAIT_MS)")
+    main(parser.parse_args())
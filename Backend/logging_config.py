@@ -0,0 +1,31 @@
+import sys
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# Records are handed to a queue on the request path; a background thread writes them out
+log_queue = queue.SimpleQueue()
+_listener = None
+
+
+def setup_logging(level: str = "INFO") -> None:
+    global _listener
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(QueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
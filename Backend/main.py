@@ -1,28 +1,64 @@
+import time
+import asyncio
+import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Depends
+from starlette.requests import HTTPConnection
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import SQLModel
+from config import settings
+from logging_config import setup_logging, shutdown_logging
+setup_logging(settings.LOG_LEVEL)
 from database import engine
 from Api.Router.user_router import router as user_router
 from Api.Router.authenticater import router as auth_router
 from Api.Router.protected_router import router as protected_routes
 from Api.Router.quiz_router import router as quiz_router
+from Api.Router.metrics_router import router as metrics_router
+from Api.Router.flashcard_router import router as flashcard_router
+from Api.Router.live_router import router as live_router
+from Services.metrics_service import current_endpoint, http_request_seconds
+from Services.collection_service import run_maintenance
+from Services import ingest_service
+from Services import usage_service
 from scalar_fastapi import get_scalar_api_reference
 
 @asynccontextmanager
 async def life_span_handler(app:FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+    # Evict expired documents in the background
+    maintenance = asyncio.create_task(run_maintenance())
+    # Batch-write LLM token usage
+    usage_flusher = asyncio.create_task(usage_service.run_flusher())
     try:
         yield
     finally:
+        maintenance.cancel()
+        usage_flusher.cancel()
+        ingest_service.shutdown()
+        try:
+            await usage_service.flush()
+        except Exception:
+            logging.getLogger(__name__).exception("Final token usage flush failed")
         await engine.dispose()
+        shutdown_logging()
 
-app = FastAPI(lifespan=life_span_handler)
+async def label_endpoint(connection: HTTPConnection) -> None:
+    # Label stage timings and token usage with the route template being served
+    # ("/live/sessions/{code}"), not the raw path, so label values stay bounded
+    route = connection.scope.get("route")
+    current_endpoint.set(getattr(route, "path", "unmatched"))
+
+
+app = FastAPI(lifespan=life_span_handler, dependencies=[Depends(label_endpoint)])
 app.include_router(user_router,tags=["users"])
 app.include_router(auth_router,tags=["token"])
 app.include_router(protected_routes,tags=["protected"])
 app.include_router(quiz_router,tags=["quiz"])
+app.include_router(metrics_router,tags=["metrics"])
+app.include_router(flashcard_router,tags=["flashcards"])
+app.include_router(live_router,tags=["live"])
 app.mount(
     "/scalar", 
     get_scalar_api_reference(openapi_url=app.openapi_url)
@@ -35,3 +71,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            endpoint=getattr(route, "path", "unmatched"),
+            status=status_code,
+        )
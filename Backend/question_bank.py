@@ -0,0 +1,211 @@
+"""
+Question Bank CLI
+Builds question banks for a whole folder of PDFs offline, and imports them
+into the shared question pool the API serves from without LLM calls.
+
+    python -m question_bank build COURSE_DIR --out course.jsonl
+    python -m question_bank import course.jsonl
+
+build parses PDFs in the ingest process pool (the same extraction as
+/quiz/upload-pdf), then generates questions per group of chunks with the
+agent generators, at most --concurrency LLM calls at a time. Each document
+is appended to the JSONL file as one block ending in a "document" record,
+so an interrupted run resumes where it stopped: finished documents are
+skipped and a partly written block is cut off. Banks can also be uploaded
+to POST /quiz/question-bank.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+
+from config import settings
+from logging_config import setup_logging
+from Services import ingest_service
+from Services.agent_service import generate_quiz_with_agent, generate_flashcards_with_agent
+from Services.question_bank_service import import_bank
+
+logger = logging.getLogger("question_bank")
+
+# Chunks (~200-250 words each) per generation call, like the agent endpoints
+CHUNKS_PER_GROUP = 3
+MAX_CONTEXT_CHARS = 1500
+
+
+def document_id_for(path: str) -> str:
+    """Content hash: the same file gets the same id on every run and machine."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:24]
+
+
+def find_documents(folder: str) -> list:
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+    return sorted(paths)
+
+
+def resume_point(out_path: str) -> set:
+    """
+    Sources already finished in an existing bank file. Anything after the
+    last complete document block (an interrupted write) is truncated.
+    """
+    done, keep = set(), 0
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "rb") as f:
+        offset = 0
+        for line in f:
+            offset += len(line)
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if record.get("kind") == "document":
+                done.add(record["source"])
+                keep = offset
+    if keep != os.path.getsize(out_path):
+        logger.info("Discarding %d bytes of an unfinished document block", os.path.getsize(out_path) - keep)
+        with open(out_path, "r+b") as f:
+            f.truncate(keep)
+    return done
+
+
+class BankBuilder:
+    def __init__(self, args):
+        self.args = args
+        self.llm_slots = asyncio.Semaphore(args.concurrency)
+        # Parsed documents waiting for generation are held in memory; keep them few
+        self.document_slots = asyncio.Semaphore(max(2, ingest_service.ingest_workers() * 2))
+        self.write_lock = asyncio.Lock()
+        self.out = None
+        self.totals = {"documents": 0, "questions": 0, "flashcards": 0, "failed": 0}
+
+    async def generate_group(self, context: str, document_id: str) -> tuple:
+        async with self.llm_slots:
+            quiz = await generate_quiz_with_agent(
+                context, self.args.questions, self.args.mode, document_id)
+            flashcards = {}
+            if self.args.flashcards:
+                flashcards = await generate_flashcards_with_agent(context, self.args.flashcards, self.args.mode)
+        return quiz, flashcards
+
+    async def build_document(self, path: str, source: str) -> None:
+        async with self.document_slots:
+            document_id = await asyncio.to_thread(document_id_for, path)
+            try:
+                parts = await ingest_service.split_pdf(path)
+            except Exception as e:
+                logger.error("%s: could not parse: %s", source, e)
+                self.totals["failed"] += 1
+                return
+            texts = parts["texts"]
+            groups = [
+                (start, "\n\n---\n\n".join(texts[start:start + CHUNKS_PER_GROUP])[:MAX_CONTEXT_CHARS])
+                for start in range(0, len(texts), CHUNKS_PER_GROUP)
+            ]
+            results = await asyncio.gather(*(self.generate_group(context, document_id) for _, context in groups))
+
+        records, seen, errors = [], set(), 0
+        base = {"document_id": document_id, "source": source}
+        for (start, _), (quiz, flashcards) in zip(groups, results):
+            if quiz.get("error") and not quiz.get("quiz"):
+                errors += 1
+            for q in quiz.get("quiz", []):
+                key = q["question"].strip().lower()
+                if key not in seen:
+                    seen.add(key)
+                    q.pop("id", None)
+                    records.append({"kind": "question", **base, **q, "chunk": start})
+            for card in flashcards.get("flashcards", []):
+                card.pop("id", None)
+                records.append({"kind": "flashcard", **base, **card, "chunk": start})
+
+        questions = sum(1 for r in records if r["kind"] == "question")
+        flashcards = len(records) - questions
+        if groups and errors == len(groups):
+            # Not marked complete: a later run retries it
+            logger.error("%s: every generation call failed", source)
+            self.totals["failed"] += 1
+            return
+        records.append({"kind": "document", **base, "pages": parts["pages"], "chunks": len(texts),
+                        "questions": questions, "flashcards": flashcards, "failed_groups": errors})
+        await self.write_block(records)
+        self.totals["documents"] += 1
+        self.totals["questions"] += questions
+        self.totals["flashcards"] += flashcards
+        logger.info("%s: %d questions from %d chunks", source, questions, len(texts))
+
+    async def write_block(self, records: list) -> None:
+        # One write per document, synced, so a crash never splits a finished block
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        async with self.write_lock:
+            self.out.write(data)
+            self.out.flush()
+            await asyncio.to_thread(os.fsync, self.out.fileno())
+
+    async def run(self) -> dict:
+        args = self.args
+        folder = os.path.abspath(args.folder)
+        done = resume_point(args.out)
+        pending = [
+            (path, os.path.relpath(path, folder)) for path in find_documents(folder)
+            if os.path.relpath(path, folder) not in done
+        ]
+        logger.info("%d documents to process, %d already in %s", len(pending), len(done), args.out)
+        self.out = open(args.out, "a", encoding="utf-8")
+        try:
+            await asyncio.gather(*(self.build_document(path, source) for path, source in pending))
+        finally:
+            self.out.close()
+        return self.totals
+
+
+async def build(args) -> None:
+    if args.workers:
+        settings.INGEST_WORKERS = args.workers
+    start = time.perf_counter()
+    try:
+        totals = await BankBuilder(args).run()
+    finally:
+        ingest_service.shutdown()
+    print(json.dumps({**totals, "seconds": round(time.perf_counter() - start, 1)}))
+
+
+async def import_file(args) -> None:
+    with open(args.bank, "rb") as f:
+        print(json.dumps(await import_bank(f), indent=2))
+
+
+if __name__ == "__main__":
+    setup_logging(settings.LOG_LEVEL)
+    parser = argparse.ArgumentParser(description="Offline question bank generation")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Generate a JSONL question bank for a folder of PDFs")
+    build_parser.add_argument("folder")
+    build_parser.add_argument("--out", required=True, help="JSONL file; an existing one is resumed")
+    build_parser.add_argument("--questions", type=int, default=5, help=f"Questions per {CHUNKS_PER_GROUP} chunks")
+    build_parser.add_argument("--flashcards", type=int, default=0, help=f"Flashcards per {CHUNKS_PER_GROUP} chunks")
+    build_parser.add_argument("--concurrency", type=int, default=4, help="Generation calls in flight")
+    build_parser.add_argument("--workers", type=int, default=0, help="PDF parsing processes (default: INGEST_WORKERS)")
+    build_parser.add_argument("--mode", choices=("llm", "rules"), default=None,
+                              help="Generator (default: GENERATION_MODE)")
+
+    import_parser = commands.add_parser("import", help="Load a JSONL bank into the shared question pool")
+    import_parser.add_argument("bank")
+
+    args = parser.parse_args()
+    if args.command == "import" and settings.STATE_BACKEND != "sql":
+        sys.exit("import writes to the shared state; set STATE_BACKEND=sql, or upload the file "
+                 "to POST /quiz/question-bank on the running server")
+    asyncio.run(build(args) if args.command == "build" else import_file(args))
@@ -129,7 +129,9 @@ const Quiz = () => {
       const answersForCheck = answers.map(a => ({
         question_id: a.question_id,
         user_answer: a.user_answer,
-        correct_answer: a.correct_answer
+        correct_answer: a.correct_answer,
+        user_answer_index: a.user_answer_index,
+        correct_answer_index: a.correct_answer_index
       }));
       
       // Check answers using cosine similarity